@@ -3,13 +3,21 @@ from flask import Flask
 from flask_wtf import CSRFProtect
 from authlib.integrations.flask_client import OAuth
 from flask_migrate import Migrate
-from flask_login import LoginManager
+from flask_login import LoginManager, current_user
 from flask_bcrypt import Bcrypt
 from flask_mail import Mail
 from itsdangerous import URLSafeTimedSerializer
 from .db import db               # relative import, NOT “from app.db”
-import pytz
-from datetime import datetime
+from . import broker as chat_broker
+from . import trending
+from . import spotify
+from . import enrichment
+from . import podcast_search
+from . import fulltext
+from . import user_index
+from . import typeahead
+from . import passwords
+from . import timebuckets
 
 # ─── global extensions ──────────────────────────────────────
 login_mgr = LoginManager()
@@ -51,10 +59,48 @@ def create_app():
                               ),
         "SPOTIFY_CLIENT_ID": os.environ.get("SPOTIFY_CLIENT_ID"),
         "SPOTIFY_CLIENT_SECRET": os.environ.get("SPOTIFY_CLIENT_SECRET"),
+        # token cache shared by worker processes ('' keeps it per-process);
+        # defaults to instance/spotify_token.json
+        "SPOTIFY_TOKEN_STORE":   os.environ.get("SPOTIFY_TOKEN_STORE"),
+        # show-search and episode caches; set SPOTIFY_CACHE_STORE to a file
+        # path to share them between worker processes
+        "SEARCH_CACHE_SIZE":     int(os.environ.get("SEARCH_CACHE_SIZE", 1024)),
+        "SEARCH_CACHE_TTL":      int(os.environ.get("SEARCH_CACHE_TTL", 600)),
+        "SEARCH_CACHE_STALE_TTL": int(os.environ.get("SEARCH_CACHE_STALE_TTL", 24 * 3600)),
+        "EPISODE_CACHE_TTL":     int(os.environ.get("EPISODE_CACHE_TTL", 6 * 3600)),
+        # seconds before a show whose episode fetch failed is tried again
+        "EPISODE_RETRY_AFTER":   int(os.environ.get("EPISODE_RETRY_AFTER", 300)),
+        "SPOTIFY_CACHE_STORE":   os.environ.get("SPOTIFY_CACHE_STORE"),
+        # fail fast after this many bad Spotify calls in a row, for this long
+        "SPOTIFY_BREAKER_FAILURES": int(os.environ.get("SPOTIFY_BREAKER_FAILURES", 5)),
+        "SPOTIFY_BREAKER_RESET":    int(os.environ.get("SPOTIFY_BREAKER_RESET", 30)),
+        # podcast autocomplete only asks Spotify when the local catalog has
+        # fewer matches than this, and waits this long for it
+        "PODCAST_SEARCH_MIN_LOCAL": int(os.environ.get("PODCAST_SEARCH_MIN_LOCAL", 5)),
+        "PODCAST_SEARCH_WAIT":      float(os.environ.get("PODCAST_SEARCH_WAIT", 1.0)),
+        # seconds before a worker reloads its user-search index from the DB
+        # (its own signups and renames are applied immediately)
+        "USER_INDEX_MAX_AGE":    int(os.environ.get("USER_INDEX_MAX_AGE", 300)),
+        # seconds a user's typeahead results are reused for longer queries
+        "TYPEAHEAD_CACHE_TTL":   int(os.environ.get("TYPEAHEAD_CACHE_TTL", 30)),
+        # bcrypt work factor (hashes made at another cost are upgraded on
+        # login), and how many hashes may run / wait before logins are shed
+        "BCRYPT_LOG_ROUNDS":     int(os.environ.get("BCRYPT_LOG_ROUNDS", 12)),
+        "PASSWORD_HASH_WORKERS": int(os.environ.get("PASSWORD_HASH_WORKERS", 2)),
+        "PASSWORD_HASH_QUEUE":   int(os.environ.get("PASSWORD_HASH_QUEUE", 16)),
+        # threads filling in placeholder podcasts from Spotify
+        "ENRICH_WORKERS":        int(os.environ.get("ENRICH_WORKERS", 4)),
 
         # ← your new Google OAuth creds
         "GOOGLE_CLIENT_ID":     os.environ.get("GOOGLE_CLIENT_ID"),
         "GOOGLE_CLIENT_SECRET": os.environ.get("GOOGLE_CLIENT_SECRET"),
+
+        # pub/sub backend for live chat (dotted class path; in-process by default)
+        "CHAT_BROKER":          os.environ.get("CHAT_BROKER"),
+
+        # seconds between each worker's checks for a newer trending snapshot
+        # (written by `flask trending rebuild`)
+        "TRENDING_RELOAD_INTERVAL": int(os.environ.get("TRENDING_RELOAD_INTERVAL", 300)),
     })
 
     
@@ -70,14 +116,14 @@ def create_app():
     )
 
     @app.template_filter('to_local')
-    def to_local(utc_dt, tz_name='Australia/Perth'):
-        """Convert a UTC datetime to the given timezone."""
+    def to_local(utc_dt, tz_name=None):
+        """Convert a UTC datetime to the given (or the viewer's) timezone."""
         if not utc_dt:
             return ''
-        # mark as UTC, then convert
-        utc = pytz.utc
-        target = pytz.timezone(tz_name)
-        return utc.localize(utc_dt).astimezone(target)
+        if tz_name is None:
+            tz_name = current_user.tz_name if current_user.is_authenticated else None
+        # timezone objects are built once and cached
+        return timebuckets.to_local(utc_dt, tz_name)
 
 
     # ─── CSRF protection ────────────────────────────────────
@@ -90,6 +136,14 @@ def create_app():
     migrate.init_app(app, db)
     login_mgr.init_app(app)
     bcrypt.init_app(app)
+    passwords.init_app(app)
+    chat_broker.init_app(app)
+    trending.init_app(app)
+    spotify.init_app(app)
+    enrichment.init_app(app)
+    podcast_search.init_app(app)
+    user_index.init_app(app)
+    typeahead.init_app(app)
 
     login_mgr.login_view = "main.login"
 
@@ -102,9 +156,20 @@ def create_app():
     from .routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    # ─── maintenance commands (flask rollups rebuild, …) ────
+    from .analytics import rollup_cli
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(trending.trending_cli)
+    app.cli.add_command(enrichment.podcast_cli)
+    app.cli.add_command(fulltext.search_cli)
+
     # ─── no-cache headers ───────────────────────────────────
+    # the default for every page; views that set their own Cache-Control
+    # (the ETag'd dashboard data) keep it
     @app.after_request
     def add_no_cache_headers(response):
+        if "Cache-Control" in response.headers:
+            return response
         response.headers["Cache-Control"] = (
             "no-store, no-cache, must-revalidate, private, max-age=0"
         )
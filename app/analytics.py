@@ -0,0 +1,223 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, desc
+from sqlalchemy.exc import IntegrityError
+
+from app.db import db
+from app.models import User, Podcast, PodcastLog, ListeningRollup
+from app.timebuckets import DEFAULT_TIMEZONE, GRANULARITIES, local_date, bucket_totals
+
+
+# ─── ROLLUP MAINTENANCE ────────────────────────────────────
+
+def _user_timezone(user_id):
+    return db.session.query(User.timezone).filter(User.id == user_id).scalar() \
+        or DEFAULT_TIMEZONE
+
+
+def _rollup_key(log, tz_name):
+    return dict(
+        user_id=log.user_id,
+        day=local_date(log.listened_at, tz_name),
+        podcast_id=log.podcast_id,
+        genre=log.genre or '',
+    )
+
+
+def _key_filter(key):
+    return [
+        ListeningRollup.user_id == key['user_id'],
+        ListeningRollup.day == key['day'],
+        ListeningRollup.podcast_id.is_(None) if key['podcast_id'] is None
+            else ListeningRollup.podcast_id == key['podcast_id'],
+        ListeningRollup.genre == key['genre'],
+    ]
+
+
+def _apply(log, sign, tz_name):
+    key = _rollup_key(log, tz_name)
+    rated = log.rating is not None
+    deltas = {
+        ListeningRollup.duration_sum: ListeningRollup.duration_sum + sign * (log.duration or 0),
+        ListeningRollup.rating_sum:   ListeningRollup.rating_sum + sign * (log.rating or 0),
+        ListeningRollup.rating_count: ListeningRollup.rating_count + (sign if rated else 0),
+        ListeningRollup.log_count:    ListeningRollup.log_count + sign,
+    }
+
+    updated = ListeningRollup.query.filter(*_key_filter(key)) \
+        .update(deltas, synchronize_session=False)
+    if updated or sign < 0:
+        return
+
+    row = ListeningRollup(
+        duration_sum=log.duration or 0,
+        rating_sum=log.rating or 0,
+        rating_count=1 if rated else 0,
+        log_count=1,
+        **key
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(row)
+    except IntegrityError:
+        # another request created the row first — add onto theirs
+        ListeningRollup.query.filter(*_key_filter(key)) \
+            .update(deltas, synchronize_session=False)
+
+
+def record_log(log, tz_name=None):
+    """
+    Add a (flushed) log to its local day's rollup.  `tz_name` is the
+    owner's timezone; it's looked up when not given.  Caller commits.
+    """
+    _apply(log, +1, tz_name or _user_timezone(log.user_id))
+
+
+def forget_log(log, tz_name=None):
+    """Take a log back out of its day's rollup.  Caller commits."""
+    tz_name = tz_name or _user_timezone(log.user_id)
+    _apply(log, -1, tz_name)
+    ListeningRollup.query.filter(*_key_filter(_rollup_key(log, tz_name)),
+                                 ListeningRollup.log_count <= 0) \
+        .delete(synchronize_session=False)
+
+
+def rebuild_rollups(user_id=None):
+    """
+    Recompute rollups from PodcastLog (every user by default).  Local days
+    depend on each user's timezone, which SQL can't convert portably, so
+    logs are streamed through Python in (user_id, listened_at) order.
+    """
+    users = db.session.query(User.id, User.timezone)
+    logs = db.session.query(
+            PodcastLog.user_id, PodcastLog.listened_at, PodcastLog.podcast_id,
+            PodcastLog.genre, PodcastLog.duration, PodcastLog.rating
+        ) \
+        .filter(PodcastLog.listened_at != None) \
+        .order_by(PodcastLog.user_id, PodcastLog.listened_at)
+    stale = ListeningRollup.query
+    if user_id is not None:
+        users = users.filter(User.id == user_id)
+        logs = logs.filter(PodcastLog.user_id == user_id)
+        stale = stale.filter(ListeningRollup.user_id == user_id)
+    zones = {uid: tz or DEFAULT_TIMEZONE for uid, tz in users.all()}
+
+    totals = {}
+    for uid, listened_at, pid, genre, duration, rating in logs.yield_per(5000):
+        key = (uid, local_date(listened_at, zones.get(uid)), pid, genre or '')
+        row = totals.setdefault(key, [0, 0.0, 0, 0])
+        row[0] += duration or 0
+        if rating is not None:
+            row[1] += rating
+            row[2] += 1
+        row[3] += 1
+
+    stale.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(ListeningRollup, [
+        {
+            'user_id': uid, 'day': day, 'podcast_id': pid, 'genre': genre,
+            'duration_sum': dur, 'rating_sum': rsum, 'rating_count': rcount,
+            'log_count': n,
+        }
+        for (uid, day, pid, genre), (dur, rsum, rcount, n) in totals.items()
+    ])
+    db.session.commit()
+
+
+# ─── DASHBOARD QUERIES ─────────────────────────────────────
+
+def top_podcasts(user_id, limit=5):
+    """[(name, image_url, publisher, total_seconds)] by total listen-time."""
+    return (
+        db.session.query(
+            Podcast.name,
+            Podcast.image_url,
+            Podcast.publisher,
+            func.sum(ListeningRollup.duration_sum).label("total_duration")
+        )
+        .join(ListeningRollup, Podcast.id == ListeningRollup.podcast_id)
+        .filter(ListeningRollup.user_id == user_id)
+        .group_by(Podcast.id)
+        .order_by(desc("total_duration"))
+        .limit(limit)
+        .all()
+    )
+
+
+def most_loved(user_id):
+    """(name, avg_rating, total_seconds) for the best-rated podcast, or None."""
+    return (
+        db.session.query(
+            Podcast.name,
+            (func.sum(ListeningRollup.rating_sum)
+             / func.sum(ListeningRollup.rating_count)).label("avg_rating"),
+            func.sum(ListeningRollup.duration_sum).label("total_duration")
+        )
+        .join(ListeningRollup, Podcast.id == ListeningRollup.podcast_id)
+        .filter(ListeningRollup.user_id == user_id)
+        .group_by(Podcast.id)
+        .having(func.sum(ListeningRollup.rating_count) > 0)
+        .order_by(
+            desc("avg_rating"),        # primary sort: average rating
+            desc("total_duration")     # secondary sort: total listen time
+        )
+        .first()
+    )
+
+
+def _in_range(query, start=None, end=None):
+    """Limit a rollup query to local days start..end (inclusive, either may be None)."""
+    if start is not None:
+        query = query.filter(ListeningRollup.day >= start)
+    if end is not None:
+        query = query.filter(ListeningRollup.day <= end)
+    return query
+
+
+def genre_breakdown(user_id, start=None, end=None):
+    """[(genre or None, total_seconds)], optionally for local days start..end."""
+    query = (
+        db.session.query(
+            ListeningRollup.genre,
+            func.coalesce(func.sum(ListeningRollup.duration_sum), 0)
+        )
+        .filter(ListeningRollup.user_id == user_id)
+    )
+    rows = _in_range(query, start, end).group_by(ListeningRollup.genre).all()
+    return [(g or None, total) for g, total in rows]
+
+
+def daily_totals(user_id, start=None, end=None):
+    """[(local date, total_seconds)] — one row per day, whatever the engine."""
+    query = (
+        db.session.query(ListeningRollup.day, func.sum(ListeningRollup.duration_sum))
+        .filter(ListeningRollup.user_id == user_id)
+    )
+    return _in_range(query, start, end) \
+        .group_by(ListeningRollup.day) \
+        .order_by(ListeningRollup.day) \
+        .all()
+
+
+def listening_series(user_id, granularity='week', start=None, end=None):
+    """
+    [(bucket label, total_seconds)] for local days start..end, folded into
+    day/week/month/year buckets.  Reads at most one rollup row per day in
+    range, so zooming never touches podcast_log.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    return bucket_totals(daily_totals(user_id, start, end), granularity)
+
+
+# ─── CLI ───────────────────────────────────────────────────
+
+rollup_cli = AppGroup('rollups', help='Maintain the listening rollup table.')
+
+
+@rollup_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user.')
+def rebuild_command(user_id):
+    """Recompute listening rollups from podcast_log."""
+    rebuild_rollups(user_id)
+    click.echo('Listening rollups rebuilt.')
@@ -0,0 +1,98 @@
+import queue
+import threading
+from abc import ABC, abstractmethod
+from importlib import import_module
+
+from flask import current_app
+
+
+class Subscription:
+    """A subscriber's mailbox on one channel.  Iterate with get(); always close()."""
+
+    def __init__(self, broker, channel, maxsize=100):
+        self.broker  = broker
+        self.channel = channel
+        self.queue   = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # a stalled client shouldn't block publishers; it can re-sync
+            # from /chats/<id>/messages?after_id= when it reconnects
+            pass
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker(ABC):
+    """
+    Pub/sub interface the chat stream talks to.  Subclasses fan events out
+    to every Subscription on a channel; a multi-worker deployment can plug
+    in one backed by a shared local service via the CHAT_BROKER setting.
+    """
+
+    @abstractmethod
+    def publish(self, channel, event):
+        """Deliver `event` to every subscriber on `channel`."""
+
+    @abstractmethod
+    def subscribe(self, channel):
+        """A new Subscription on `channel`."""
+
+    @abstractmethod
+    def unsubscribe(self, subscription):
+        """Stop delivering to `subscription`."""
+
+
+class InProcessBroker(Broker):
+    """Default broker: delivers to subscribers inside this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for sub in subscribers:
+            sub.deliver(event)
+
+    def subscribe(self, channel):
+        sub = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subs = self._channels.get(subscription.channel)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._channels[subscription.channel]
+
+
+def _load(path):
+    module, _, name = path.rpartition('.')
+    return getattr(import_module(module), name)
+
+
+def init_app(app):
+    """Create the app's broker from CHAT_BROKER (a dotted class path)."""
+    broker_cls = app.config.get('CHAT_BROKER') or InProcessBroker
+    if isinstance(broker_cls, str):
+        broker_cls = _load(broker_cls)
+    app.extensions['chat_broker'] = broker_cls()
+
+
+def get_broker():
+    return current_app.extensions['chat_broker']
@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()     # SqliteCacheStore.get() on a miss or expired entry
+
+
+# ─── IN-PROCESS CACHE ──────────────────────────────────────
+
+class TTLCache:
+    """
+    Bounded LRU map whose entries also expire `ttl` seconds after being set.
+    With `stale_ttl`, expired entries are kept that much longer for
+    get_stale() — something to fall back on when a refresh fails.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, stale_ttl=0, clock=time.monotonic):
+        self.maxsize   = maxsize
+        self.ttl       = ttl
+        self.stale_ttl = stale_ttl
+        self.clock     = clock
+        self._data     = OrderedDict()     # key -> (expires_at, value)
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            now = self.clock()
+            if entry is None or entry[0] <= now:
+                if entry is not None and entry[0] + self.stale_ttl <= now:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key, default=None):
+        """An entry past its ttl but still inside the stale window, else `default`."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] + self.stale_ttl <= self.clock():
+                return default
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size':     len(self._data),
+            'hits':     self.hits,
+            'misses':   self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# ─── REQUEST COALESCING ────────────────────────────────────
+
+class _Call:
+    def __init__(self):
+        self.done   = threading.Event()
+        self.result = None
+        self.error  = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one: the first caller
+    runs the function, everyone who arrives while it's in flight waits and
+    gets the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+# ─── SHARED BACKING STORE ──────────────────────────────────
+
+class SqliteCacheStore:
+    """
+    JSON values with an expiry in a local SQLite file, so every worker
+    process on the machine shares one cache.  Errors reading or writing it
+    are swallowed: the store is only ever an optimisation.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path  = path
+        self.clock = clock
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=1)
+
+    def get(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?',
+                                   (key,)).fetchone()
+        except sqlite3.Error:
+            return MISSING
+        if row is None or row[1] <= self.clock():
+            return MISSING
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = self.clock()
+        try:
+            with self._connect() as conn:
+                conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                              (key, json.dumps(value), now + ttl))
+                # keep the file from growing without bound
+                conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+        except sqlite3.Error:
+            pass
+
+
+# ─── PUTTING IT TOGETHER ───────────────────────────────────
+
+class SharedCache:
+    """
+    Read-through cache: in-process TTL/LRU first, then the optional shared
+    store, then `loader` — with concurrent misses for one key coalesced so
+    only one of them reaches the loader.
+
+    lookup() also does stale-while-revalidate: for `stale_ttl` seconds past
+    expiry an entry is still served (flagged stale) while one background
+    reload runs, and a failed reload just leaves the stale value in place.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, store=None, stale_ttl=0):
+        self.ttl    = ttl
+        self.local  = TTLCache(maxsize, ttl, stale_ttl=stale_ttl)
+        self.store  = store
+        self.flight = SingleFlight()
+        self._lock  = threading.Lock()
+        self._revalidating = set()
+        self.store_hits   = 0
+        self.loads        = 0
+        self.stale_served = 0
+
+    def get_or_load(self, key, loader):
+        return self.lookup(key, loader)[0]
+
+    def lookup(self, key, loader):
+        """(value, stale) for `key`."""
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            return value, False
+        stale = self.local.get_stale(key, MISSING)
+        if stale is not MISSING:
+            self.stale_served += 1
+            self._revalidate(key, loader)
+            return stale, True
+        return self.flight.do(key, lambda: self._load(key, loader)), False
+
+    def _revalidate(self, key, loader):
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                self._load(key, loader, use_store=False)
+            except Exception:
+                pass        # keep serving the stale copy
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _load(self, key, loader, use_store=True):
+        if use_store and self.store is not None:
+            value = self.store.get(key)
+            if value is not MISSING:
+                self.store_hits += 1
+                self.local.set(key, value)
+                return value
+        value = loader()
+        self.loads += 1
+        self.local.set(key, value)
+        if self.store is not None:
+            self.store.set(key, value, self.ttl)
+        return value
+
+    def stats(self):
+        return dict(self.local.stats(),
+                    store_hits=self.store_hits,
+                    loads=self.loads,
+                    stale_served=self.stale_served,
+                    coalesced=self.flight.coalesced)
@@ -0,0 +1,279 @@
+import json
+
+from flask import url_for
+from sqlalchemy import case, distinct, func, or_, and_
+from sqlalchemy.orm import aliased, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.db import db
+from app.broker import get_broker
+from app.models import User, Message, Conversation, PodcastLog
+
+
+def _adjust_unread(user_id, delta):
+    """Atomically move a user's unread-conversation counter, never below zero."""
+    col = User.unread_conversations
+    db.session.query(User).filter(User.id == user_id).update(
+        {col: case((col + delta < 0, 0), else_=col + delta)},
+        synchronize_session=False
+    )
+
+
+def _has_unread_after(convo_id, user_id, watermark):
+    return db.session.query(Message.id) \
+        .filter(Message.conversation_id == convo_id,
+                Message.recipient_id == user_id,
+                Message.id > watermark) \
+        .first() is not None
+
+
+def conversation_between(user_a_id, user_b_id):
+    """The two users' conversation, created (and flushed) if they haven't got one."""
+    uid1, uid2 = sorted([user_a_id, user_b_id])
+    convo = Conversation.query.filter_by(user1_id=uid1, user2_id=uid2).first()
+    if convo is None:
+        convo = Conversation(user1_id=uid1, user2_id=uid2)
+        db.session.add(convo)
+        db.session.flush()
+    return convo
+
+
+def mark_conversation_read(convo, user, up_to_id=None):
+    """
+    Move `user`'s read watermark on `convo` up to `up_to_id` (the latest
+    message by default).  That's a single-row UPDATE however many messages
+    it covers; if it clears the last unread one, the conversation also
+    leaves the user's unread counter.  Returns True if the watermark moved.
+    Caller commits.
+    """
+    latest = db.session.query(func.max(Message.id)) \
+        .filter(Message.conversation_id == convo.id) \
+        .scalar() or 0
+    target = latest if up_to_id is None else min(up_to_id, latest)
+    previous = convo.last_read_id(user.id)
+    if target <= previous:
+        return False
+
+    column = (Conversation.user1_last_read_id if user.id == convo.user1_id
+              else Conversation.user2_last_read_id)
+    had_unread = _has_unread_after(convo.id, user.id, previous)
+    # only ever move forwards, even if another request got here first
+    moved = Conversation.query \
+        .filter(Conversation.id == convo.id, column < target) \
+        .update({column: target}, synchronize_session=False)
+    if not moved:
+        return False
+    set_committed_value(convo, column.key, target)
+
+    if had_unread and not _has_unread_after(convo.id, user.id, target):
+        _adjust_unread(user.id, -1)
+        # let the page we're about to render pick up the new value
+        db.session.expire(user, ['unread_conversations'])
+    return True
+
+
+def recount_unread(user_id=None):
+    """Recompute unread-conversation counters from the watermarks (all users by default)."""
+    watermark = case(
+        (Message.recipient_id == Conversation.user1_id, Conversation.user1_last_read_id),
+        else_=Conversation.user2_last_read_id
+    )
+    per_user = dict(
+        db.session.query(Message.recipient_id, func.count(distinct(Message.conversation_id)))
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .filter(Message.id > watermark)
+        .group_by(Message.recipient_id)
+        .all()
+    )
+    users = User.query if user_id is None else User.query.filter_by(id=user_id)
+    for user in users.all():
+        user.unread_conversations = per_user.get(user.id, 0)
+    db.session.commit()
+
+
+# ─── INBOX ─────────────────────────────────────────────────
+
+SNIPPET_LEN = 80
+
+
+def _snippet(text, podcast_log_id):
+    if text:
+        return text if len(text) <= SNIPPET_LEN else text[:SNIPPET_LEN - 1] + '…'
+    if podcast_log_id:
+        return 'Shared a podcast'
+    return ''
+
+
+def inbox(user_id, page=1, per_page=20):
+    """
+    A page of a user's conversations, most recent first, each with the
+    partner, unread count, last-message snippet and last_message_at.
+    Everything comes back from one grouped query; one extra row is
+    fetched to tell whether there is another page.  Returns (items, has_next).
+    """
+    mine = or_(Conversation.user1_id == user_id, Conversation.user2_id == user_id)
+    stats = (
+        db.session.query(
+            Message.conversation_id.label('conversation_id'),
+            func.max(Message.id).label('last_id'),
+            func.max(Message.created_at).label('last_message_at'),
+            func.sum(case(
+                (and_(Message.recipient_id == user_id,
+                      Message.id > Conversation.last_read_column(user_id)), 1),
+                else_=0
+            )).label('unread')
+        )
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .filter(mine)
+        .group_by(Message.conversation_id)
+        .subquery()
+    )
+    Partner = aliased(User)
+    Last    = aliased(Message)
+    partner_id = case(
+        (Conversation.user1_id == user_id, Conversation.user2_id),
+        else_=Conversation.user1_id
+    )
+
+    rows = (
+        db.session.query(Conversation.id, Partner, stats.c.unread,
+                         stats.c.last_message_at, Last.text, Last.podcast_log_id)
+        .join(Partner, Partner.id == partner_id)
+        .outerjoin(stats, stats.c.conversation_id == Conversation.id)
+        .outerjoin(Last, Last.id == stats.c.last_id)
+        .filter(mine)
+        .order_by(stats.c.last_message_at.is_(None),
+                  stats.c.last_message_at.desc(),
+                  Conversation.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+
+    items = [
+        {
+            'id':              convo_id,
+            'partner':         partner,
+            'unread':          unread or 0,
+            'snippet':         _snippet(text, podcast_log_id),
+            'last_message_at': last_message_at,
+        }
+        for convo_id, partner, unread, last_message_at, text, podcast_log_id in rows[:per_page]
+    ]
+    return items, len(rows) > per_page
+
+
+# ─── HISTORY WINDOWS ───────────────────────────────────────
+
+WINDOW_SIZE = 50
+
+
+def message_window(convo_id, before_id=None, after_id=None, limit=WINDOW_SIZE):
+    """
+    Up to `limit` messages of a conversation in chronological order.
+    With no cursor that's the latest window; `before_id` pages back through
+    older history and `after_id` catches up on newer messages.  Walks the
+    (conversation_id, created_at, id) index from the anchor.
+    Returns (messages, has_more).
+    """
+    query = Message.query \
+        .filter(Message.conversation_id == convo_id) \
+        .options(joinedload(Message.sender),
+                 joinedload(Message.podcast_log).joinedload(PodcastLog.podcast))
+
+    anchor_id = before_id or after_id
+    if anchor_id:
+        anchor_ts = db.session.query(Message.created_at) \
+            .filter(Message.id == anchor_id, Message.conversation_id == convo_id) \
+            .scalar_subquery()
+        if after_id:
+            query = query.filter(or_(
+                Message.created_at > anchor_ts,
+                and_(Message.created_at == anchor_ts, Message.id > anchor_id)
+            ))
+        else:
+            query = query.filter(or_(
+                Message.created_at < anchor_ts,
+                and_(Message.created_at == anchor_ts, Message.id < anchor_id)
+            ))
+
+    if after_id:
+        rows = query.order_by(Message.created_at.asc(), Message.id.asc()) \
+            .limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+
+    rows = query.order_by(Message.created_at.desc(), Message.id.desc()) \
+        .limit(limit + 1).all()
+    return list(reversed(rows[:limit])), len(rows) > limit
+
+
+def message_to_dict(msg):
+    """JSON shape used by the chat endpoints for a single message."""
+    sender = msg.sender
+    data = {
+        'id':              msg.id,
+        'text':            msg.text,
+        'created_at':      msg.created_at.isoformat(),
+        'sender_id':       msg.sender_id,
+        'username':        sender.display_name or sender.username,
+        'profile_pic_url': url_for(
+            'static',
+            filename='uploads/' + (sender.profile_pic or 'default.png')
+        ),
+        'podcast':         None
+    }
+    plog = msg.podcast_log
+    if plog and plog.podcast:
+        pod = plog.podcast
+        data['podcast'] = {
+            'name':       pod.name,
+            'ep_name':    plog.ep_name or '–',
+            'platform':   plog.platform or '–',
+            'duration':   (plog.duration // 60) if plog.duration else None,
+            'genre':      plog.genre or pod.genre,
+            'rating':     plog.rating,
+            'review':     plog.review,
+            'image_url':  pod.image_url
+        }
+    return data
+
+
+# ─── LIVE DELIVERY ─────────────────────────────────────────
+
+def channel_for(convo_id):
+    return f'conversation:{convo_id}'
+
+
+def publish_message(msg):
+    """Push a freshly committed message to everyone watching its conversation."""
+    get_broker().publish(channel_for(msg.conversation_id), {
+        'type':    'message',
+        'message': message_to_dict(msg),
+    })
+
+
+def publish_read(convo_id, reader_id, up_to_id):
+    """Tell the other side that `reader_id` has read up to message `up_to_id`."""
+    get_broker().publish(channel_for(convo_id), {
+        'type':      'read',
+        'reader_id': reader_id,
+        'up_to_id':  up_to_id,
+    })
+
+
+def event_stream(subscription, keepalive=15):
+    """
+    Server-Sent Events body for one subscriber.  Sends a comment line every
+    `keepalive` seconds so proxies don't drop an idle connection, and
+    unsubscribes when the client goes away.
+    """
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            event = subscription.get(timeout=keepalive)
+            if event is None:
+                yield ': keep-alive\n\n'
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,297 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+from app.db import db
+from app.models import Podcast
+from app import spotify
+
+
+# ─── PLACEHOLDERS ──────────────────────────────────────────
+
+def get_or_create_placeholder(spotify_id, name=None, genre=None):
+    """
+    The Podcast row for `spotify_id`, inserting a bare placeholder (no
+    Spotify call) if there isn't one yet.  Returns (podcast, created).
+    Caller commits.
+    """
+    podcast = Podcast.query.filter_by(spotify_id=spotify_id).first()
+    if podcast:
+        if genre and not podcast.genre:
+            podcast.genre = genre
+        return podcast, False
+
+    podcast = Podcast(spotify_id=spotify_id,
+                      name=(name or spotify_id)[:120],
+                      genre=genre)
+    try:
+        with db.session.begin_nested():
+            db.session.add(podcast)
+    except IntegrityError:
+        # another request inserted it first — use theirs
+        return Podcast.query.filter_by(spotify_id=spotify_id).one(), False
+    return podcast, True
+
+
+def without_placeholders(query=None):
+    """
+    `query` (every podcast by default) minus placeholders Spotify hasn't
+    confirmed yet.  Their names are whatever a user typed, so they're kept
+    out of anything shown to other users; a 404 from Spotify leaves them
+    out for good.
+    """
+    query = query if query is not None else Podcast.query
+    return query.filter(db.or_(Podcast.enriched_at != None, Podcast.spotify_id == None))
+
+
+def apply_show(podcast, show):
+    """Copy a Spotify show object onto a Podcast row."""
+    images = show.get("images") or []
+    podcast.name        = show.get("name") or podcast.name
+    podcast.description = show.get("description")
+    podcast.publisher   = show.get("publisher")
+    podcast.image_url   = images[0]["url"] if images else None
+    podcast.enriched_at = datetime.utcnow()
+
+
+# ─── WORKER POOL ───────────────────────────────────────────
+
+class Enricher:
+    """
+    Fills placeholder Podcast rows from Spotify on a small thread pool.
+    A show already queued or in flight isn't queued again; callers get the
+    same future back.
+    """
+
+    def __init__(self, app, workers=4):
+        self.app      = app
+        self._pool    = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='podcast-enrich')
+        self._lock    = threading.Lock()
+        self._pending = {}       # spotify_id -> Future
+
+    def submit(self, spotify_id):
+        with self._lock:
+            future = self._pending.get(spotify_id)
+            if future is not None:
+                return future
+            future = self._pending[spotify_id] = self._pool.submit(self._run, spotify_id)
+        # outside the lock: on a job that has already finished, the
+        # callback runs right here and takes the lock itself
+        future.add_done_callback(lambda f: self._done(spotify_id, f))
+        return future
+
+    def _done(self, spotify_id, future):
+        with self._lock:
+            if self._pending.get(spotify_id) is future:
+                del self._pending[spotify_id]
+
+    def _run(self, spotify_id):
+        with self.app.app_context():
+            try:
+                return enrich(spotify_id)
+            except Exception as e:
+                # the row stays a placeholder; `flask podcasts enrich` retries it
+                db.session.rollback()
+                current_app.logger.warning(f"Enriching podcast {spotify_id} failed: {e}")
+                return False
+            finally:
+                db.session.remove()
+
+    def drain(self, timeout=None):
+        """Wait for everything queued so far (tests, shutdown)."""
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout=timeout)
+
+
+def enrich(spotify_id):
+    """Fetch one show from Spotify and fill in its Podcast row.  Returns True if updated."""
+    podcast = Podcast.query.filter_by(spotify_id=spotify_id).first()
+    if podcast is None or podcast.enriched_at is not None:
+        return False
+    show = spotify.get_client().get(f"shows/{spotify_id}")
+    apply_show(podcast, show)
+    db.session.commit()
+    return True
+
+
+def init_app(app):
+    app.extensions['podcast_enricher'] = Enricher(app, workers=app.config.get('ENRICH_WORKERS', 4))
+
+
+def get_enricher():
+    return current_app.extensions['podcast_enricher']
+
+
+def enqueue(spotify_id):
+    """Queue a placeholder for enrichment once its row is committed."""
+    return get_enricher().submit(spotify_id)
+
+
+# ─── BULK CATALOG REFRESH ──────────────────────────────────
+
+SHOWS_PER_REQUEST = 50     # Spotify's limit for GET /shows?ids=
+REFRESHED_FIELDS = ('name', 'description', 'publisher', 'image_url')
+
+
+class CatalogRefreshError(RuntimeError):
+    """A chunk failed; the checkpoint stops just before it."""
+
+
+class Checkpoint:
+    """Last Podcast.id a refresh got through, in a JSON file, so a rerun resumes there."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as fh:
+                return json.load(fh).get('last_id', 0)
+        except (OSError, ValueError):
+            return 0
+
+    def save(self, last_id):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'last_id': last_id, 'saved_at': datetime.utcnow().isoformat()}, fh)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _show_fields(show):
+    images = show.get("images") or []
+    return {
+        'name':        show.get("name"),
+        'description': show.get("description"),
+        'publisher':   show.get("publisher"),
+        'image_url':   images[0]["url"] if images else None,
+    }
+
+
+def refresh_catalog(client, chunk_size=SHOWS_PER_REQUEST, workers=4,
+                    checkpoint=None, restart=False, echo=None):
+    """
+    Re-fetch every Podcast with a spotify_id through the several-shows
+    endpoint, `chunk_size` ids per request and up to `workers` requests in
+    flight.  Rows whose fields changed are written back with one bulk
+    UPDATE per round, and the checkpoint (if any) advances as each round
+    commits, so an interrupted run picks up where it left off.
+    Returns throughput stats; raises CatalogRefreshError if a chunk fails.
+    """
+    chunk_size = min(chunk_size, SHOWS_PER_REQUEST)
+    last_id = 0 if (restart or checkpoint is None) else checkpoint.load()
+    stats = {'resumed_from': last_id, 'shows': 0, 'updated': 0, 'missing': 0, 'requests': 0}
+    started = time.monotonic()
+
+    def fetch(ids):
+        data = client.get("shows", params={"ids": ",".join(ids), "market": "US"})
+        return data.get("shows") or []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='catalog-refresh') as pool:
+        while True:
+            rows = db.session.query(Podcast.id, Podcast.spotify_id,
+                                    *(getattr(Podcast, f) for f in REFRESHED_FIELDS)) \
+                .filter(Podcast.id > last_id, Podcast.spotify_id != None) \
+                .order_by(Podcast.id) \
+                .limit(chunk_size * workers) \
+                .all()
+            if not rows:
+                break
+            chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+            futures = [pool.submit(fetch, [r.spotify_id for r in chunk]) for chunk in chunks]
+
+            updates, failure = [], None
+            now = datetime.utcnow()
+            for chunk, future in zip(chunks, futures):
+                try:
+                    shows = future.result()
+                except Exception as e:
+                    failure = e
+                    break
+                stats['requests'] += 1
+                by_id = {show['id']: show for show in shows if show}
+                for row in chunk:
+                    show = by_id.get(row.spotify_id)
+                    stats['shows'] += 1
+                    if show is None:
+                        stats['missing'] += 1
+                        continue
+                    fields = _show_fields(show)
+                    changed = {f: v for f, v in fields.items()
+                               if v is not None and v != getattr(row, f)}
+                    if changed:
+                        updates.append(dict(changed, id=row.id, enriched_at=now))
+                last_id = chunk[-1].id
+
+            if updates:
+                db.session.bulk_update_mappings(Podcast, updates)
+                stats['updated'] += len(updates)
+            db.session.commit()
+            if checkpoint is not None:
+                checkpoint.save(last_id)
+            if echo:
+                elapsed = time.monotonic() - started
+                echo(f"  through podcast #{last_id}: {stats['shows']} shows, "
+                     f"{stats['updated']} updated, {stats['shows'] / elapsed:.1f} shows/s")
+            if failure is not None:
+                raise CatalogRefreshError(
+                    f"Refresh stopped after podcast #{last_id}: {failure}") from failure
+
+    if checkpoint is not None:
+        checkpoint.clear()
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    stats['shows_per_second'] = round(stats['shows'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+    return stats
+
+
+# ─── CLI ───────────────────────────────────────────────────
+
+podcast_cli = AppGroup('podcasts', help='Maintain podcast metadata.')
+
+
+@podcast_cli.command('enrich')
+def enrich_command():
+    """Fill in any placeholder podcasts still missing Spotify metadata."""
+    pending = [sid for (sid,) in db.session.query(Podcast.spotify_id)
+               .filter(Podcast.enriched_at == None, Podcast.spotify_id != None)]
+    enricher = get_enricher()
+    for sid in pending:
+        enricher.submit(sid)
+    enricher.drain()
+    left = Podcast.query.filter(Podcast.enriched_at == None, Podcast.spotify_id != None).count()
+    click.echo(f'Enriched {len(pending) - left} of {len(pending)} placeholder podcasts.')
+
+
+@podcast_cli.command('refresh')
+@click.option('--workers', type=int, default=4, show_default=True, help='Requests in flight at once.')
+@click.option('--chunk-size', type=int, default=SHOWS_PER_REQUEST, show_default=True,
+              help='Shows per request (Spotify allows 50).')
+@click.option('--restart', is_flag=True, help='Ignore any saved checkpoint and start from the top.')
+def refresh_command(workers, chunk_size, restart):
+    """Re-fetch podcast metadata from Spotify in bulk (resumable)."""
+    checkpoint = Checkpoint(os.path.join(current_app.instance_path, 'catalog_refresh.json'))
+    try:
+        stats = refresh_catalog(spotify.get_client(), chunk_size=chunk_size, workers=workers,
+                                checkpoint=checkpoint, restart=restart, echo=click.echo)
+    except CatalogRefreshError as e:
+        raise click.ClickException(f'{e} — run again to resume.')
+    click.echo(
+        f"Refreshed {stats['shows']} shows in {stats['seconds']}s "
+        f"({stats['shows_per_second']} shows/s, {stats['requests']} requests): "
+        f"{stats['updated']} updated, {stats['missing']} not found on Spotify."
+    )
@@ -0,0 +1,130 @@
+import base64
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from flask import url_for
+from sqlalchemy import or_, and_
+
+from app.db import db
+from app.models import User, Podcast, PodcastLog, Like, Comment
+
+
+def hydrate_posts(logs, viewer_id):
+    """
+    Turn a page of shared PodcastLog rows into the JSON dicts the feed
+    renders.  Posters, podcasts, "liked by me" flags and comments are each
+    fetched with one IN-lookup for the whole page (like totals come from the
+    log's own counter), so the query count stays fixed however many posts
+    are on it.
+    """
+    if not logs:
+        return []
+
+    post_ids    = [log.id for log in logs]
+    user_ids    = {log.user_id for log in logs}
+    podcast_ids = {log.podcast_id for log in logs if log.podcast_id}
+
+    # 1) posters & podcasts
+    posters = {
+        u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()
+    }
+    podcasts = {
+        p.id: p for p in Podcast.query.filter(Podcast.id.in_(podcast_ids)).all()
+    } if podcast_ids else {}
+
+    # 2) which of these posts the viewer has liked
+    liked_ids = {
+        post_id for (post_id,) in
+        db.session.query(Like.post_id)
+        .filter(Like.post_id.in_(post_ids), Like.user_id == viewer_id)
+        .all()
+    }
+
+    # 3) comments with their authors, oldest first
+    comments_by_post = defaultdict(list)
+    rows = (
+        db.session.query(Comment.post_id, Comment.text, User.username, User.display_name)
+        .join(User, User.id == Comment.user_id)
+        .filter(Comment.post_id.in_(post_ids))
+        .order_by(Comment.created_at.asc(), Comment.id.asc())
+        .all()
+    )
+    for post_id, text, username, display_name in rows:
+        comments_by_post[post_id].append({
+            'commenter': display_name or username,
+            'text':      text
+        })
+
+    posts = []
+    for log in logs:
+        poster  = posters.get(log.user_id)
+        podcast = podcasts.get(log.podcast_id)
+        posts.append({
+          'id':              log.id,
+          'podcast_name':    podcast.name if podcast else None,
+          'podcast_image':   podcast.image_url if podcast else None,
+          'ep_name':         log.ep_name,
+          'platform':        log.platform,
+          'duration_min':    (log.duration / 60) if log.duration else None,
+          'genre':           log.genre or (podcast.genre if podcast else None),
+          'rating':          log.rating,
+          'review':          log.review,
+          'poster_username': poster.username if poster else None,
+          'poster_pic':      url_for('static', filename='uploads/' + (poster.profile_pic if poster else 'default.png')),
+          'likes':           log.like_count or 0,
+          'liked':           log.id in liked_ids,
+          'comments':        comments_by_post.get(log.id, [])
+        })
+    return posts
+
+
+# ─── KEYSET PAGINATION ──────────────────────────────────────
+
+def encode_cursor(listened_at, row_id):
+    """Opaque cursor pointing just past the row at (listened_at, row_id)."""
+    raw = json.dumps([listened_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (listened_at, id) for a cursor, or None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ts, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def keyset_page(query, cursor=None, per_page=9,
+                order=(PodcastLog.listened_at, PodcastLog.id)):
+    """
+    Fetch one page of `query` newest-first by the (timestamp, id) columns in
+    `order`, starting after `cursor`.  Seeks straight to the position instead
+    of OFFSET-scanning and never issues a COUNT; one extra row is read to know
+    if there is more.  Returns (items, next_cursor).
+    """
+    ts_col, id_col = order
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            raise ValueError('Invalid cursor')
+        listened_at, row_id = position
+        query = query.filter(or_(
+            ts_col < listened_at,
+            and_(ts_col == listened_at, id_col < row_id)
+        ))
+
+    rows = (
+        query
+        .order_by(ts_col.desc(), id_col.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
+    return items, next_cursor
@@ -0,0 +1,184 @@
+import re
+import unicodedata
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+from sqlalchemy import event
+
+from app.db import db
+from app.models import Podcast, PodcastLog
+
+# SQLite FTS5 indexes over podcast metadata and log entries.  They are
+# "external content" tables: the text lives only in podcast/podcast_log
+# and triggers keep the index in step, so bulk UPDATEs that bypass the ORM
+# (the catalog refresh) are indexed too.  Other engines fall back to LIKE.
+#
+# The same DDL is in migration 9b2d4f6e8c15.  Alembic batch operations
+# rebuild SQLite tables and lose their triggers — run `flask search
+# reindex` after any migration that batch-alters podcast or podcast_log.
+
+INDEXES = {
+    # fts table: (content table, indexed columns, bm25 column weights)
+    'podcast_fts':     ('podcast',     ('name', 'publisher', 'description'), (10.0, 3.0, 1.0)),
+    'podcast_log_fts': ('podcast_log', ('ep_name', 'review'),               (4.0, 1.0)),
+}
+
+
+def _ddl(fts):
+    table, columns, _ = INDEXES[fts]
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+
+        # only the indexed columns: counter bumps don't touch the index
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def _install(fts, table):
+    def create(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            for stmt in _ddl(fts):
+                connection.exec_driver_sql(stmt)
+
+    def drop(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {fts}")
+
+    event.listen(table, 'after_create', create)
+    event.listen(table, 'before_drop', drop)
+
+
+for _fts, (_table, _, _) in INDEXES.items():
+    _install(_fts, db.metadata.tables[_table])
+
+
+def enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def rebuild():
+    """(Re)create the indexes and triggers and re-read every row into them."""
+    if not enabled():
+        return False
+    with db.engine.begin() as conn:
+        for fts in INDEXES:
+            for stmt in _ddl(fts):
+                conn.exec_driver_sql(stmt)
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    return True
+
+
+# ─── QUERYING ──────────────────────────────────────────────
+
+_WORD = re.compile(r'\w+')
+
+
+def terms(q):
+    return _WORD.findall(q.casefold())
+
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+
+def tokens(text):
+    """
+    `text` split and folded the way the index's unicode61 tokenizer does
+    it: lowercased, diacritics dropped ("Café" → "cafe") and broken at
+    anything that isn't a letter or digit, "_" included.
+    """
+    text = unicodedata.normalize('NFD', text.lower())
+    return _TOKEN.findall(''.join(c for c in text if not unicodedata.combining(c)))
+
+
+def match_expression(q, columns=None):
+    """
+    FTS5 query for `q`: every word must match the start of a token, so
+    "ser kil" finds "Serial Killers".  `columns` narrows where.
+    """
+    words = terms(q)
+    if not words:
+        return None
+    expr = ' '.join(f'"{w}"*' for w in words)
+    if columns:
+        expr = '{%s} : (%s)' % (' '.join(columns), expr)
+    return expr
+
+
+def _matches(fts, expr):
+    """rowid + bm25 score (lower is better) of the rows matching `expr`."""
+    weights = ', '.join(str(w) for w in INDEXES[fts][2])
+    return sa.select(sa.literal_column('rowid').label('id'),
+                     sa.literal_column(f'bm25({fts}, {weights})').label('score')) \
+        .select_from(sa.text(fts)) \
+        .where(sa.text(f'{fts} MATCH :match').bindparams(match=expr)) \
+        .subquery()
+
+
+def _like(q, columns):
+    # every word somewhere in one of the columns
+    return sa.and_(*(sa.or_(*(c.ilike(f'%{w}%') for c in columns)) for w in terms(q)))
+
+
+def search_podcasts(q, limit=10, columns=None, query=None):
+    """
+    Podcasts matching `q`, best first: a hit in the name outranks one in
+    the publisher, which outranks the description.  `columns` limits the
+    fields searched; `query` is a Podcast query to narrow further (any
+    ordering it has comes before relevance).
+    """
+    query = query if query is not None else Podcast.query
+    if not terms(q):
+        return []
+    if enabled():
+        m = _matches('podcast_fts', match_expression(q, columns))
+        query = query.join(m, m.c.id == Podcast.id).order_by(m.c.score, Podcast.id)
+    else:
+        cols = [getattr(Podcast, c) for c in (columns or INDEXES['podcast_fts'][1])]
+        starts = db.case((Podcast.name.ilike(f'{q}%'), 0), else_=1)
+        query = query.filter(_like(q, cols)).order_by(starts, Podcast.name)
+    return query.limit(limit).all()
+
+
+def search_logs(q, user_id=None, limit=20):
+    """Log entries whose episode name or review match `q`, best first."""
+    query = PodcastLog.query
+    if user_id is not None:
+        query = query.filter(PodcastLog.user_id == user_id)
+    if not terms(q):
+        return []
+    if enabled():
+        m = _matches('podcast_log_fts', match_expression(q))
+        query = query.join(m, m.c.id == PodcastLog.id) \
+            .order_by(m.c.score, PodcastLog.listened_at.desc())
+    else:
+        query = query.filter(_like(q, [PodcastLog.ep_name, PodcastLog.review])) \
+            .order_by(PodcastLog.listened_at.desc())
+    return query.limit(limit).all()
+
+
+# ─── CLI ───────────────────────────────────────────────────
+
+search_cli = AppGroup('search', help='Maintain the full-text search indexes.')
+
+
+@search_cli.command('reindex')
+def reindex_command():
+    """Rebuild the podcast and log full-text indexes from their tables."""
+    if rebuild():
+        click.echo('Full-text indexes rebuilt.')
+    else:
+        click.echo('Full-text search needs SQLite; LIKE matching is used instead.')
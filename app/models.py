@@ -1,9 +1,10 @@
 from app.db import db
 from datetime import datetime
 from flask_login import UserMixin
-from flask_bcrypt import Bcrypt
+from sqlalchemy import event
 from sqlalchemy.orm import synonym
-bcrypt = Bcrypt()
+from app.timebuckets import DEFAULT_TIMEZONE
+from app import passwords
 
 
 class User(db.Model, UserMixin):
@@ -24,6 +25,11 @@ class User(db.Model, UserMixin):
         default='default.png'
     )
     created_at   = db.Column(db.DateTime, default=datetime.utcnow)
+    # conversations with at least one unread message to me; kept up to date
+    # on message insert / mark-read so page renders don't have to count
+    unread_conversations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # IANA name used for local times and listening buckets (None = app default)
+    timezone     = db.Column(db.String(64))
 
 # People I've added
     friends_added = db.relationship(
@@ -53,12 +59,25 @@ class User(db.Model, UserMixin):
         return User.query.join(Friendship, User.id == Friendship.user_id)\
                         .filter(Friendship.friend_id == self.id)
 
+    @property
+    def tz_name(self):
+        return self.timezone or DEFAULT_TIMEZONE
+
     def set_password(self, password):
-        # bcrypt imported below
-        self.pw_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        # hashed on the app's bounded bcrypt pool; may raise passwords.HasherBusy
+        self.pw_hash = passwords.get_hasher().hash(password)
+
+    def set_unusable_password(self):
+        """For accounts that only ever sign in through Google: no bcrypt work at all."""
+        self.pw_hash = passwords.UNUSABLE
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.pw_hash, password)
+        return passwords.get_hasher().verify(self.pw_hash, password)
+
+    @property
+    def password_needs_rehash(self):
+        """Stored hash uses a different bcrypt cost than BCRYPT_LOG_ROUNDS."""
+        return passwords.get_hasher().needs_rehash(self.pw_hash)
     
 class Friendship(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -115,6 +134,8 @@ class Podcast(db.Model):
     image_url = db.Column(db.String(255))
     predicted_popularity = db.Column(db.Float, default=0.0)
     similar_to = db.Column(db.String(200))  # JSON string
+    # None while the row is a placeholder waiting on Spotify metadata
+    enriched_at = db.Column(db.DateTime)
     
 
 
@@ -137,6 +158,17 @@ class PodcastLog(db.Model):
     podcast = db.relationship('Podcast', backref='logs')
     shared    = db.Column(db.Boolean, nullable=False, default=False)
 
+    # denormalised counters, kept in step with Like/Comment rows (see below)
+    like_count    = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # keyset pagination of the share feed seeks on (listened_at, id)
+        db.Index('ix_podcast_log_shared_feed', 'shared', 'listened_at', 'id'),
+        # per-user history scans and date-range analytics
+        db.Index('ix_podcast_log_user_listened', 'user_id', 'listened_at'),
+    )
+
 class Like(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -156,6 +188,90 @@ class Comment(db.Model):
 
     user = db.relationship('User', backref='comments')
 
+
+class TimelineEntry(db.Model):
+    """
+    Materialised friends feed: one row per (reader, shared log), written when
+    a log is shared and fanned out to the sharer's friends.
+    """
+    __tablename__ = 'timeline_entry'
+
+    id          = db.Column(db.Integer, primary_key=True)
+    user_id     = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)         # whose timeline
+    log_id      = db.Column(db.Integer, db.ForeignKey('podcast_log.id'), nullable=False)
+    author_id   = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)         # who shared it
+    listened_at = db.Column(db.DateTime, nullable=False)                                  # copied for ordering
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'log_id', name='uq_timeline_user_log'),
+        db.Index('ix_timeline_user_listened', 'user_id', 'listened_at', 'log_id'),
+    )
+
+
+class ListeningRollup(db.Model):
+    """
+    Per-user daily listening totals, one row per (user, day, podcast, genre).
+    Maintained incrementally as logs come and go, so the dashboard reads
+    rows bounded by calendar days rather than by raw log count.
+    """
+    __tablename__ = 'listening_rollup'
+
+    id           = db.Column(db.Integer, primary_key=True)
+    user_id      = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day          = db.Column(db.Date, nullable=False)
+    podcast_id   = db.Column(db.Integer, db.ForeignKey('podcast.id'))
+    genre        = db.Column(db.String(64), nullable=False, default='')   # '' = unknown
+    duration_sum = db.Column(db.Integer, nullable=False, default=0)       # seconds
+    rating_sum   = db.Column(db.Float, nullable=False, default=0.0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    log_count    = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'podcast_id', 'genre', name='uq_rollup_key'),
+    )
+
+
+class TrendingSnapshot(db.Model):
+    """Last persisted state of one trending window (see app/trending.py)."""
+    __tablename__ = 'trending_snapshot'
+
+    window   = db.Column(db.String(16), primary_key=True)   # '24h', '7d'
+    state    = db.Column(db.Text, nullable=False)           # JSON sketch + candidates
+    saved_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+def _bump_post_counter(connection, post_id, column, delta):
+    """
+    Adjust a PodcastLog counter with a single UPDATE on the flush's own
+    connection, so it commits or rolls back together with the Like/Comment.
+    """
+    table = PodcastLog.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == post_id)
+        .values({column: table.c[column] + delta})
+    )
+
+
+@event.listens_for(Like, 'after_insert')
+def _like_inserted(mapper, connection, target):
+    _bump_post_counter(connection, target.post_id, 'like_count', 1)
+
+
+@event.listens_for(Like, 'after_delete')
+def _like_deleted(mapper, connection, target):
+    _bump_post_counter(connection, target.post_id, 'like_count', -1)
+
+
+@event.listens_for(Comment, 'after_insert')
+def _comment_inserted(mapper, connection, target):
+    _bump_post_counter(connection, target.post_id, 'comment_count', 1)
+
+
+@event.listens_for(Comment, 'after_delete')
+def _comment_deleted(mapper, connection, target):
+    _bump_post_counter(connection, target.post_id, 'comment_count', -1)
+
 class Message(db.Model):
     __tablename__ = 'message'
 
@@ -166,7 +282,7 @@ class Message(db.Model):
     podcast_log_id  = db.Column(db.Integer, db.ForeignKey('podcast_log.id'), nullable=True)
     text            = db.Column(db.Text, nullable=True)
     created_at      = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    read            = db.Column(db.Boolean, default=False, nullable=False)
+    # read state lives on the Conversation as per-participant watermarks
 
     # the other side of Conversation.messages
     conversation = db.relationship(
@@ -188,6 +304,13 @@ class Message(db.Model):
 
     # if you need the original podcast-log entry on a chat
     podcast_log = db.relationship('PodcastLog', foreign_keys=[podcast_log_id])
+
+    __table_args__ = (
+        # chat history is read newest-first in windows per conversation
+        db.Index('ix_message_convo_created', 'conversation_id', 'created_at', 'id'),
+        # unread = messages to me above my watermark: a range count on this
+        db.Index('ix_message_convo_recipient', 'conversation_id', 'recipient_id', 'id'),
+    )
 class Conversation(db.Model):
     __tablename__ = 'conversation'
 
@@ -195,10 +318,25 @@ class Conversation(db.Model):
     user1_id  = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user2_id  = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # read watermarks: highest message id each participant has read
+    user1_last_read_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    user2_last_read_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     __table_args__ = (
         db.UniqueConstraint('user1_id', 'user2_id', name='uq_conversation_pair'),
     )
 
+    @staticmethod
+    def last_read_column(user_id):
+        """SQL expression for `user_id`'s watermark on a conversation row."""
+        return db.case(
+            (Conversation.user1_id == user_id, Conversation.user1_last_read_id),
+            else_=Conversation.user2_last_read_id
+        )
+
+    def last_read_id(self, user_id):
+        return self.user1_last_read_id if user_id == self.user1_id else self.user2_last_read_id
+
     # RELATIONSHIPS:
     user1 = db.relationship(
         'User',
@@ -211,9 +349,39 @@ class Conversation(db.Model):
         backref=db.backref('conversations_as_user2', lazy='dynamic')
     )
 
+    # dynamic so touching convo.messages never pulls the whole history;
+    # use chat.message_window() to read it a page at a time
     messages = db.relationship(
         'Message',
         back_populates='conversation',
         cascade='all, delete-orphan',
-        order_by='Message.created_at.asc()'
+        order_by='Message.created_at.asc()',
+        lazy='dynamic'
     )
+
+
+@event.listens_for(Message, 'after_insert')
+def _message_inserted(mapper, connection, target):
+    """First unread message in a conversation → one more unread conversation."""
+    msg, convo = Message.__table__, Conversation.__table__
+    watermark = connection.execute(
+        db.select(db.case(
+            (convo.c.user1_id == target.recipient_id, convo.c.user1_last_read_id),
+            else_=convo.c.user2_last_read_id
+        )).where(convo.c.id == target.conversation_id)
+    ).scalar() or 0
+    earlier_unread = connection.execute(
+        db.select(msg.c.id)
+        .where(msg.c.conversation_id == target.conversation_id,
+               msg.c.recipient_id == target.recipient_id,
+               msg.c.id > watermark,
+               msg.c.id != target.id)
+        .limit(1)
+    ).first()
+    if earlier_unread is None:
+        users = User.__table__
+        connection.execute(
+            users.update()
+            .where(users.c.id == target.recipient_id)
+            .values(unread_conversations=users.c.unread_conversations + 1)
+        )
@@ -0,0 +1,95 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from flask_bcrypt import generate_password_hash, check_password_hash
+
+DEFAULT_ROUNDS = 12
+# pw_hash for accounts that never sign in with a password (Google); no
+# bcrypt hash can equal it, so check_password() is always False
+UNUSABLE = '!'
+
+
+class HasherBusy(RuntimeError):
+    """More hashes are waiting than the queue allows; the caller should back off."""
+
+
+def hash_cost(pw_hash):
+    """Work factor of a bcrypt hash ("$2b$12$…" → 12), or None if it isn't one."""
+    parts = (pw_hash or '').split('$')
+    if len(parts) < 4 or not parts[1].startswith('2') or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """
+    bcrypt on a small dedicated pool, so a burst of logins can only keep
+    `workers` cores busy hashing rather than every request thread.  At most
+    `max_queue` more may wait behind them; past that, calls fail fast with
+    HasherBusy instead of piling up.  workers=0 hashes inline (scripts,
+    code running outside the app).
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=2, max_queue=16):
+        self.rounds = rounds
+        self._pool  = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt') \
+            if workers else None
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self._lock  = threading.Lock()
+        self.counts = {'hashed': 0, 'verified': 0, 'shed': 0}
+
+    def _count(self, what):
+        with self._lock:
+            self.counts[what] += 1
+
+    def _run(self, fn, *args):
+        if self._pool is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self._count('shed')
+            raise HasherBusy('Password hashing queue is full')
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        pw_hash = self._run(generate_password_hash, password, self.rounds).decode('utf-8')
+        self._count('hashed')
+        return pw_hash
+
+    def verify(self, pw_hash, password):
+        if hash_cost(pw_hash) is None:
+            return False        # placeholder or unusable hash: nothing to compare
+        ok = self._run(check_password_hash, pw_hash, password)
+        self._count('verified')
+        return ok
+
+    def needs_rehash(self, pw_hash):
+        cost = hash_cost(pw_hash)
+        return cost is not None and cost != self.rounds
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, rounds=self.rounds)
+
+
+_inline = PasswordHasher(workers=0)
+
+
+def init_app(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_queue=app.config.get('PASSWORD_HASH_QUEUE', 16)
+    )
+
+
+def get_hasher():
+    if has_app_context():
+        return current_app.extensions.get('password_hasher', _inline)
+    return _inline
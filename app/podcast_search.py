@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app
+
+from app.db import db
+from app.models import Podcast
+from app import spotify, fulltext, enrichment
+
+
+# ─── LOCAL CATALOG ─────────────────────────────────────────
+
+def _summary(podcast):
+    # same shape as spotify._show_summary, so the log form can't tell them apart
+    return {
+        "id":        podcast.spotify_id,
+        "name":      podcast.name,
+        "publisher": podcast.publisher,
+        "image":     podcast.image_url,
+    }
+
+
+def local_podcasts(q, limit=10):
+    """
+    Podcasts we already have (and can log against, so with a spotify_id,
+    and confirmed by Spotify) with a word in the name starting with each
+    word of `q`: names starting with it first, then the most popular.
+    """
+    q = spotify.normalize_query(q)
+    if not q:
+        return []
+    starts = db.case((Podcast.name.ilike(f"{q}%"), 0), else_=1)
+    query = enrichment.without_placeholders() \
+        .filter(Podcast.spotify_id != None) \
+        .order_by(starts, Podcast.predicted_popularity.desc())
+    rows = fulltext.search_podcasts(q, limit, columns=['name'], query=query)
+    return [_summary(p) for p in rows]
+
+
+# ─── LOCAL FIRST, SPOTIFY AS BACKUP ────────────────────────
+
+class PodcastSearch:
+    """
+    Answers podcast lookups from our own catalog, only going to Spotify
+    when that turns up fewer than `min_local` shows.  The Spotify search
+    runs on a small pool and is waited on for at most `wait` seconds; if
+    it's slower than that the local hits go back on their own (flagged
+    partial) and the Spotify results land in the search cache for the
+    next keystroke.
+    """
+
+    def __init__(self, app, min_local=5, wait=1.0, workers=4):
+        self.app       = app
+        self.min_local = min_local
+        self.wait      = wait
+        self._pool     = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='podcast-search')
+        self._lock     = threading.Lock()
+        self.counts    = {'local_only': 0, 'merged': 0, 'late': 0, 'failed': 0}
+
+    def _count(self, what):
+        with self._lock:
+            self.counts[what] += 1
+
+    def _spotify(self, q, limit):
+        with self.app.app_context():
+            return spotify.search_shows(q, limit)
+
+    def search(self, q, limit=10):
+        """(results, partial) — partial when Spotify results were wanted but missing or stale."""
+        local = local_podcasts(q, limit)
+        if len(local) >= min(self.min_local, limit):
+            self._count('local_only')
+            return local, False
+
+        future = self._pool.submit(self._spotify, q, limit)
+        try:
+            shows, stale = future.result(timeout=self.wait)
+        except TimeoutError:
+            self._count('late')
+            return local, True
+        except Exception as e:
+            self._count('failed')
+            current_app.logger.warning(f"Spotify fallback for {q!r} failed: {e}")
+            return local, True
+
+        self._count('merged')
+        seen = {p["id"] for p in local}
+        merged = local + [s for s in shows if s["id"] not in seen]
+        return merged[:limit], stale
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        counts['local_rate'] = round(counts['local_only'] / total, 3) if total else 0.0
+        return counts
+
+
+def init_app(app):
+    app.extensions['podcast_search'] = PodcastSearch(
+        app,
+        min_local=app.config.get('PODCAST_SEARCH_MIN_LOCAL', 5),
+        wait=app.config.get('PODCAST_SEARCH_WAIT', 1.0)
+    )
+
+
+def get_search():
+    return current_app.extensions['podcast_search']
+
+
+def search(q, limit=10):
+    return get_search().search(q, limit)
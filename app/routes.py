@@ -1,24 +1,28 @@
 import os
 import re
 import secrets
-import requests
+import pytz
 from datetime import datetime, date
 from urllib.parse import urlencode
 
 from flask import (
-    Blueprint, render_template, request,
+    Blueprint, render_template, request, Response,
     redirect, url_for, flash, jsonify, current_app, abort
 )
 from flask_login import login_user, logout_user, current_user, login_required
 from flask_mail import Message
 from itsdangerous import SignatureExpired, BadSignature
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import or_, and_, func, desc
-from sqlalchemy import distinct
+from sqlalchemy import or_, and_
 
 from app import mail, make_serializer, oauth
 from app.db import db
-from app.models import User, Podcast, Friendship, PodcastLog, FriendRequest, Like, Comment, Message, Conversation
+from app.models import User, Podcast, Friendship, PodcastLog, FriendRequest, Like, Comment, Message, Conversation, TimelineEntry, ListeningRollup
+from app.feed import hydrate_posts, keyset_page
+from app import (timeline, chat, analytics, trending, spotify, enrichment, podcast_search,
+                 fulltext, user_index, typeahead, passwords)
+from app.timebuckets import is_valid_timezone, GRANULARITIES
+from app.broker import get_broker
 from werkzeug.utils import secure_filename
 
 ALLOWED_EXT = {'png','jpg','jpeg','gif'}
@@ -28,9 +32,6 @@ def allowed_file(filename):
 
 bp = Blueprint("main", __name__)
 
-SPOTIFY_CLIENT_ID     = os.getenv("SPOTIFY_CLIENT_ID")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-
 
 def is_password_strong(pw: str) -> bool:
     """True if pw  ≥8 chars, uppercase, lowercase, digit, and special."""
@@ -43,22 +44,24 @@ def is_password_strong(pw: str) -> bool:
     )
 
 
+@bp.app_errorhandler(passwords.HasherBusy)
+def password_hashing_busy(e):
+    # the bcrypt queue is full: turn the request away now rather than
+    # leave it holding a worker until a hashing slot frees up
+    current_app.logger.warning("Shedding request: password hashing queue full")
+    return Response("Too many sign-ins at once. Please try again in a moment.",
+                    503, {"Retry-After": "2"}, mimetype="text/plain")
+
+
 @bp.context_processor
 def inject_unread_conversations():
     """
-    Count how many *distinct* conversations have at least one
-    unread message to the current_user.
+    How many *distinct* conversations have at least one unread message
+    to the current_user — read off the user row we already loaded.
     """
     total_unread = 0
     if current_user.is_authenticated:
-        total_unread = (
-            db.session.query(distinct(Message.conversation_id))
-            .filter(
-                Message.recipient_id == current_user.id,
-                Message.read == False
-            )
-            .count()
-        )
+        total_unread = current_user.unread_conversations or 0
     return dict(unread_conversations=total_unread)
 
 @bp.route("/")
@@ -158,6 +161,7 @@ def signup():
             user.profile_pic = filename
         db.session.add(user)
         db.session.commit()
+        user_index.note_user(user)
 
         login_user(user)
         return redirect(url_for("main.podcast_log"))
@@ -179,6 +183,13 @@ def login():
             flash('Please sign in with Google instead.', 'warning')
             return redirect(url_for('main.login'))
         if user and user.check_password(pw):
+            if user.password_needs_rehash:
+                # BCRYPT_LOG_ROUNDS changed since this hash was made
+                try:
+                    user.set_password(pw)
+                    db.session.commit()
+                except passwords.HasherBusy:
+                    pass        # keep the old hash; upgrade on a later login
             login_user(user)
             next_page = request.args.get("next")
             return redirect(next_page or url_for("main.podcast_log"))
@@ -239,14 +250,14 @@ def auth_google():
             display_name=user_info.get("name")
         )
         user.auth_provider = "google"
-        dummy_pw = secrets.token_urlsafe(16)
-        user.set_password(dummy_pw)
+        user.set_unusable_password()
         db.session.add(user)
         db.session.commit()
     else:
         # Existing user → sync display_name
         user.display_name = user_info.get("name")
         db.session.commit()
+    user_index.note_user(user)
 
     login_user(user)
     return redirect(url_for("main.podcast_log"), code=303)
@@ -344,6 +355,15 @@ def settings():
                 flash("That email is already taken.", "warning")
             else:
                 current_user.email = new_email
+        # Timezone (drives local times and dashboard buckets)
+        new_tz = form.get("timezone", "").strip()
+        tz_changed = bool(new_tz) and new_tz != current_user.tz_name
+        if tz_changed:
+            if is_valid_timezone(new_tz):
+                current_user.timezone = new_tz
+            else:
+                flash("Unknown timezone.", "warning")
+                tz_changed = False
         # Password change
         pw = form.get("current_password", "")
         new_pw = form.get("new_password", "")
@@ -371,6 +391,10 @@ def settings():
         # Commit all changes
         try:
             db.session.commit()
+            user_index.note_user(current_user)
+            if tz_changed:
+                # local days moved, so re-bucket this user's listening
+                analytics.rebuild_rollups(current_user.id)
             flash("Settings saved.", "success")
         except SQLAlchemyError as e:
             current_app.logger.error(f"Settings save failed: {e}")
@@ -379,7 +403,8 @@ def settings():
 
         return redirect(url_for("main.settings"))
 
-    return render_template("settings.html", user=current_user)
+    return render_template("settings.html", user=current_user,
+                           timezones=pytz.common_timezones)
 
 
 @bp.route("/settings/delete_account", methods=["POST"])
@@ -390,6 +415,11 @@ def delete_account():
         flash("You must type DELETE to confirm account deletion.", "danger")
         return redirect(url_for("main.settings"))
     try:
+        TimelineEntry.query.filter(or_(
+            TimelineEntry.user_id == current_user.id,
+            TimelineEntry.author_id == current_user.id
+        )).delete(synchronize_session=False)
+        ListeningRollup.query.filter_by(user_id=current_user.id).delete()
         PodcastLog.query.filter_by(user_id=current_user.id).delete()
         Friendship.query.filter_by(user_id=current_user.id).delete()
         Friendship.query.filter_by(friend_id=current_user.id).delete()
@@ -397,6 +427,7 @@ def delete_account():
         logout_user()
         db.session.delete(user)
         db.session.commit()
+        user_index.forget_user(user.id)
         flash("Your account has been deleted.", "success")
         return redirect(url_for("main.index"))
     except Exception as e:
@@ -420,67 +451,48 @@ def podcast_log():
 @bp.route('/shareview')
 @login_required
 def shareview():
-    page     = request.args.get('page', 1, type=int)
-    per_page = 9
-    pagination = PodcastLog.query \
-        .filter_by(shared=True) \
-        .order_by(PodcastLog.listened_at.desc()) \
-        .paginate(page=page, per_page=per_page, error_out=False)
-
-    return render_template('shareview.html', pagination=pagination)
+    # posts are streamed in by the page itself from /api/share_posts
+    scope = 'friends' if request.args.get('scope') == 'friends' else 'everyone'
+    return render_template('shareview.html', scope=scope)
 
-# at the top of routes.py
-from flask import url_for
-
-from app.models import Comment, Like  # <-- import your Comment and Like models
 
 @bp.route('/api/share_posts')
 @login_required
 def api_share_posts():
-    page, per_page = request.args.get('page',1,type=int), 9
-    pagination = PodcastLog.query\
-        .filter_by(shared=True)\
+    per_page = 9
+
+    # friends-only timeline: ?scope=friends&cursor=<opaque>
+    if request.args.get('scope') == 'friends':
+        try:
+            items, next_cursor = timeline.friends_feed(
+                current_user.id, request.args.get('cursor'), per_page
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify({
+          'posts':       hydrate_posts(items, current_user.id),
+          'next_cursor': next_cursor
+        })
+
+    feed = PodcastLog.query.filter_by(shared=True)
+
+    # cursor mode: ?cursor=<opaque> (or ?cursor= for the first page)
+    if 'cursor' in request.args:
+        try:
+            items, next_cursor = keyset_page(feed, request.args.get('cursor'), per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify({
+          'posts':       hydrate_posts(items, current_user.id),
+          'next_cursor': next_cursor
+        })
+
+    page = request.args.get('page', 1, type=int)
+    pagination = feed\
         .order_by(PodcastLog.listened_at.desc())\
         .paginate(page=page, per_page=per_page, error_out=False)
 
-    posts = []
-    for log in pagination.items:
-        # pull poster
-        poster = User.query.get(log.user_id)
-
-        # pull likes
-        total_likes = Like.query.filter_by(post_id=log.id).count()
-        liked       = Like.query.filter_by(post_id=log.id, user_id=current_user.id).first() is not None
-
-        # pull comments
-        raw_comments = Comment.query\
-            .filter_by(post_id=log.id)\
-            .order_by(Comment.created_at.asc())\
-            .all()
-        comments = [
-            {
-              'commenter': c.user.display_name or c.user.username,
-              'text':      c.text
-            }
-            for c in raw_comments
-        ]
-
-        posts.append({
-          'id':              log.id,
-          'podcast_name':    log.podcast.name,
-          'podcast_image':   log.podcast.image_url,
-          'ep_name':         log.ep_name,
-          'platform':        log.platform,
-          'duration_min':    (log.duration / 60) if log.duration else None,
-          'genre':           log.genre or log.podcast.genre,
-          'rating':          log.rating,
-          'review':          log.review,
-          'poster_username': poster.username,
-          'poster_pic':      url_for('static', filename='uploads/' + poster.profile_pic),
-          'likes':           total_likes,
-          'liked':           liked,
-          'comments':        comments
-        })
+    posts = hydrate_posts(pagination.items, current_user.id)
 
     return jsonify({
       'posts':    posts,
@@ -499,8 +511,12 @@ def share_podcast(log_id):
 
     try:
         log.shared = True
-        # bump the timestamp so new shares always sort to the top
+        # bump the timestamp so new shares always sort to the top; the
+        # rollup is keyed by the day of listened_at, so move it along
+        analytics.forget_log(log, current_user.tz_name)
         log.listened_at = datetime.utcnow()
+        analytics.record_log(log, current_user.tz_name)
+        timeline.fan_out_share(log)
         db.session.commit()
         return jsonify(success=True)
     except Exception as e:
@@ -524,9 +540,9 @@ def toggle_like(post_id):
         db.session.delete(existing)
     db.session.commit()
 
-    # return new count
-    count = Like.query.filter_by(post_id=post_id).count()
-    return jsonify({ 'success': True, 'likes': count })
+    # return new count straight off the post's counter column
+    db.session.refresh(log, ['like_count'])
+    return jsonify({ 'success': True, 'likes': log.like_count })
 
 
 @bp.route('/api/posts/<int:post_id>/comments', methods=['POST'])
@@ -558,21 +574,7 @@ def post_comment(post_id):
 @login_required
 def visualise():
     # 1) Top 5 by total listen‐time (in minutes), now pulling image_url & publisher
-    top5_q = (
-        db.session
-        .query(
-            Podcast.name,
-            Podcast.image_url,
-            Podcast.publisher,
-            func.sum(PodcastLog.duration).label("total_duration")
-        )
-        .join(PodcastLog, Podcast.id == PodcastLog.podcast_id)
-        .filter(PodcastLog.user_id == current_user.id)
-        .group_by(Podcast.id)
-        .order_by(desc("total_duration"))
-        .limit(5)
-        .all()
-    )
+    top5_q = analytics.top_podcasts(current_user.id, 5)
     top5 = [
        {
          "name": name,
@@ -584,25 +586,7 @@ def visualise():
     ]
 
     # 2) Most loved = highest avg rating, tie‐broken by total listen‐time
-    loved_q = (
-        db.session
-        .query(
-            Podcast.name,
-            func.avg(PodcastLog.rating).label("avg_rating"),
-            func.sum(PodcastLog.duration).label("total_duration")
-        )
-        .join(PodcastLog, Podcast.id == PodcastLog.podcast_id)
-        .filter(
-            PodcastLog.user_id == current_user.id,
-            PodcastLog.rating != None
-        )
-        .group_by(Podcast.id)
-        .order_by(
-            desc("avg_rating"),        # primary sort: average rating
-            desc("total_duration")     # secondary sort: total listen time
-        )
-        .first()
-    )
+    loved_q = analytics.most_loved(current_user.id)
 
     if loved_q:
         most_loved = {
@@ -666,21 +650,15 @@ def search_users():
     q = request.args.get('q', '').strip()
     if not q:
         return jsonify([])
+    index = user_index.get_index()
 
-    matches = (
-        User.query
-            .filter(
-                or_(
-                    User.username.ilike(f'%{q}%'),
-                    User.display_name.ilike(f'%{q}%')
-                ),
-                User.id != current_user.id
-            )
-            .with_entities(User.username)
-            .limit(10)
-            .all()
-    )
-    return jsonify([u.username for u in matches])
+    def load():
+        # answered from the in-memory prefix index, not the DB
+        return [(username, index.name_keys(username, display_name))
+                for username, display_name in index.lookup(q, limit=10, exclude=current_user.id)]
+
+    usernames, _ = typeahead.lookup('users', q, load, typeahead.key_prefix)
+    return jsonify(usernames)
 
 
 
@@ -788,6 +766,8 @@ def respond_friend_request():
                 Friendship(user_id=fr.from_user_id, friend_id=fr.to_user_id),
                 Friendship(user_id=fr.to_user_id,   friend_id=fr.from_user_id)
             ])
+            # and pull each other's recent shares into both timelines
+            timeline.backfill_friendship(fr.from_user_id, fr.to_user_id)
             db.session.commit()
         except Exception as e:
             current_app.logger.error(f"Error creating friendships: {e}")
@@ -834,7 +814,10 @@ def remove_friend(friend_id):
         )
     ).delete(synchronize_session=False)
 
-    # 3) Commit everything in one go
+    # 3) Take each other's posts out of both timelines
+    timeline.prune_friendship(current_user.id, friend_id)
+
+    # 4) Commit everything in one go
     db.session.commit()
 
     return jsonify({'success': True})
@@ -854,9 +837,33 @@ def search_podcast_names():
     q = request.args.get("q", "").strip()
     if not q:
         return jsonify([])
-    results = Podcast.query.filter(Podcast.name.ilike(f"%{q}%"))\
-        .with_entities(Podcast.id, Podcast.name).limit(10).all()
-    return jsonify([{"id": p.id, "name": p.name} for p in results])
+
+    def load():
+        shown = enrichment.without_placeholders()
+        return [({"id": p.id, "name": p.name}, typeahead.words(p.name, p.publisher, p.description))
+                for p in fulltext.search_podcasts(q, limit=10, query=shown)]
+
+    # LIKE (no FTS) matches anywhere in a word, which every_term can't re-check
+    matches = typeahead.every_term if fulltext.enabled() else None
+    results, _ = typeahead.lookup('podcast_names', q, load, matches)
+    return jsonify(results)
+
+
+@bp.route("/api/search/logs")
+@login_required
+def search_my_logs():
+    """The current user's log entries whose episode name or review match ?q=, best first."""
+    q = request.args.get("q", "").strip()
+    limit = min(request.args.get("limit", 20, type=int), 100)
+    logs = fulltext.search_logs(q, user_id=current_user.id, limit=limit)
+    return jsonify([{
+        "id":          log.id,
+        "podcast":     log.podcast.name if log.podcast else None,
+        "episode":     log.ep_name,
+        "review":      log.review,
+        "rating":      log.rating,
+        "listened_at": log.listened_at.isoformat() if log.listened_at else None,
+    } for log in logs])
 
 
 @bp.route("/log_podcast", methods=["POST"])
@@ -880,22 +887,11 @@ def log_podcast():
         return jsonify({"success": False, "message": "Rating is required"}), 400
 
     try:
-        # existing logic to fetch or create Podcast
-        podcast = Podcast.query.filter_by(spotify_id=data["podcast_id"]).first()
-        if not podcast:
-            token = get_spotify_token()
-            headers = {"Authorization": f"Bearer {token}"}
-            resp = requests.get(f"https://api.spotify.com/v1/shows/{data['podcast_id']}", headers=headers)
-            show = resp.json()
-            podcast = Podcast(
-                spotify_id=show["id"],
-                name=show["name"],
-                description=show.get("description"),
-                publisher = show.get("publisher"),                
-                image_url = (show["images"][0]["url"] if show.get("images") else None),
-            )
-            db.session.add(podcast)
-            db.session.commit()
+        # a placeholder is enough to log against; Spotify metadata is
+        # filled in by the background enricher
+        podcast, created = enrichment.get_or_create_placeholder(
+            data["podcast_id"], name=data.get("podcast_name"), genre=data.get("genre")
+        )
 
         # Create the log entry
         log = PodcastLog(
@@ -909,7 +905,17 @@ def log_podcast():
             review     = data.get("review") or None
         )
         db.session.add(log)
+        db.session.flush()
+        analytics.record_log(log, current_user.tz_name)
         db.session.commit()
+        try:
+            trending.record_log(log)
+        except Exception as e:
+            # the log is saved; the next trending rebuild counts it
+            db.session.rollback()
+            current_app.logger.warning(f"Trending update failed for log {log.id}: {e}")
+        if podcast.enriched_at is None:
+            enrichment.enqueue(podcast.spotify_id)
         return jsonify({"success": True, "message": "Podcast logged successfully"})
 
     except Exception as e:
@@ -918,15 +924,40 @@ def log_podcast():
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
-def get_spotify_token():
-    auth_url = "https://accounts.spotify.com/api/token"
-    resp = requests.post(
-        auth_url,
-        data={"grant_type": "client_credentials"},
-        auth=(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET)
-    )
-    return resp.json().get("access_token")
 
+@bp.route("/search_podcasts")
+@login_required
+def search_podcasts():
+    """
+    Podcasts for the log form's autocomplete: our own catalog first, topped
+    up from Spotify (deduped by Spotify id) only when it has too few
+    matches.  X-Search-Partial is "true" when Spotify was wanted but didn't
+    answer in time, or only from a stale cache.
+    """
+    q = request.args.get("q", "").strip()
+    limit = max(min(request.args.get("limit", 10, type=int), 50), 1)
+    if not q:
+        return jsonify([])
+    partial = False
+
+    def load():
+        nonlocal partial
+        results, partial = podcast_search.search(q, limit)
+        entries = [(r, typeahead.words(r["name"], r["publisher"])) for r in results]
+        # Spotify late, failed or stale: fine for now, not for the next keystroke
+        return typeahead.Partial(entries) if partial else entries
+
+    # Local matches are by name-word prefix under FTS, which every_term
+    # re-checks, but LIKE matches anywhere in a word.  Below min_local
+    # matches the real search asks Spotify to top up, so a smaller subset
+    # of a shorter query's results isn't reused either.
+    search = podcast_search.get_search()
+    matches = typeahead.every_term if fulltext.enabled() else None
+    results, _ = typeahead.lookup(f'podcasts:{limit}', q, load, matches, limit,
+                                  min_reuse=min(search.min_local, limit))
+    resp = jsonify(results)
+    resp.headers["X-Search-Partial"] = "true" if partial else "false"
+    return resp
 
 
 @bp.route("/search_spotify_podcasts")
@@ -935,21 +966,23 @@ def search_spotify_podcasts():
     q = request.args.get("q", "").strip()
     if not q:
         return jsonify([])
+    stale = False
+
+    def load():
+        nonlocal stale
+        shows, stale = spotify.search_shows(q)
+        # only the name and publisher are at hand to re-check against, so
+        # reusing these for a longer query may drop description-only matches
+        entries = [(s, typeahead.words(s["name"], s["publisher"])) for s in shows]
+        # don't hand stale results to the next keystroke
+        return typeahead.Partial(entries) if stale else entries
+
     try:
-        token = get_spotify_token()
-        headers = {"Authorization": f"Bearer {token}"}
-        params = {"q": q, "type": "show", "market": "US", "limit": 10}
-        resp = requests.get("https://api.spotify.com/v1/search", headers=headers, params=params)
-        shows = resp.json().get("shows", {}).get("items", [])
-        return jsonify([
-            {
-                "id": s["id"],
-                "name": s["name"],
-                "publisher": s["publisher"],
-                "image": s["images"][0]["url"] if s["images"] else None
-            }
-            for s in shows
-        ])
+        shows, _ = typeahead.lookup('spotify', q, load, typeahead.every_term)
+        resp = jsonify(shows)
+        # served from cache past its TTL while Spotify is unreachable or refreshing
+        resp.headers["X-Cache-Stale"] = "true" if stale else "false"
+        return resp
     except Exception as e:
         current_app.logger.error(f"Spotify search error: {e}")
         return jsonify([])
@@ -958,48 +991,35 @@ def search_spotify_podcasts():
 @login_required
 def spotify_show_episodes(show_id):
     """
-    Fetch the episodes of a Spotify show.  Spotify returns the list under
-    either top‐level "items", nested under "episodes"→"items", or sometimes
-    as an "episodes" list directly.
-    This will try all three and always return a list (maybe empty).
+    Episodes of a Spotify show as id+name pairs, newest first, served from
+    the episode catalog.  ?q= narrows to names with a word starting with
+    the query; ?limit= caps the list.  X-Catalog-Complete is "false" while
+    the rest of a long show is still being fetched in the background, and
+    X-Cache-Stale is "true" when Spotify couldn't be reached to refresh it.
     """
-    token = get_spotify_token()
-    headers = {"Authorization": f"Bearer {token}"}
-    params = {"market": "US", "limit": 50}
+    q = request.args.get("q", "")
+    limit = request.args.get("limit", type=int)
 
     try:
-        resp = requests.get(
-            f"https://api.spotify.com/v1/shows/{show_id}/episodes",
-            headers=headers,
-            params=params,
-        )
-        resp.raise_for_status()
-        data = resp.json()
+        show, stale = spotify.get_episode_catalog().lookup(show_id)
     except Exception as e:
         current_app.logger.error(f"Spotify API request failed for show {show_id}: {e}")
         return jsonify([]), 500
 
-    # Log at INFO so we actually see it when Flask runs
-    current_app.logger.info(f"Spotify raw episodes for {show_id}: {data}")
+    if limit is None:
+        limit = len(show.episodes)
+    resp = jsonify(show.search(q, limit))
+    resp.headers["X-Catalog-Complete"] = "true" if show.complete else "false"
+    resp.headers["X-Catalog-Total"] = str(show.total)
+    resp.headers["X-Cache-Stale"] = "true" if stale else "false"
+    return resp
 
-    # Try to extract a list of episode dicts from one of the known shapes
-    items = []
-    if isinstance(data, dict):
-        if isinstance(data.get("items"), list):
-            items = data["items"]
-        elif isinstance(data.get("episodes"), dict) and isinstance(data["episodes"].get("items"), list):
-            items = data["episodes"]["items"]
-        elif isinstance(data.get("episodes"), list):
-            items = data["episodes"]
 
-    # As a final safeguard, ensure items is a list
-    if not isinstance(items, list):
-        items = []
-
-    # Now build just id+name pairs
-    episodes = [{"id": ep.get("id"), "name": ep.get("name")} for ep in items if ep]
-
-    return jsonify(episodes)
+@bp.route("/api/typeahead/metrics")
+@login_required
+def typeahead_metrics():
+    # per-process hit rates of the typeahead prefix-reuse cache
+    return jsonify(typeahead.get_cache().stats())
 
 
 @bp.route("/callback")
@@ -1008,70 +1028,124 @@ def spotify_callback():
     return redirect(url_for("main.podcast_log"))
 
 
+@bp.route("/api/spotify/metrics")
+@login_required
+def spotify_metrics():
+    # per-process counters for the pooled Spotify client and its caches
+    client = spotify.get_client()
+    return jsonify(dict(client.metrics.snapshot(),
+                        breaker=client.breaker.snapshot(),
+                        search_cache=spotify.get_search_cache().stats(),
+                        podcast_search=podcast_search.get_search().stats()))
+
+
 
 # ─── DASHBOARD DISPLAY ────────────────────────────
 
+def _parse_day(value):
+    return date.fromisoformat(value) if value else None
+
+
 @bp.route("/api/visualise-data")
 @login_required
 def visualise_data():
-    # 1) Genre breakdown (sum duration per genre)
-    genre_q = (
-        db.session.query(
-            PodcastLog.genre,
-            func.coalesce(func.sum(PodcastLog.duration), 0).label("total_duration")
-        )
-        .filter(PodcastLog.user_id == current_user.id)
-        .group_by(PodcastLog.genre)
-        .all()
-    )
+    granularity = request.args.get('granularity', 'week')
+    try:
+        start = _parse_day(request.args.get('from'))
+        end   = _parse_day(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': 'Unknown granularity'}), 400
+    if start and end and start > end:
+        return jsonify({'error': "'from' is after 'to'"}), 400
+
+    # 1) Genre breakdown (sum duration per genre) over the range
     genre_data = [
         {"genre": g or "Unknown", "time": round(total / 60, 1)}
-        for g, total in genre_q
+        for g, total in analytics.genre_breakdown(current_user.id, start, end)
     ]
 
-    # 2) Weekly listening (sum duration per calendar-week)
-    week_q = (
-        db.session.query(
-            func.strftime("%Y-%W", PodcastLog.listened_at).label("week"),
-            func.sum(PodcastLog.duration).label("total_duration")
-        )
-        .filter(PodcastLog.user_id == current_user.id)
-        .group_by("week")
-        .order_by("week")
-        .all()
-    )
-    week_data = [
-        {"week": wk, "time": round(total / 60, 1)}
-        for wk, total in week_q
+    # 2) Listening time per day/week/month/year bucket, in the user's timezone
+    series = [
+        {"bucket": label, "time": round(total / 60, 1)}
+        for label, total in analytics.listening_series(current_user.id, granularity, start, end)
     ]
 
-    return jsonify({
+    resp = jsonify({
+        "from":           start.isoformat() if start else None,
+        "to":             end.isoformat() if end else None,
+        "granularity":    granularity,
+        "timezone":       current_user.tz_name,
         "genreBreakdown": genre_data,
-        "weeklyListening": week_data
+        "listening":      series
     })
+    # the body is small once aggregated; hashing it lets an unchanged
+    # zoom level come back as a bodiless 304
+    resp.add_etag()
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp.make_conditional(request)
+
+@bp.route("/api/trending")
+@login_required
+def api_trending():
+    window = request.args.get('window', '24h')
+    if window not in trending.WINDOWS:
+        return jsonify({'error': 'Unknown window'}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+
+    # over-fetch: unconfirmed placeholders are dropped below
+    engine = trending.get_engine()
+    ranked = engine.top(window, engine.k)
+    podcasts = {p.id: p for p in enrichment.without_placeholders()
+                .filter(Podcast.id.in_([pid for pid, _ in ranked]))}
+    ranked = [(pid, score) for pid, score in ranked if pid in podcasts][:limit]
+    return jsonify([
+        {
+            "id":         podcasts[pid].spotify_id,
+            "name":       podcasts[pid].name,
+            "publisher":  podcasts[pid].publisher,
+            "image_url":  podcasts[pid].image_url,
+            "score":      round(score, 2)
+        }
+        for pid, score in ranked if pid in podcasts
+    ])
 
 @bp.route('/chats')
 @login_required
 def chat_list():
-    convos = Conversation.query.filter(
-        or_(
-          Conversation.user1_id == current_user.id,
-          Conversation.user2_id == current_user.id
-        )
-    ).all()
+    page = max(request.args.get('page', 1, type=int), 1)
+    convos, has_next = chat.inbox(current_user.id, page)
+    return render_template('chat_list.html',
+                           conversations=convos,
+                           page=page,
+                           has_next=has_next)
 
-    # Attach unread count to each convo
-    for convo in convos:
-        unread_count = Message.query \
-            .filter_by(
-              conversation_id=convo.id,
-              recipient_id=current_user.id,
-              read=False
-            ) \
-            .count()
-        convo.unread = unread_count
 
-    return render_template('chat_list.html', conversations=convos)
+@bp.route('/api/inbox')
+@login_required
+def api_inbox():
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = max(min(request.args.get('per_page', 20, type=int), 50), 1)
+    convos, has_next = chat.inbox(current_user.id, page, per_page)
+    return jsonify(
+        conversations=[
+            {
+              'id':              c['id'],
+              'partner': {
+                  'id':              c['partner'].id,
+                  'username':        c['partner'].username,
+                  'display_name':    c['partner'].display_name,
+                  'profile_pic_url': url_for('static', filename='uploads/' + c['partner'].profile_pic)
+              },
+              'unread':          c['unread'],
+              'snippet':         c['snippet'],
+              'last_message_at': c['last_message_at'].isoformat() if c['last_message_at'] else None
+            }
+            for c in convos
+        ],
+        next_page=page + 1 if has_next else None
+    )
 
 @bp.route('/chats/<int:convo_id>')
 @login_required
@@ -1080,29 +1154,83 @@ def chat_view(convo_id):
     if current_user.id not in (convo.user1_id, convo.user2_id):
         abort(403)
 
-    # Mark every unread message sent *to me* in this convo as read
-    Message.query \
-        .filter_by(
-          conversation_id=convo.id,
-          recipient_id=current_user.id,
-          read=False
-        ) \
-        .update({Message.read: True}, synchronize_session=False)
+    # Move my read watermark up to the latest message
+    marked = chat.mark_conversation_read(convo, current_user._get_current_object())
     db.session.commit()
 
     # now load partner & all messages
     partner = (User.query.get(convo.user2_id)
                if convo.user1_id == current_user.id
                else User.query.get(convo.user1_id))
-    messages = Message.query \
-        .filter_by(conversation_id=convo.id) \
-        .order_by(Message.created_at.asc()) \
-        .all()
+    messages, has_older = chat.message_window(convo.id)
+    if marked and messages:
+        chat.publish_read(convo.id, current_user.id, messages[-1].id)
 
     return render_template('chat_view.html',
                            conversation=convo,
                            other_user=partner,
-                           messages=messages)
+                           messages=messages,
+                           has_older=has_older)
+
+
+@bp.route('/chats/<int:convo_id>/messages')
+@login_required
+def chat_messages(convo_id):
+    convo = Conversation.query.get_or_404(convo_id)
+    if current_user.id not in (convo.user1_id, convo.user2_id):
+        abort(403)
+
+    before_id = request.args.get('before_id', type=int)
+    after_id  = request.args.get('after_id', type=int)
+    limit     = min(request.args.get('limit', chat.WINDOW_SIZE, type=int), 200)
+    if before_id and after_id:
+        return jsonify(success=False, message="Use before_id or after_id, not both"), 400
+
+    messages, has_more = chat.message_window(
+        convo.id, before_id=before_id, after_id=after_id, limit=max(limit, 1)
+    )
+    return jsonify(
+        success=True,
+        messages=[chat.message_to_dict(m) for m in messages],
+        has_more=has_more
+    )
+
+@bp.route('/chats/<int:convo_id>/stream')
+@login_required
+def chat_stream(convo_id):
+    convo = Conversation.query.get_or_404(convo_id)
+    if current_user.id not in (convo.user1_id, convo.user2_id):
+        abort(403)
+
+    subscription = get_broker().subscribe(chat.channel_for(convo.id))
+    return Response(
+        chat.event_stream(subscription),
+        mimetype='text/event-stream',
+        headers={'X-Accel-Buffering': 'no'}
+    )
+
+
+@bp.route('/chats/<int:convo_id>/read', methods=['POST'])
+@login_required
+def chat_mark_read(convo_id):
+    convo = Conversation.query.get_or_404(convo_id)
+    if current_user.id not in (convo.user1_id, convo.user2_id):
+        abort(403)
+
+    data = request.get_json(silent=True) or {}
+    try:
+        up_to_id = int(data.get('up_to_id') or 0)
+    except (TypeError, ValueError):
+        return jsonify(success=False, message="Invalid payload"), 400
+
+    marked = chat.mark_conversation_read(
+        convo, current_user._get_current_object(), up_to_id or None
+    )
+    db.session.commit()
+    if marked:
+        chat.publish_read(convo.id, current_user.id, convo.last_read_id(current_user.id))
+    return jsonify(success=True)
+
 
 @bp.route('/chats/<int:convo_id>/message', methods=['POST'])
 @login_required
@@ -1125,22 +1253,10 @@ def post_message(convo_id):
     )
     db.session.add(msg)
     db.session.commit()
+    chat.publish_message(msg)
 
     # Build the JSON payload with username & profile pic
-    sender = msg.sender
-    return jsonify(
-        success=True,
-        message={
-            'text':       msg.text,
-            'created_at': msg.created_at.isoformat(),
-            'sender_id':  msg.sender_id,
-            'username':   sender.display_name or sender.username,
-            'profile_pic_url': url_for(
-                'static',
-                filename='uploads/' + (sender.profile_pic or 'default.png')
-            )
-        }
-    )
+    return jsonify(success=True, message=chat.message_to_dict(msg))
 
 
 @bp.route('/api/send_podcast', methods=['POST'])
@@ -1152,8 +1268,11 @@ def api_send_podcast():
     if not log_id or not to_user_id:
         return jsonify(error='Missing parameters'), 400
 
-    # Simple “message” record: you might build a Conversation+Message model
+    # a share is a message like any other, so it needs the conversation
+    # the unread counter and read watermarks are kept on
+    convo = chat.conversation_between(current_user.id, int(to_user_id))
     msg = Message(
+      conversation_id=convo.id,
       sender_id=current_user.id,
       recipient_id=to_user_id,
       podcast_log_id=log_id,
@@ -1161,6 +1280,7 @@ def api_send_podcast():
     )
     db.session.add(msg)
     db.session.commit()
+    chat.publish_message(msg)
     to_user = User.query.get(to_user_id)
     return jsonify(success=True, to_username=to_user.username)
 
@@ -1201,13 +1321,7 @@ def send_podcast():
     if not log or log.user_id != current_user.id:
         return jsonify(success=False, message="Invalid podcast log"), 400
 
-    # sort so (small,large) is consistent
-    uid1, uid2 = sorted([current_user.id, recipient_id])
-    convo = Conversation.query.filter_by(user1_id=uid1, user2_id=uid2).first()
-    if not convo:
-        convo = Conversation(user1_id=uid1, user2_id=uid2)
-        db.session.add(convo)
-        db.session.commit()
+    convo = chat.conversation_between(current_user.id, recipient_id)
 
     # create the share‐message
     msg = Message(
@@ -1218,6 +1332,7 @@ def send_podcast():
     )
     db.session.add(msg)
     db.session.commit()
+    chat.publish_message(msg)
 
     # pull the podcast & log data
     plog = log
@@ -1253,6 +1368,8 @@ def delete_podcast_log(log_id):
         return jsonify(success=False, message="Forbidden"), 403
 
     try:
+        timeline.remove_log(log.id)
+        analytics.forget_log(log, current_user.tz_name)
         db.session.delete(log)
         db.session.commit()
         return jsonify(success=True)
@@ -0,0 +1,687 @@
+import bisect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from app.cache import MISSING, SharedCache, SingleFlight, SqliteCacheStore, TTLCache
+
+try:
+    import fcntl
+except ImportError:          # Windows: fall back to in-process locking only
+    fcntl = None
+
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+API_URL   = "https://api.spotify.com/v1"
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# a child of the Flask app's logger, for background threads with no app context
+log = logging.getLogger(__name__)
+
+
+class SpotifyError(RuntimeError):
+    """A Spotify call failed for good (after any retries)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class SpotifyAuthError(SpotifyError):
+    """Spotify wouldn't hand out a client-credentials token."""
+
+
+class SpotifyUnavailable(SpotifyError):
+    """The circuit breaker is open: Spotify wasn't even tried."""
+
+
+# ─── TOKEN STORE ───────────────────────────────────────────
+
+class FileTokenStore:
+    """
+    A token shared by every worker process on this machine, kept in a
+    small JSON file.  lock() serialises refreshes across processes with an
+    flock on a sidecar file, so only one of them asks Spotify.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """(access_token, expires_at) or None."""
+        try:
+            with open(self.path) as fh:
+                data = json.load(fh)
+            return data['access_token'], data['expires_at']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, access_token, expires_at):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'access_token': access_token, 'expires_at': expires_at}, fh)
+        os.replace(tmp, self.path)     # readers never see a half-written file
+        try:
+            os.chmod(self.path, 0o600)
+        except OSError:
+            pass
+
+    @contextmanager
+    def lock(self):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f'{self.path}.lock', 'w') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# ─── TOKEN MANAGER ─────────────────────────────────────────
+
+class SpotifyTokenManager:
+    """
+    Client-credentials token cached until `margin` seconds before Spotify
+    says it expires.  A refresh happens under a thread lock (and the
+    store's process lock), and re-checks the cache once it holds the lock,
+    so a burst of requests on an expired token costs one POST.
+    """
+
+    def __init__(self, client_id, client_secret, store=None, margin=60,
+                 token_url=TOKEN_URL, http=requests, clock=time.time):
+        self.client_id     = client_id
+        self.client_secret = client_secret
+        self.store         = store
+        self.margin        = margin
+        self.token_url     = token_url
+        self.http          = http
+        self.clock         = clock
+        self._lock         = threading.Lock()
+        self._token        = None
+        self._expires_at   = 0.0
+        self._rejected     = None      # last token Spotify answered 401 to
+
+    def _fresh(self, expires_at):
+        return self.clock() < expires_at - self.margin
+
+    def _adopt_stored(self):
+        cached = self.store.load() if self.store else None
+        if cached and cached[0] != self._rejected and self._fresh(cached[1]):
+            self._token, self._expires_at = cached
+            return True
+        return False
+
+    def get_token(self):
+        token, expires_at = self._token, self._expires_at
+        if token and self._fresh(expires_at):
+            return token
+
+        with self._lock:
+            if self._token and self._fresh(self._expires_at):
+                return self._token
+            if self._adopt_stored():
+                return self._token
+            if self.store is None:
+                return self._refresh()
+            with self.store.lock():
+                # another process may have refreshed while we waited
+                if self._adopt_stored():
+                    return self._token
+                return self._refresh()
+
+    def _refresh(self):
+        resp = self.http.post(
+            self.token_url,
+            data={"grant_type": "client_credentials"},
+            auth=(self.client_id, self.client_secret),
+            timeout=10
+        )
+        data = resp.json() if resp.content else {}
+        token = data.get("access_token")
+        if not token:
+            raise SpotifyAuthError(data.get("error_description") or f"HTTP {resp.status_code}")
+
+        self._token = token
+        self._expires_at = self.clock() + int(data.get("expires_in", 3600))
+        if self.store:
+            self.store.save(self._token, self._expires_at)
+        return token
+
+    def invalidate(self, token=None):
+        """
+        Forget `token` (default: the cached one) after Spotify answers 401.
+        The store's copy of it is never adopted again either, so the next
+        get_token() refreshes unless another process already has.
+        """
+        with self._lock:
+            token = token or self._token
+            self._rejected = token
+            if self._token == token:
+                self._token, self._expires_at = None, 0.0
+
+
+# ─── HTTP CLIENT ───────────────────────────────────────────
+
+class ClientMetrics:
+    """Thread-safe counters for the Spotify client; snapshot() for a JSON view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0        # logical calls
+            self.attempts = 0        # HTTP round trips, retries included
+            self.retries  = 0
+            self.failures = 0
+            self.errors   = 0        # connection errors / timeouts
+            self.statuses = {}
+            self.latency  = 0.0      # seconds spent across all attempts
+
+    def record_attempt(self, status, elapsed):
+        with self._lock:
+            self.attempts += 1
+            self.latency  += elapsed
+            if status is None:
+                self.errors += 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests':       self.requests,
+                'attempts':       self.attempts,
+                'retries':        self.retries,
+                'failures':       self.failures,
+                'errors':         self.errors,
+                'statuses':       {str(k): v for k, v in sorted(self.statuses.items())},
+                'avg_latency_ms': round(1000 * self.latency / self.attempts, 1) if self.attempts else 0.0,
+            }
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast once Spotify looks unhealthy.
+
+    `failure_threshold` failed (or slower than `slow_call` seconds) calls
+    in a row open the circuit; for `reset_timeout` seconds every call is
+    rejected without touching the network.  After that the circuit is
+    half-open: up to `half_open_trials` probe calls go through at a time,
+    and one success closes it again while a failure re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, slow_call=5.0,
+                 half_open_trials=1, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout     = reset_timeout
+        self.slow_call         = slow_call
+        self.half_open_trials  = half_open_trials
+        self.clock     = clock
+        self._lock     = threading.Lock()
+        self.state     = self.CLOSED
+        self.failures  = 0
+        self.opened_at = 0.0
+        self.trials    = 0
+        self.opens     = 0
+        self.rejected  = 0
+
+    def before_call(self):
+        """Raise SpotifyUnavailable unless a call may go ahead now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise SpotifyUnavailable('Spotify circuit is open')
+                self.state, self.trials = self.HALF_OPEN, 0
+            if self.state == self.HALF_OPEN:
+                if self.trials >= self.half_open_trials:
+                    self.rejected += 1
+                    raise SpotifyUnavailable('Spotify circuit is half-open; probe in flight')
+                self.trials += 1
+
+    def on_success(self, elapsed=0.0):
+        if elapsed >= self.slow_call:
+            return self.on_failure()
+        with self._lock:
+            self.state, self.failures = self.CLOSED, 0
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state, self.opened_at = self.OPEN, self.clock()
+
+    def snapshot(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures,
+                    'opens': self.opens, 'rejected': self.rejected}
+
+
+def _retry_after(resp):
+    """Seconds from a Retry-After header (delta or HTTP date), or None."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class SpotifyClient:
+    """
+    Spotify Web API client over one pooled keep-alive requests.Session.
+
+    Every attempt has a (connect, read) timeout.  429s, 5xx responses and
+    connection errors are retried up to `max_retries` times with full-jitter
+    exponential backoff, waiting at least as long as Retry-After asks (a
+    wait longer than `max_wait` fails fast instead of tying up a worker).
+    A 401 drops the cached token and retries once with a fresh one.
+    Each call (retries included) counts once towards the circuit breaker;
+    4xx answers other than 429 don't count against Spotify's health.
+    """
+
+    def __init__(self, tokens, base_url=API_URL, session=None, timeout=(3.05, 10),
+                 max_retries=3, backoff=0.5, max_backoff=8.0, max_wait=30.0,
+                 pool_size=10, sleep=time.sleep, breaker=None):
+        self.tokens      = tokens
+        self.base_url    = base_url.rstrip('/')
+        self.timeout     = timeout
+        self.max_retries = max_retries
+        self.backoff     = backoff
+        self.max_backoff = max_backoff
+        self.max_wait    = max_wait
+        self.sleep       = sleep
+        self.metrics     = ClientMetrics()
+        self.breaker     = breaker or CircuitBreaker()
+        self.session     = session or self._make_session(pool_size)
+
+    @staticmethod
+    def _make_session(pool_size):
+        session = requests.Session()
+        # retries are ours (see get), so the adapter must not add its own
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _delay(self, attempt, resp=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        hinted = _retry_after(resp) if resp is not None else None
+        return delay if hinted is None else max(hinted, delay)
+
+    def get(self, path, params=None):
+        """GET `path` (relative to the API root, or an absolute `next` URL) → parsed JSON."""
+        self.breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = self._get(path, params)
+        except SpotifyError as e:
+            if e.status is not None and e.status not in RETRY_STATUSES:
+                self.breaker.on_success()       # Spotify answered; the request was bad
+            else:
+                self.breaker.on_failure()
+            raise
+        except Exception:
+            self.breaker.on_failure()
+            raise
+        self.breaker.on_success(time.monotonic() - started)
+        return result
+
+    def _get(self, path, params):
+        url = path if path.startswith('http') else f'{self.base_url}/{path.lstrip("/")}'
+        self.metrics.incr('requests')
+        reauthed = False
+        attempt = 0
+        while True:
+            token = self.tokens.get_token()
+            headers = {'Authorization': f'Bearer {token}'}
+            started = time.monotonic()
+            try:
+                resp = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self.metrics.record_attempt(None, time.monotonic() - started)
+                resp, error = None, exc
+            else:
+                self.metrics.record_attempt(resp.status_code, time.monotonic() - started)
+                error = None
+                if resp.status_code == 401 and not reauthed:
+                    self.tokens.invalidate(token)
+                    reauthed = True
+                    continue
+                if resp.ok:
+                    return resp.json()
+                if resp.status_code not in RETRY_STATUSES:
+                    self.metrics.incr('failures')
+                    raise SpotifyError(f'Spotify {resp.status_code} for {path}', resp.status_code)
+
+            delay = self._delay(attempt, resp)
+            if attempt >= self.max_retries or delay > self.max_wait:
+                self.metrics.incr('failures')
+                if error is not None:
+                    raise SpotifyError(f'Spotify unreachable for {path}: {error}') from error
+                raise SpotifyError(f'Spotify {resp.status_code} for {path}', resp.status_code)
+            self.metrics.incr('retries')
+            self.sleep(delay)
+            attempt += 1
+
+
+# ─── SEARCH ────────────────────────────────────────────────
+
+def normalize_query(q):
+    """Case- and whitespace-insensitive cache key for a search box value."""
+    return ' '.join(q.casefold().split())
+
+
+def _show_summary(show):
+    images = show.get("images") or []
+    return {
+        "id":        show["id"],
+        "name":      show["name"],
+        "publisher": show.get("publisher"),
+        "image":     images[0]["url"] if images else None
+    }
+
+
+def search_shows(q, limit=10):
+    """
+    (shows, stale) for Spotify shows matching `q`, cached per normalised
+    query.  Identical lookups in flight at the same time share one Spotify
+    call; an expired entry is served stale while it's refreshed.
+    """
+    key = normalize_query(q)
+    if not key:
+        return [], False
+    client = get_client()      # the refresh may run outside this request
+
+    def fetch():
+        params = {"q": key, "type": "show", "market": "US", "limit": limit}
+        data = client.get("search", params=params)
+        return [_show_summary(s) for s in data.get("shows", {}).get("items", []) if s]
+
+    return get_search_cache().lookup(f'search:{limit}:{key}', fetch)
+
+
+# ─── EPISODE CATALOG ───────────────────────────────────────
+
+# how long a catalog is kept at all; freshness is checked separately
+STORE_TTL = 30 * 24 * 3600
+
+def _episode_items(data):
+    """
+    Episode dicts from a Spotify response, which has them under top-level
+    "items", under "episodes"→"items", or sometimes as an "episodes" list.
+    """
+    items = []
+    if isinstance(data, dict):
+        if isinstance(data.get("items"), list):
+            items = data["items"]
+        elif isinstance(data.get("episodes"), dict) and isinstance(data["episodes"].get("items"), list):
+            items = data["episodes"]["items"]
+        elif isinstance(data.get("episodes"), list):
+            items = data["episodes"]
+    # unavailable episodes come back as null
+    return [{"id": ep.get("id"), "name": ep.get("name") or ""} for ep in items if ep]
+
+
+class ShowEpisodes:
+    """
+    One show's episodes in Spotify's order (newest first) plus a sorted
+    index of every word-start suffix of each name, so search() finds names
+    with a word starting with the query by bisecting rather than scanning.
+    """
+
+    def __init__(self, episodes, total, fetched_at, complete):
+        self.episodes   = episodes
+        self.total      = total
+        self.fetched_at = fetched_at
+        self.complete   = complete
+        index = []
+        for i, ep in enumerate(episodes):
+            words = normalize_query(ep["name"]).split(' ')
+            for w in range(len(words)):
+                index.append((' '.join(words[w:]), i))
+        index.sort()
+        self._keys = [key for key, _ in index]
+        self._rows = [i for _, i in index]
+
+    def search(self, q, limit=20):
+        """Episodes with a word (run) starting with `q`, newest first."""
+        q = normalize_query(q)
+        if not q:
+            return self.episodes[:limit]
+        lo = bisect.bisect_left(self._keys, q)
+        hi = bisect.bisect_left(self._keys, q + '\uffff', lo)
+        hits = sorted(set(self._rows[lo:hi]))
+        return [self.episodes[i] for i in hits[:limit]]
+
+    def to_state(self):
+        return {'episodes': self.episodes, 'total': self.total, 'fetched_at': self.fetched_at}
+
+
+class EpisodeCatalog:
+    """
+    Per-show episode lists, fetched once and then served from memory (and
+    the optional shared store).
+
+    A first request fetches page one and returns it straight away; the
+    rest of the pages are fetched concurrently in the background and
+    swapped in when they're all back.  After `ttl` seconds a request does
+    a conditional refresh: one page-one call, and the full re-fetch only
+    happens if the total or newest episode has changed.  If a background
+    fetch fails, page one keeps being served and the fetch isn't retried
+    for `retry_after` seconds.
+    """
+
+    def __init__(self, client, store=None, ttl=6 * 3600, page_size=50, workers=4,
+                 maxsize=256, retry_after=300, clock=time.time):
+        self.client    = client
+        self.store     = store
+        self.ttl       = ttl
+        self.page_size = page_size
+        self.retry_after = retry_after
+        self.clock     = clock
+        self._shows    = TTLCache(maxsize, ttl=STORE_TTL)
+        self._flight   = SingleFlight()
+        self._pool     = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='spotify-episodes')
+        # joins wait on _pool's page fetches, so they can't share its workers
+        self._joins    = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='spotify-episodes-join')
+        self._loading  = set()
+        self._failed   = {}      # show_id -> clock() of its last failed background fetch
+        self._lock     = threading.Lock()
+
+    def _page(self, show_id, offset):
+        return self.client.get(f"shows/{show_id}/episodes",
+                               params={"market": "US", "limit": self.page_size, "offset": offset})
+
+    def _cached(self, show_id):
+        show = self._shows.get(show_id)
+        if show is None and self.store is not None:
+            state = self.store.get(f'episodes:{show_id}')
+            if state is not MISSING:
+                show = ShowEpisodes(state['episodes'], state['total'], state['fetched_at'], True)
+                self._shows.set(show_id, show)
+        return show
+
+    def get(self, show_id):
+        """ShowEpisodes for `show_id` — possibly still filling in (complete=False)."""
+        return self.lookup(show_id)[0]
+
+    def lookup(self, show_id):
+        """
+        (ShowEpisodes, stale).  If a due refresh fails — Spotify down or the
+        circuit open — the copy we already have is served, flagged stale.
+        """
+        show = self._cached(show_id)
+        if show is not None:
+            with self._lock:
+                loading = show_id in self._loading
+                failed_at = self._failed.get(show_id)
+            now = self.clock()
+            backing_off = failed_at is not None and now - failed_at < self.retry_after
+            if loading or backing_off or (show.complete and now - show.fetched_at < self.ttl):
+                return show, False
+        try:
+            return self._flight.do(show_id, lambda: self._refresh(show_id, show)), False
+        except SpotifyError:
+            if show is None:
+                raise
+            return show, True
+
+    def _refresh(self, show_id, cached):
+        first = self._page(show_id, 0)
+        items = _episode_items(first)
+        total = first.get("total", len(items)) if isinstance(first, dict) else len(items)
+
+        unchanged = (cached is not None and cached.complete and cached.total == total
+                     and cached.episodes[:1] == items[:1])
+        if unchanged:
+            cached.fetched_at = self.clock()
+            self._install(show_id, cached)
+            return cached
+
+        show = ShowEpisodes(items, total, self.clock(), complete=len(items) >= total)
+        if show.complete:
+            self._install(show_id, show)
+            return show
+        # mark it loading before it's visible, so nobody starts a second fetch
+        with self._lock:
+            self._loading.add(show_id)
+        self._shows.set(show_id, show)
+        self._fetch_rest(show_id, first, items, total)
+        return show
+
+    def _fetch_rest(self, show_id, first, items, total):
+        if isinstance(first, dict) and "total" in first:
+            futures = [self._pool.submit(self._page, show_id, offset)
+                       for offset in range(self.page_size, total, self.page_size)]
+        else:
+            futures = None       # no total to fan out from: walk the `next` links
+
+        def finish():
+            try:
+                episodes = list(items)
+                if futures is not None:
+                    for future in futures:
+                        episodes.extend(_episode_items(future.result()))
+                else:
+                    page = first
+                    while isinstance(page, dict) and page.get("next"):
+                        page = self.client.get(page["next"])
+                        episodes.extend(_episode_items(page))
+                self._install(show_id, ShowEpisodes(episodes, total, self.clock(), True))
+            except Exception as e:
+                # keep serving page one; retried once retry_after has passed
+                log.warning(f"Fetching episodes of show {show_id} failed: {e}")
+                now = self.clock()
+                with self._lock:
+                    self._failed = {sid: at for sid, at in self._failed.items()
+                                    if now - at < self.retry_after}
+                    self._failed[show_id] = now
+            finally:
+                with self._lock:
+                    self._loading.discard(show_id)
+
+        self._joins.submit(finish)
+
+    def _install(self, show_id, show):
+        with self._lock:
+            self._failed.pop(show_id, None)
+        self._shows.set(show_id, show)
+        if self.store is not None:
+            self.store.set(f'episodes:{show_id}', show.to_state(), STORE_TTL)
+
+    def wait(self, show_id, timeout=10):
+        """Block until a background fetch for `show_id` finishes (tests, CLI)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if show_id not in self._loading:
+                    return True
+            time.sleep(0.01)
+        return False
+
+
+def init_app(app):
+    path = app.config.get('SPOTIFY_TOKEN_STORE')
+    if path is None:
+        path = os.path.join(app.instance_path, 'spotify_token.json')
+    session = SpotifyClient._make_session(app.config.get('SPOTIFY_POOL_SIZE', 10))
+    tokens = SpotifyTokenManager(
+        app.config.get('SPOTIFY_CLIENT_ID'),
+        app.config.get('SPOTIFY_CLIENT_SECRET'),
+        store=FileTokenStore(path) if path else None,
+        token_url=app.config.get('SPOTIFY_TOKEN_URL') or TOKEN_URL,
+        http=session
+    )
+    app.extensions['spotify'] = SpotifyClient(
+        tokens,
+        base_url=app.config.get('SPOTIFY_API_URL') or API_URL,
+        session=session,
+        timeout=app.config.get('SPOTIFY_TIMEOUT', (3.05, 10)),
+        max_retries=app.config.get('SPOTIFY_MAX_RETRIES', 3),
+        breaker=CircuitBreaker(
+            failure_threshold=app.config.get('SPOTIFY_BREAKER_FAILURES', 5),
+            reset_timeout=app.config.get('SPOTIFY_BREAKER_RESET', 30),
+            slow_call=app.config.get('SPOTIFY_SLOW_CALL', 5.0)
+        )
+    )
+
+    store_path = app.config.get('SPOTIFY_CACHE_STORE')
+    store = SqliteCacheStore(store_path) if store_path else None
+    app.extensions['spotify_search'] = SharedCache(
+        maxsize=app.config.get('SEARCH_CACHE_SIZE', 1024),
+        ttl=app.config.get('SEARCH_CACHE_TTL', 600),
+        store=store,
+        stale_ttl=app.config.get('SEARCH_CACHE_STALE_TTL', 24 * 3600)
+    )
+    app.extensions['spotify_episodes'] = EpisodeCatalog(
+        app.extensions['spotify'],
+        store=store,
+        ttl=app.config.get('EPISODE_CACHE_TTL', 6 * 3600),
+        workers=app.config.get('EPISODE_FETCH_WORKERS', 4),
+        retry_after=app.config.get('EPISODE_RETRY_AFTER', 300)
+    )
+
+
+def get_client():
+    return current_app.extensions['spotify']
+
+
+def get_search_cache():
+    return current_app.extensions['spotify_search']
+
+
+def get_episode_catalog():
+    return current_app.extensions['spotify_episodes']
+
+
+def get_token():
+    return get_client().tokens.get_token()
@@ -77,10 +77,13 @@ function genreBarChart(xArray, yArray) {
   );
 }
 
+const GRANULARITY_LABELS = { day: 'Day', week: 'ISO Week', month: 'Month', year: 'Year' };
+
 /**
- * Simple line+marker chart of listening time by week.
+ * Simple line+marker chart of listening time per day/week/month/year.
  */
-function listenLineGraph(xLabels, yValues) {
+function listenLineGraph(xLabels, yValues, granularity = 'week') {
+  const unit = GRANULARITY_LABELS[granularity] || 'ISO Week';
   const listenData = [
     {
       x: xLabels,
@@ -94,7 +97,7 @@ function listenLineGraph(xLabels, yValues) {
 
   const layout = {
     title: {
-      text: 'Listening Time by Week',
+      text: `Listening Time by ${unit}`,
       font: { family: 'Poppins, sans-serif', size: 20 },
       x: 0.5
     },
@@ -104,10 +107,13 @@ function listenLineGraph(xLabels, yValues) {
     paper_bgcolor: 'transparent',
     xaxis: {
       title: {
-        text: 'Week',
+        text: unit,
         font: { family: 'Poppins, sans-serif', size: 16 }
       },
       tickfont: { family: 'Poppins, sans-serif', size: 12 },
+      // bucket labels ("2025-W05", "2025-02", "2025") are plotted as-is;
+      // left to guess, plotly would read them as dates
+      type: 'category',
       automargin: true,
       showgrid: false
     },
@@ -131,18 +137,46 @@ function listenLineGraph(xLabels, yValues) {
   );
 }
 
-// fetch the pre-computed JSON and draw both charts once the DOM is ready
-document.addEventListener('DOMContentLoaded', () => {
-  fetch('/api/visualise-data')
-    .then(resp => resp.json())
+/**
+ * Fetch the aggregates for the chosen range and redraw both charts.
+ * `cache: 'no-cache'` makes the browser revalidate with If-None-Match,
+ * so a range that hasn't changed comes back as a 304 from its cache.
+ */
+function loadDashboard() {
+  const params = new URLSearchParams({
+    granularity: document.getElementById('range-granularity').value
+  });
+  const from = document.getElementById('range-from').value;
+  const to = document.getElementById('range-to').value;
+  if (from) params.set('from', from);
+  if (to) params.set('to', to);
+
+  return fetch(`/api/visualise-data?${params}`, { cache: 'no-cache' })
+    .then(resp => {
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      return resp.json();
+    })
     .then(data => {
       const times = data.genreBreakdown.map(d => d.time);
       const genres = data.genreBreakdown.map(d => d.genre);
       genreBarChart(times, genres);
 
-      const weeks = data.weeklyListening.map(d => d.week);
-      const mins = data.weeklyListening.map(d => d.time);
-      listenLineGraph(weeks, mins);
+      const buckets = data.listening.map(d => d.bucket);
+      const mins = data.listening.map(d => d.time);
+      listenLineGraph(buckets, mins, data.granularity);
     })
     .catch(err => console.error('Dashboard data error:', err));
+}
+
+// draw both charts once the DOM is ready, and again whenever the range changes
+document.addEventListener('DOMContentLoaded', () => {
+  ['range-from', 'range-to', 'range-granularity'].forEach(id => {
+    document.getElementById(id).addEventListener('change', loadDashboard);
+  });
+  document.getElementById('range-reset').addEventListener('click', () => {
+    document.getElementById('range-from').value = '';
+    document.getElementById('range-to').value = '';
+    loadDashboard();
+  });
+  loadDashboard();
 });
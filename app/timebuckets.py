@@ -0,0 +1,82 @@
+from datetime import date
+from functools import lru_cache
+
+import pytz
+
+DEFAULT_TIMEZONE = 'Australia/Perth'
+GRANULARITIES = ('day', 'week', 'month', 'year')
+
+
+# ─── TIMEZONES ─────────────────────────────────────────────
+
+@lru_cache(maxsize=64)
+def get_timezone(name=None):
+    """pytz timezone for `name` (built once per name); unknown names fall back to the default."""
+    try:
+        return pytz.timezone(name or DEFAULT_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+def is_valid_timezone(name):
+    return name in pytz.all_timezones_set
+
+
+@lru_cache(maxsize=4096)
+def _offset_at(tz_name, utc_slot):
+    return pytz.utc.localize(utc_slot).astimezone(get_timezone(tz_name)).utcoffset()
+
+
+def utc_offset(utc_dt, tz_name=None):
+    """
+    UTC offset of `tz_name` at the naive-UTC instant `utc_dt`.  Every real
+    offset change lands on a quarter hour, so offsets are cached per
+    15-minute UTC slot.
+    """
+    slot = utc_dt.replace(minute=utc_dt.minute - utc_dt.minute % 15, second=0, microsecond=0)
+    return _offset_at(tz_name or DEFAULT_TIMEZONE, slot)
+
+
+def to_local(utc_dt, tz_name=None):
+    """Aware local datetime for a naive-UTC datetime."""
+    return pytz.utc.localize(utc_dt).astimezone(get_timezone(tz_name))
+
+
+def local_date(utc_dt, tz_name=None):
+    """Calendar date in `tz_name` of a naive-UTC datetime."""
+    return (utc_dt + utc_offset(utc_dt, tz_name)).date()
+
+
+# ─── BUCKETS ───────────────────────────────────────────────
+
+def bucket_key(day, granularity):
+    """
+    Label of the bucket a local date falls in.  Weeks are ISO weeks
+    ("2025-W01"), so the days around New Year share one bucket instead of
+    splitting into a "week 00" and the previous year's last week.
+    """
+    if granularity == 'day':
+        return day.isoformat()
+    if granularity == 'week':
+        year, week, _ = day.isocalendar()
+        return f'{year}-W{week:02d}'
+    if granularity == 'month':
+        return day.strftime('%Y-%m')
+    if granularity == 'year':
+        return day.strftime('%Y')
+    raise ValueError(f'Unknown granularity: {granularity}')
+
+
+def bucket_totals(day_totals, granularity):
+    """
+    Fold [(local date, value)] into [(bucket label, summed value)] in
+    chronological order.  Inputs are per-day rows, so this is bounded by
+    the number of days in range rather than by raw log count.
+    """
+    totals = {}
+    for day, value in day_totals:
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        key = bucket_key(day, granularity)
+        totals[key] = totals.get(key, 0) + (value or 0)
+    return sorted(totals.items())
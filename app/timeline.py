@@ -0,0 +1,116 @@
+from sqlalchemy import or_, and_
+
+from app.db import db
+from app.models import Friendship, PodcastLog, TimelineEntry
+from app.feed import keyset_page
+
+# how many of a new friend's recent shares get copied into your timeline
+BACKFILL_LIMIT = 200
+
+
+def _friend_ids(user_id):
+    return [
+        fid for (fid,) in
+        db.session.query(Friendship.friend_id)
+        .filter(Friendship.user_id == user_id)
+        .all()
+    ]
+
+
+def fan_out_share(log):
+    """
+    Write a shared log into the timelines of its owner and every friend.
+    Re-sharing bumps listened_at, so existing rows are moved rather than
+    duplicated.  Caller commits.
+    """
+    readers = [log.user_id] + _friend_ids(log.user_id)
+    TimelineEntry.query.filter_by(log_id=log.id).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(TimelineEntry, [
+        {
+            'user_id':     reader_id,
+            'log_id':      log.id,
+            'author_id':   log.user_id,
+            'listened_at': log.listened_at,
+        }
+        for reader_id in readers
+    ])
+
+
+def backfill_friendship(user_a, user_b, limit=BACKFILL_LIMIT):
+    """Copy each user's recent shared logs into the other's timeline.  Caller commits."""
+    for reader_id, author_id in ((user_a, user_b), (user_b, user_a)):
+        already = db.session.query(TimelineEntry.log_id)\
+            .filter(TimelineEntry.user_id == reader_id,
+                    TimelineEntry.author_id == author_id)
+        recent = (
+            db.session.query(PodcastLog.id, PodcastLog.listened_at)
+            .filter(PodcastLog.user_id == author_id,
+                    PodcastLog.shared == True,
+                    ~PodcastLog.id.in_(already))
+            .order_by(PodcastLog.listened_at.desc())
+            .limit(limit)
+            .all()
+        )
+        db.session.bulk_insert_mappings(TimelineEntry, [
+            {
+                'user_id':     reader_id,
+                'log_id':      log_id,
+                'author_id':   author_id,
+                'listened_at': listened_at,
+            }
+            for log_id, listened_at in recent
+        ])
+
+
+def prune_friendship(user_a, user_b):
+    """Drop each user's posts from the other's timeline.  Caller commits."""
+    TimelineEntry.query.filter(
+        or_(
+            and_(TimelineEntry.user_id == user_a, TimelineEntry.author_id == user_b),
+            and_(TimelineEntry.user_id == user_b, TimelineEntry.author_id == user_a)
+        )
+    ).delete(synchronize_session=False)
+
+
+def remove_log(log_id):
+    """Forget a log everywhere it was fanned out to.  Caller commits."""
+    TimelineEntry.query.filter_by(log_id=log_id).delete(synchronize_session=False)
+
+
+def friends_feed(user_id, cursor=None, per_page=9):
+    """
+    One page of a user's friends timeline: a single range scan over
+    (user_id, listened_at, log_id), then the logs themselves by primary key.
+    Returns (logs, next_cursor).
+    """
+    entries, next_cursor = keyset_page(
+        TimelineEntry.query.filter_by(user_id=user_id),
+        cursor, per_page,
+        order=(TimelineEntry.listened_at, TimelineEntry.log_id)
+    )
+    if not entries:
+        return [], next_cursor
+    by_id = {
+        log.id: log for log in
+        PodcastLog.query.filter(PodcastLog.id.in_([e.log_id for e in entries])).all()
+    }
+    return [by_id[e.log_id] for e in entries if e.log_id in by_id], next_cursor
+
+
+def rebuild_timelines():
+    """Recompute every timeline from shared logs and the friendship graph."""
+    table = TimelineEntry.__table__
+    columns = ['user_id', 'log_id', 'author_id', 'listened_at']
+    TimelineEntry.query.delete(synchronize_session=False)
+
+    # the sharer's own timeline…
+    own = db.select(PodcastLog.user_id, PodcastLog.id, PodcastLog.user_id.label('author_id'), PodcastLog.listened_at)\
+        .where(PodcastLog.shared == True)
+    # …and every friend's
+    friends = db.select(Friendship.friend_id, PodcastLog.id, PodcastLog.user_id, PodcastLog.listened_at)\
+        .join(Friendship, Friendship.user_id == PodcastLog.user_id)\
+        .where(PodcastLog.shared == True)
+
+    db.session.execute(table.insert().from_select(columns, own))
+    db.session.execute(table.insert().from_select(columns, friends))
+    db.session.commit()
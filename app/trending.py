@@ -0,0 +1,296 @@
+import heapq
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.db import db
+from app.models import Podcast, PodcastLog, TrendingSnapshot
+
+EPOCH = datetime(1970, 1, 1)
+
+# window name -> decay time constant.  An event one window old still
+# counts e^-1 ≈ 0.37 of a fresh one, so each window behaves like a
+# smoothed sliding window with no boundary to fall off.
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d':  timedelta(days=7),
+}
+# predicted_popularity follows the slower window
+POPULARITY_WINDOW = '7d'
+# anything older than this many time constants contributes < 0.1%
+REBUILD_HORIZON = 7
+
+
+def _seconds(when):
+    return (when - EPOCH).total_seconds()
+
+
+# ─── SKETCH ────────────────────────────────────────────────
+
+class CountMinSketch:
+    """
+    Fixed-size frequency sketch over integer keys.  Estimates never
+    undercount; with `width` w they overcount by at most e/w of the total
+    weight with probability 1 - e^-depth.  Row hashes come from a fixed
+    seed so a persisted sketch stays valid across processes.
+    """
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, width=2048, depth=4, seed=0x5eed):
+        rng = random.Random(seed)
+        self.width  = width
+        self.depth  = depth
+        self.seed   = seed
+        self.hashes = [(rng.randrange(1, self.PRIME), rng.randrange(self.PRIME))
+                       for _ in range(depth)]
+        self.rows   = [[0.0] * width for _ in range(depth)]
+
+    def _cells(self, key):
+        for row, (a, b) in zip(self.rows, self.hashes):
+            yield row, ((a * key + b) % self.PRIME) % self.width
+
+    def add(self, key, weight=1.0):
+        """Add `weight` to `key` and return its new estimate."""
+        estimate = math.inf
+        for row, i in self._cells(key):
+            row[i] += weight
+            estimate = min(estimate, row[i])
+        return estimate
+
+    def estimate(self, key):
+        return min(row[i] for row, i in self._cells(key))
+
+    def scale(self, factor):
+        for row in self.rows:
+            for i, value in enumerate(row):
+                row[i] = value * factor
+
+
+# ─── DECAYED TOP-K ─────────────────────────────────────────
+
+class DecayedTopK:
+    """
+    Approximate top-k keys by exponentially time-decayed count.
+
+    Uses forward decay: an event at time t is stored with weight
+    e^((t - landmark) / tau) rather than decaying every counter as time
+    passes.  Every stored score shrinks by the same factor at read time,
+    so ranking them needs no clock, and a min-heap of the current
+    candidates is enough to keep the heavy hitters.
+    """
+
+    def __init__(self, tau, k=100, width=2048, depth=4, landmark=0.0):
+        self.tau      = tau
+        self.k        = k
+        self.landmark = landmark
+        self.sketch   = CountMinSketch(width, depth)
+        self.scores   = {}   # candidate key -> forward-decayed estimate
+        self._heap    = []   # (score, key); entries go stale as scores rise
+
+    def _rescale(self, ts):
+        # keep e^((t - landmark)/tau) well inside float range
+        factor = math.exp(-(ts - self.landmark) / self.tau)
+        self.sketch.scale(factor)
+        self.scores = {key: score * factor for key, score in self.scores.items()}
+        self._heap = [(score, key) for key, score in self.scores.items()]
+        heapq.heapify(self._heap)
+        self.landmark = ts
+
+    def _min_candidate(self):
+        while self._heap:
+            score, key = self._heap[0]
+            if self.scores.get(key) == score:
+                return score, key
+            heapq.heappop(self._heap)
+        return None
+
+    def add(self, key, ts, weight=1.0):
+        """Count `weight` for `key` at epoch-seconds `ts`."""
+        if (ts - self.landmark) / self.tau > 50:
+            self._rescale(ts)
+        estimate = self.sketch.add(key, weight * math.exp((ts - self.landmark) / self.tau))
+
+        if key not in self.scores and len(self.scores) >= self.k:
+            lowest = self._min_candidate()
+            if estimate <= lowest[0]:
+                return
+            heapq.heappop(self._heap)
+            del self.scores[lowest[1]]
+        self.scores[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(score, key) for key, score in self.scores.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n, now):
+        """[(key, decayed score at epoch-seconds `now`)], best first."""
+        decay = math.exp(-(now - self.landmark) / self.tau)
+        best = heapq.nlargest(n, self.scores.items(), key=lambda kv: kv[1])
+        return [(key, score * decay) for key, score in best]
+
+    def to_state(self):
+        return {
+            'tau':      self.tau,
+            'k':        self.k,
+            'landmark': self.landmark,
+            'width':    self.sketch.width,
+            'depth':    self.sketch.depth,
+            'rows':     self.sketch.rows,
+            'scores':   [[key, score] for key, score in self.scores.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        tracker = cls(state['tau'], state['k'], state['width'], state['depth'], state['landmark'])
+        tracker.sketch.rows = state['rows']
+        tracker.scores = {int(key): score for key, score in state['scores']}
+        tracker._heap = [(score, key) for key, score in tracker.scores.items()]
+        heapq.heapify(tracker._heap)
+        return tracker
+
+
+# ─── ENGINE ────────────────────────────────────────────────
+
+class TrendingEngine:
+    """
+    One DecayedTopK per window, fed as podcasts are logged.  State is
+    loaded from trending_snapshot on first use; with no snapshot yet the
+    windows start empty rather than replaying podcast_log on a request.
+    Requests never write it back:
+    `flask trending rebuild`, run periodically, replays podcast_log into a
+    new snapshot and refreshes predicted_popularity.  Each worker process
+    keeps its own copy, like the in-process chat broker, and checks for a
+    newer snapshot at most every `reload_interval` seconds; on swapping
+    one in it re-adds the listens it has counted since that snapshot.
+    """
+
+    def __init__(self, reload_interval=300, k=100, max_recent=50000):
+        self.reload_interval = reload_interval
+        self.k        = k
+        self.lock     = threading.Lock()
+        self.trackers = None
+        self._saved_at = None                       # snapshot the trackers started from
+        self._checked  = time.monotonic()
+        self._recent   = deque(maxlen=max_recent)   # (podcast_id, ts) counted since then
+
+    def _fresh_trackers(self):
+        return {name: DecayedTopK(window.total_seconds(), self.k)
+                for name, window in WINDOWS.items()}
+
+    def _ensure_loaded(self):
+        if self.trackers is None or time.monotonic() - self._checked >= self.reload_interval:
+            self._load()
+
+    def _load(self):
+        self._checked = time.monotonic()
+        stamps = dict(db.session.query(TrendingSnapshot.window, TrendingSnapshot.saved_at))
+        if not set(stamps) >= set(WINDOWS):
+            if self.trackers is None:
+                self.trackers = self._fresh_trackers()
+            return
+        saved_at = min(stamps[name] for name in WINDOWS)
+        if self._saved_at is not None and saved_at <= self._saved_at:
+            return
+        snapshots = TrendingSnapshot.query.filter(TrendingSnapshot.window.in_(list(WINDOWS)))
+        trackers = {s.window: DecayedTopK.from_state(json.loads(s.state)) for s in snapshots}
+        cutoff = _seconds(saved_at)
+        self._recent = deque(((pid, ts) for pid, ts in self._recent if ts > cutoff),
+                             maxlen=self._recent.maxlen)
+        for podcast_id, ts in self._recent:
+            for tracker in trackers.values():
+                tracker.add(podcast_id, ts)
+        self.trackers = trackers
+        self._saved_at = saved_at
+
+    def record(self, podcast_id, when=None):
+        """Count one listen in this process's windows."""
+        if podcast_id is None:
+            return
+        ts = _seconds(when or datetime.utcnow())
+        with self.lock:
+            self._ensure_loaded()
+            for tracker in self.trackers.values():
+                tracker.add(podcast_id, ts)
+            self._recent.append((podcast_id, ts))
+
+    def top(self, window, n=10, now=None):
+        """[(podcast_id, score)] trending in `window`, best first."""
+        with self.lock:
+            self._ensure_loaded()
+            return self.trackers[window].top(n, _seconds(now or datetime.utcnow()))
+
+    def rebuild(self, now=None):
+        """Replay recent podcast_log rows into fresh trackers and save them."""
+        now = now or datetime.utcnow()
+        trackers = self._fresh_trackers()
+        since = now - REBUILD_HORIZON * max(WINDOWS.values())
+        logs = db.session.query(PodcastLog.podcast_id, PodcastLog.listened_at) \
+            .filter(PodcastLog.podcast_id != None, PodcastLog.listened_at >= since) \
+            .order_by(PodcastLog.listened_at)
+        for podcast_id, listened_at in logs.yield_per(5000):
+            ts = _seconds(listened_at)
+            for tracker in trackers.values():
+                tracker.add(podcast_id, ts)
+        self.trackers = trackers
+        self._save_locked(now)
+        self._saved_at = now
+        self._recent.clear()
+
+    def _save_locked(self, now):
+        for name, tracker in self.trackers.items():
+            snapshot = db.session.get(TrendingSnapshot, name) or TrendingSnapshot(window=name)
+            snapshot.state = json.dumps(tracker.to_state())
+            snapshot.saved_at = now
+            db.session.add(snapshot)
+        self._update_popularity(now)
+        db.session.commit()
+
+    def _update_popularity(self, now):
+        """predicted_popularity = trending score relative to the top podcast (0–1)."""
+        ranked = self.trackers[POPULARITY_WINDOW].top(self.k, _seconds(now))
+        best = ranked[0][1] if ranked else 0
+        ids = [pid for pid, _ in ranked]
+        Podcast.query \
+            .filter(Podcast.predicted_popularity != 0, Podcast.id.notin_(ids)) \
+            .update({Podcast.predicted_popularity: 0.0}, synchronize_session=False)
+        if best:
+            db.session.bulk_update_mappings(Podcast, [
+                {'id': pid, 'predicted_popularity': round(score / best, 4)}
+                for pid, score in ranked
+            ])
+
+
+def init_app(app):
+    app.extensions['trending'] = TrendingEngine(
+        reload_interval=app.config.get('TRENDING_RELOAD_INTERVAL', 300)
+    )
+
+
+def get_engine():
+    return current_app.extensions['trending']
+
+
+def record_log(log):
+    """Feed a committed PodcastLog into the trending windows."""
+    get_engine().record(log.podcast_id, log.listened_at)
+
+
+# ─── CLI ───────────────────────────────────────────────────
+
+trending_cli = AppGroup('trending', help='Maintain the trending-podcasts state.')
+
+
+@trending_cli.command('rebuild')
+def rebuild_command():
+    """Recompute trending windows from podcast_log (run from cron; workers pick it up)."""
+    with get_engine().lock:
+        get_engine().rebuild()
+    click.echo('Trending state rebuilt.')
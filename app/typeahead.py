@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import current_user
+
+from app import fulltext
+
+
+def normalize(q):
+    return ' '.join(q.casefold().split())
+
+
+# ─── MATCHING ──────────────────────────────────────────────
+# A cached entry is (payload, keys): the payload is what the endpoint
+# returns, the keys are what a longer query gets checked against when the
+# entry is reused.  Each matcher must agree with the search it stands in
+# for: anything the search would return for the longer query has to pass.
+# A search no matcher agrees with (LIKE's substring matching) passes
+# matches=None and is only ever answered by an exact hit.
+
+def key_prefix(keys, q):
+    """Some key starts with the whole query (the user prefix index)."""
+    return any(k.startswith(q) for k in keys)
+
+
+def every_term(keys, q):
+    """Every word of the query starts some key (FTS prefix queries)."""
+    return all(any(k.startswith(t) for k in keys) for t in fulltext.tokens(q))
+
+
+def words(*texts):
+    """Keys for every_term: the texts' tokens as the FTS index sees them."""
+    return frozenset(t for text in texts if text for t in fulltext.tokens(text))
+
+
+class Partial(list):
+    """What load() returns for results to show now but not keep (stale, or cut short)."""
+
+
+# ─── CACHE ─────────────────────────────────────────────────
+
+class TypeaheadCache:
+    """
+    Each user's last few typeahead results per endpoint, for `ttl` seconds.
+
+    Typing "p", "po", "pod" … asks for ever-longer prefixes.  Once a query
+    came back with fewer than `limit` results it had the whole match set,
+    so any longer query starting with it is answered by filtering those
+    results in memory instead of searching again.
+    """
+
+    def __init__(self, ttl=30, per_user=16, max_users=2048, clock=time.monotonic):
+        self.ttl       = ttl
+        self.per_user  = per_user
+        self.max_users = max_users
+        self.clock     = clock
+        self._lock     = threading.Lock()
+        self._users    = OrderedDict()   # (user_id, kind) -> OrderedDict(q -> (expires_at, entries, complete))
+        self._counts   = {}              # kind -> {'exact', 'prefix', 'miss'}
+
+    def _count(self, kind, how):
+        counts = self._counts.setdefault(kind, {'exact': 0, 'prefix': 0, 'miss': 0})
+        counts[how] += 1
+
+    def _find(self, recent, q, now, prefixes=True):
+        """
+        ('exact', entry) for q, else ('prefix', entry) of the longest
+        complete prefix of it, else ('miss', None).
+        """
+        hit = recent.get(q)
+        if hit is not None and hit[0] > now:
+            recent.move_to_end(q)
+            return 'exact', hit
+        best = None
+        if prefixes:
+            for prev, entry in recent.items():
+                expires_at, _, complete = entry
+                if complete and expires_at > now and q.startswith(prev) \
+                        and (best is None or len(prev) > len(best[0])):
+                    best = (prev, entry)
+        return ('prefix', best[1]) if best else ('miss', None)
+
+    def _store(self, user_key, q, entries, complete, expires_at):
+        recent = self._users.get(user_key)
+        if recent is None:
+            recent = self._users[user_key] = OrderedDict()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_key)
+        recent[q] = (expires_at, entries, complete)
+        recent.move_to_end(q)
+        while len(recent) > self.per_user:
+            recent.popitem(last=False)
+
+    def lookup(self, user_id, kind, q, load, matches, limit=10, min_reuse=0):
+        """
+        Payloads for `q`, and how they were found ('exact', 'prefix' or
+        'miss').  `load()` runs the real search and returns (payload, keys)
+        pairs, as a Partial if they mustn't be cached; `matches(keys, q)`
+        re-checks a cached pair against q, or is None to never answer from
+        a shorter query.  A shorter query's results are only reused if at
+        least `min_reuse` of them still match.
+        """
+        q = normalize(q)
+        user_key = (user_id, kind)
+        now = self.clock()
+        with self._lock:
+            recent = self._users.get(user_key)
+            how, hit = self._find(recent, q, now, matches is not None) if recent else ('miss', None)
+            if hit is not None:
+                expires_at, entries, _ = hit
+            if how == 'prefix':
+                entries = [e for e in entries if matches(e[1], q)]
+                if len(entries) < min_reuse:
+                    how = 'miss'
+                else:
+                    # a subset of a complete set is complete too, and no fresher
+                    self._store(user_key, q, entries, True, expires_at)
+            self._count(kind, how)
+        if how == 'miss':
+            entries = load()
+            if not isinstance(entries, Partial):
+                with self._lock:
+                    self._store(user_key, q, entries, len(entries) < limit, self.clock() + self.ttl)
+        return [payload for payload, _ in entries[:limit]], how
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for kind, counts in self._counts.items():
+                total = sum(counts.values())
+                hits = counts['exact'] + counts['prefix']
+                out[kind] = dict(counts, hit_rate=round(hits / total, 3) if total else 0.0)
+            out['tracked'] = len(self._users)     # (user, endpoint) pairs held
+            return out
+
+
+def init_app(app):
+    app.extensions['typeahead'] = TypeaheadCache(ttl=app.config.get('TYPEAHEAD_CACHE_TTL', 30))
+
+
+def get_cache():
+    return current_app.extensions['typeahead']
+
+
+def lookup(kind, q, load, matches, limit=10, min_reuse=0):
+    """TypeaheadCache.lookup for the signed-in user."""
+    return get_cache().lookup(current_user.id, kind, q, load, matches, limit, min_reuse)
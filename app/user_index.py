@@ -0,0 +1,142 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+from app.models import User
+
+
+class UserPrefixIndex:
+    """
+    Usernames and display names held in memory for the friend-search
+    typeahead: one sorted list of (key, user_id), where the keys are the
+    casefolded username, the full display name and each word of it.  A
+    lookup bisects to the first key >= the query and walks forward while
+    keys still start with it, so it never touches the database.
+
+    Loaded from the User table on first use and patched in place on
+    signup/settings changes.  Other worker processes only see those
+    patches when their copy is reloaded, at most `max_age` seconds on.
+    Patches made while a reload is reading the table are replayed onto
+    the new copy, since the read may have missed them.
+    """
+
+    def __init__(self, max_age=300, clock=time.monotonic):
+        self.max_age   = max_age
+        self.clock     = clock
+        self._entries  = []      # sorted (key, user_id)
+        self._users    = {}      # user_id -> (username, display_name)
+        self._loaded_at = None
+        self._lock     = threading.Lock()
+        self._load_lock = threading.Lock()    # one reload at a time
+        self._replay   = None    # [(user_id, names or None)] while a reload runs
+
+    @staticmethod
+    def name_keys(username, display_name):
+        keys = {username.casefold()}
+        if display_name:
+            name = ' '.join(display_name.casefold().split())
+            keys.add(name)
+            keys.update(name.split())
+        return keys
+
+    def _fresh(self):
+        return self._loaded_at is not None and self.clock() - self._loaded_at < self.max_age
+
+    def _ensure_loaded(self):
+        if self._fresh():
+            return
+        with self._load_lock:
+            if self._fresh():
+                return          # another thread reloaded while we waited
+            with self._lock:
+                self._replay = []
+            try:
+                rows = User.query.with_entities(User.id, User.username, User.display_name).all()
+                entries = sorted((key, uid) for uid, uname, dname in rows
+                                 for key in self.name_keys(uname, dname))
+                with self._lock:
+                    self._entries = entries
+                    self._users = {uid: (uname, dname) for uid, uname, dname in rows}
+                    self._loaded_at = self.clock()
+                    for user_id, names in self._replay:
+                        self._remove(user_id)
+                        if names is not None:
+                            self._insert(user_id, *names)
+            finally:
+                with self._lock:
+                    self._replay = None
+
+    def _remove(self, user_id):
+        old = self._users.pop(user_id, None)
+        if old is None:
+            return
+        for key in self.name_keys(*old):
+            i = bisect_left(self._entries, (key, user_id))
+            if i < len(self._entries) and self._entries[i] == (key, user_id):
+                del self._entries[i]
+
+    def _insert(self, user_id, username, display_name):
+        self._users[user_id] = (username, display_name)
+        for key in self.name_keys(username, display_name):
+            insort(self._entries, (key, user_id))
+
+    def put(self, user_id, username, display_name):
+        """Add a user or replace their names."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((user_id, (username, display_name)))
+            if self._loaded_at is None:
+                return          # picked up by the first load
+            self._remove(user_id)
+            self._insert(user_id, username, display_name)
+
+    def remove(self, user_id):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((user_id, None))
+            self._remove(user_id)
+
+    def search(self, q, limit=10, exclude=None):
+        """Usernames of up to `limit` users with a name starting with `q`, closest first."""
+        return [username for username, _ in self.lookup(q, limit, exclude)]
+
+    def lookup(self, q, limit=10, exclude=None):
+        """As search(), but (username, display_name) pairs."""
+        q = ' '.join(q.casefold().split())
+        if not q:
+            return []
+        self._ensure_loaded()
+        found = []
+        with self._lock:
+            entries = self._entries
+            i = bisect_left(entries, (q,))
+            while i < len(entries) and len(found) < limit:
+                key, uid = entries[i]
+                if not key.startswith(q):
+                    break
+                if uid != exclude and uid not in found:
+                    found.append(uid)
+                i += 1
+            return [self._users[uid] for uid in found]
+
+    def __len__(self):
+        return len(self._users)
+
+
+def init_app(app):
+    app.extensions['user_index'] = UserPrefixIndex(max_age=app.config.get('USER_INDEX_MAX_AGE', 300))
+
+
+def get_index():
+    return current_app.extensions['user_index']
+
+
+def note_user(user):
+    """Call after committing a new user or a change to their names."""
+    get_index().put(user.id, user.username, user.display_name)
+
+
+def forget_user(user_id):
+    get_index().remove(user_id)
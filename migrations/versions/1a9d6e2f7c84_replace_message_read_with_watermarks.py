@@ -0,0 +1,67 @@
+"""Replace message.read flags with per-participant read watermarks
+
+Revision ID: 1a9d6e2f7c84
+Revises: f5a0c3d81e27
+Create Date: 2026-10-18 15:07:36.402193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '1a9d6e2f7c84'
+down_revision = 'f5a0c3d81e27'
+branch_labels = None
+depends_on = None
+
+# A participant's watermark sits just below their oldest unread message, or
+# on the conversation's latest message if they had read everything.  Any
+# read message above an unread one is treated as unread — conservative, so
+# nothing previously unread gets lost.
+WATERMARK_SQL = """
+    UPDATE conversation SET {column} = COALESCE(
+        (SELECT MIN(m.id) - 1 FROM message m
+          WHERE m.conversation_id = conversation.id
+            AND m.recipient_id = conversation.{user}
+            AND m.read = 0),
+        (SELECT MAX(m.id) FROM message m
+          WHERE m.conversation_id = conversation.id),
+        0
+    )
+"""
+
+
+def upgrade():
+    with op.batch_alter_table('conversation') as batch_op:
+        batch_op.add_column(
+            sa.Column('user1_last_read_id', sa.Integer(), nullable=False, server_default='0')
+        )
+        batch_op.add_column(
+            sa.Column('user2_last_read_id', sa.Integer(), nullable=False, server_default='0')
+        )
+
+    op.execute(WATERMARK_SQL.format(column='user1_last_read_id', user='user1_id'))
+    op.execute(WATERMARK_SQL.format(column='user2_last_read_id', user='user2_id'))
+
+    with op.batch_alter_table('message', recreate="always") as batch_op:
+        batch_op.drop_column('read')
+    op.create_index('ix_message_convo_recipient', 'message',
+                    ['conversation_id', 'recipient_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_message_convo_recipient', table_name='message')
+    with op.batch_alter_table('message', recreate="always") as batch_op:
+        batch_op.add_column(
+            sa.Column('read', sa.Boolean(), nullable=False, server_default=sa.false())
+        )
+    op.execute("""
+        UPDATE message SET read = 1 WHERE id <= (
+            SELECT CASE WHEN message.recipient_id = c.user1_id
+                        THEN c.user1_last_read_id ELSE c.user2_last_read_id END
+            FROM conversation c WHERE c.id = message.conversation_id
+        )
+    """)
+    with op.batch_alter_table('conversation') as batch_op:
+        batch_op.drop_column('user2_last_read_id')
+        batch_op.drop_column('user1_last_read_id')
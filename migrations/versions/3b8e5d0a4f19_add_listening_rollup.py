@@ -0,0 +1,48 @@
+"""Add listening_rollup table for the dashboard
+
+Revision ID: 3b8e5d0a4f19
+Revises: 1a9d6e2f7c84
+Create Date: 2026-10-18 16:21:44.815002
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3b8e5d0a4f19'
+down_revision = '1a9d6e2f7c84'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('listening_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('podcast_id', sa.Integer(), nullable=True),
+        sa.Column('genre', sa.String(length=64), nullable=False),
+        sa.Column('duration_sum', sa.Integer(), nullable=False),
+        sa.Column('rating_sum', sa.Float(), nullable=False),
+        sa.Column('rating_count', sa.Integer(), nullable=False),
+        sa.Column('log_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['podcast_id'], ['podcast.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'day', 'podcast_id', 'genre', name='uq_rollup_key')
+    )
+
+    # roll up existing history (same as `flask rollups rebuild`)
+    op.execute("""
+        INSERT INTO listening_rollup
+            (user_id, day, podcast_id, genre,
+             duration_sum, rating_sum, rating_count, log_count)
+        SELECT user_id, date(listened_at), podcast_id, COALESCE(genre, ''),
+               COALESCE(SUM(duration), 0), COALESCE(SUM(rating), 0), COUNT(rating), COUNT(id)
+        FROM podcast_log
+        WHERE listened_at IS NOT NULL
+        GROUP BY user_id, date(listened_at), podcast_id, COALESCE(genre, '')
+    """)
+
+
+def downgrade():
+    op.drop_table('listening_rollup')
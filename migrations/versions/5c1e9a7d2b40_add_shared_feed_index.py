@@ -0,0 +1,26 @@
+"""Add (shared, listened_at, id) index for keyset feed pagination
+
+Revision ID: 5c1e9a7d2b40
+Revises: adca1a252d1b
+Create Date: 2026-10-18 09:12:04.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5c1e9a7d2b40'
+down_revision = 'adca1a252d1b'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index(
+        'ix_podcast_log_shared_feed',
+        'podcast_log',
+        ['shared', 'listened_at', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_podcast_log_shared_feed', table_name='podcast_log')
@@ -0,0 +1,70 @@
+"""Add user.timezone and (user_id, listened_at) index; re-bucket rollups by local day
+
+Revision ID: 6d2c8f4b9a10
+Revises: 3b8e5d0a4f19
+Create Date: 2026-10-18 17:48:09.337195
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+import pytz
+
+# revision identifiers, used by Alembic.
+revision = '6d2c8f4b9a10'
+down_revision = '3b8e5d0a4f19'
+branch_labels = None
+depends_on = None
+
+DEFAULT_TIMEZONE = 'Australia/Perth'
+
+
+def _rebuild_rollups(conn, tz_name):
+    """The previous revision bucketed by UTC date; re-bucket by local date."""
+    tz = pytz.timezone(tz_name)
+    totals = {}
+    rows = conn.execute(sa.text(
+        "SELECT user_id, listened_at, podcast_id, genre, duration, rating "
+        "FROM podcast_log WHERE listened_at IS NOT NULL"
+    ))
+    for uid, listened_at, pid, genre, duration, rating in rows:
+        if isinstance(listened_at, str):
+            listened_at = datetime.fromisoformat(listened_at)
+        day = pytz.utc.localize(listened_at).astimezone(tz).date()
+        row = totals.setdefault((uid, day, pid, genre or ''), [0, 0.0, 0, 0])
+        row[0] += duration or 0
+        if rating is not None:
+            row[1] += rating
+            row[2] += 1
+        row[3] += 1
+
+    conn.execute(sa.text("DELETE FROM listening_rollup"))
+    if totals:
+        conn.execute(
+            sa.text(
+                "INSERT INTO listening_rollup (user_id, day, podcast_id, genre, "
+                "duration_sum, rating_sum, rating_count, log_count) "
+                "VALUES (:u, :d, :p, :g, :dur, :rs, :rc, :n)"
+            ),
+            [
+                {'u': u, 'd': d, 'p': p, 'g': g, 'dur': v[0], 'rs': v[1], 'rc': v[2], 'n': v[3]}
+                for (u, d, p, g), v in totals.items()
+            ]
+        )
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('timezone', sa.String(length=64), nullable=True))
+
+    op.create_index('ix_podcast_log_user_listened', 'podcast_log', ['user_id', 'listened_at'])
+
+    # nobody has picked a timezone yet, so everyone is on the default
+    _rebuild_rollups(op.get_bind(), DEFAULT_TIMEZONE)
+
+
+def downgrade():
+    op.drop_index('ix_podcast_log_user_listened', table_name='podcast_log')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('timezone')
@@ -0,0 +1,28 @@
+"""Add trending_snapshot table
+
+Revision ID: 7e4b1a9c3d52
+Revises: 6d2c8f4b9a10
+Create Date: 2026-10-18 18:31:02.114873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7e4b1a9c3d52'
+down_revision = '6d2c8f4b9a10'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # the engine rebuilds from podcast_log on first use when this is empty
+    op.create_table('trending_snapshot',
+        sa.Column('window', sa.String(length=16), nullable=False),
+        sa.Column('state', sa.Text(), nullable=False),
+        sa.Column('saved_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('window')
+    )
+
+
+def downgrade():
+    op.drop_table('trending_snapshot')
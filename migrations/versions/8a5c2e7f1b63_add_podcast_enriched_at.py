@@ -0,0 +1,26 @@
+"""Add podcast.enriched_at for background metadata enrichment
+
+Revision ID: 8a5c2e7f1b63
+Revises: 7e4b1a9c3d52
+Create Date: 2026-10-18 19:12:40.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8a5c2e7f1b63'
+down_revision = '7e4b1a9c3d52'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('podcast') as batch_op:
+        batch_op.add_column(sa.Column('enriched_at', sa.DateTime(), nullable=True))
+    # everything already here was fetched from Spotify synchronously
+    op.execute("UPDATE podcast SET enriched_at = CURRENT_TIMESTAMP")
+
+
+def downgrade():
+    with op.batch_alter_table('podcast') as batch_op:
+        batch_op.drop_column('enriched_at')
@@ -0,0 +1,37 @@
+"""Add like_count / comment_count counters to podcast_log
+
+Revision ID: 8f3a61c0d9e2
+Revises: 5c1e9a7d2b40
+Create Date: 2026-10-18 10:02:47.530611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8f3a61c0d9e2'
+down_revision = '5c1e9a7d2b40'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('podcast_log') as batch_op:
+        batch_op.add_column(
+            sa.Column('like_count', sa.Integer(), nullable=False, server_default='0')
+        )
+        batch_op.add_column(
+            sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0')
+        )
+
+    # backfill from the existing like/comment rows
+    op.execute("""
+        UPDATE podcast_log SET
+            like_count    = (SELECT COUNT(*) FROM "like"  WHERE "like".post_id  = podcast_log.id),
+            comment_count = (SELECT COUNT(*) FROM comment WHERE comment.post_id = podcast_log.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('podcast_log') as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
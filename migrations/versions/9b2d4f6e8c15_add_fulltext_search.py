@@ -0,0 +1,60 @@
+"""Add SQLite FTS5 indexes over podcasts and podcast logs
+
+Revision ID: 9b2d4f6e8c15
+Revises: 8a5c2e7f1b63
+Create Date: 2026-10-18 21:05:16.220947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9b2d4f6e8c15'
+down_revision = '8a5c2e7f1b63'
+branch_labels = None
+depends_on = None
+
+# fts table -> (content table, indexed columns); mirrors app/fulltext.py
+INDEXES = {
+    'podcast_fts':     ('podcast',     ('name', 'publisher', 'description')),
+    'podcast_log_fts': ('podcast_log', ('ep_name', 'review')),
+}
+
+
+def upgrade():
+    # other engines search with LIKE; nothing to build
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for fts, (table, columns) in INDEXES.items():
+        cols = ', '.join(columns)
+        new = ', '.join(f'new.{c}' for c in columns)
+        old = ', '.join(f'old.{c}' for c in columns)
+        op.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"{cols}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        # index what's already there
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for fts in INDEXES:
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {fts}")
@@ -0,0 +1,50 @@
+"""Add timeline_entry table for the friends feed
+
+Revision ID: c27d4e8b1f35
+Revises: 8f3a61c0d9e2
+Create Date: 2026-10-18 11:25:13.904472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c27d4e8b1f35'
+down_revision = '8f3a61c0d9e2'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('timeline_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('log_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('listened_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['log_id'], ['podcast_log.id'], ),
+        sa.ForeignKeyConstraint(['author_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'log_id', name='uq_timeline_user_log')
+    )
+    op.create_index('ix_timeline_user_listened', 'timeline_entry',
+                    ['user_id', 'listened_at', 'log_id'])
+
+    # fan out everything already shared: the sharer's own timeline…
+    op.execute("""
+        INSERT INTO timeline_entry (user_id, log_id, author_id, listened_at)
+        SELECT user_id, id, user_id, listened_at
+        FROM podcast_log WHERE shared = 1 AND listened_at IS NOT NULL
+    """)
+    # …and each of their friends'
+    op.execute("""
+        INSERT INTO timeline_entry (user_id, log_id, author_id, listened_at)
+        SELECT f.friend_id, l.id, l.user_id, l.listened_at
+        FROM podcast_log l JOIN friendship f ON f.user_id = l.user_id
+        WHERE l.shared = 1 AND l.listened_at IS NOT NULL
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_timeline_user_listened', table_name='timeline_entry')
+    op.drop_table('timeline_entry')
@@ -0,0 +1,33 @@
+"""Add unread_conversations counter to user
+
+Revision ID: e41b7f9a0c63
+Revises: c27d4e8b1f35
+Create Date: 2026-10-18 12:40:58.217730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7f9a0c63'
+down_revision = 'c27d4e8b1f35'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(
+            sa.Column('unread_conversations', sa.Integer(), nullable=False, server_default='0')
+        )
+
+    op.execute("""
+        UPDATE "user" SET unread_conversations = (
+            SELECT COUNT(DISTINCT conversation_id) FROM message
+            WHERE message.recipient_id = "user".id AND message.read = 0
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('unread_conversations')
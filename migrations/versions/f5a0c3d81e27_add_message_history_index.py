@@ -0,0 +1,26 @@
+"""Add (conversation_id, created_at, id) index for windowed chat history
+
+Revision ID: f5a0c3d81e27
+Revises: e41b7f9a0c63
+Create Date: 2026-10-18 13:58:21.660914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f5a0c3d81e27'
+down_revision = 'e41b7f9a0c63'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index(
+        'ix_message_convo_created',
+        'message',
+        ['conversation_id', 'created_at', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_message_convo_created', table_name='message')
@@ -4,9 +4,14 @@ from app.models import (
     Podcast, PodcastLog, Like, Comment,
     Conversation, Message
 )
+from app.timeline import rebuild_timelines
+from app.chat import recount_unread
+from app.analytics import rebuild_rollups
+from app.trending import get_engine as trending_engine
 from faker import Faker
 import random
 from itertools import combinations
+from datetime import datetime
 
 def seed():
     app = create_app()
@@ -73,8 +78,9 @@ def seed():
                 description=faker.text(max_nb_chars=200),
                 publisher=faker.company(),
                 image_url=faker.image_url(),
-                predicted_popularity=round(random.random(), 2),
-                similar_to='[]'
+                predicted_popularity=0.0,   # filled in from trending below
+                similar_to='[]',
+                enriched_at=datetime.utcnow()    # made up, nothing to fetch
             )
             db.session.add(p)
             podcasts.append(p)
@@ -101,6 +107,12 @@ def seed():
                 logs.append(log)
         db.session.commit()
 
+        # Fan shared logs out into friends' timelines, roll up listening
+        # and seed the trending windows
+        rebuild_timelines()
+        rebuild_rollups()
+        trending_engine().rebuild()
+
         # Likes & comments for logs
         for log in random.sample(logs, min(len(logs), 20)):
             liker = random.choice([u for u in users if u.id != log.user_id])
@@ -130,10 +142,15 @@ def seed():
                     sender_id=sender,
                     recipient_id=recipient,
                     text=faker.sentence(),
-                    podcast_log_id=(random.choice(logs).id if random.random() < 0.3 else None),
-                    read=random.choice([True, False])
+                    podcast_log_id=(random.choice(logs).id if random.random() < 0.3 else None)
                 ))
             db.session.commit()
+            # each side has read some, all or none of it
+            last_id = conv.messages.order_by(Message.id.desc()).first().id
+            conv.user1_last_read_id = random.choice([0, last_id])
+            conv.user2_last_read_id = random.choice([0, last_id])
+            db.session.commit()
+        recount_unread()
 
         print("Seed data added successfully.")
 
@@ -0,0 +1,159 @@
+# tests/test_analytics.py
+import unittest
+from datetime import date, datetime
+from app import create_app, db
+from app.models import User, Podcast, PodcastLog, ListeningRollup
+from app import analytics
+
+
+class AnalyticsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='listener', email='listener@example.com', pw_hash='dummyhash')
+        self.other = User(username='other', email='other@example.com', pw_hash='dummyhash')
+        self.pod_a = Podcast(name='Alpha', spotify_id='alpha')
+        self.pod_b = Podcast(name='Beta', spotify_id='beta')
+        db.session.add_all([self.user, self.other, self.pod_a, self.pod_b])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def log(self, podcast, when, duration, rating=None, genre='Tech', user=None):
+        log = PodcastLog(user_id=(user or self.user).id, podcast_id=podcast.id,
+                         listened_at=when, duration=duration, rating=rating, genre=genre)
+        db.session.add(log)
+        db.session.flush()
+        analytics.record_log(log)
+        db.session.commit()
+        return log
+
+    def seed(self):
+        self.log(self.pod_a, datetime(2025, 5, 5, 9), 600, 4)
+        self.log(self.pod_a, datetime(2025, 5, 5, 12), 1200, 5)
+        self.log(self.pod_b, datetime(2025, 5, 6, 8), 3000, 3, genre='News')
+        self.log(self.pod_b, datetime(2025, 5, 13, 8), 600, None, genre=None)
+        self.log(self.pod_a, datetime(2025, 5, 5, 9), 999, 1, user=self.other)
+
+    def test_same_day_logs_share_a_row(self):
+        self.seed()
+        self.assertEqual(ListeningRollup.query.filter_by(user_id=self.user.id).count(), 3)
+
+    def test_dashboard_queries(self):
+        self.seed()
+        top = analytics.top_podcasts(self.user.id)
+        self.assertEqual([(name, total) for name, _, _, total in top],
+                         [('Beta', 3600), ('Alpha', 1800)])
+
+        name, avg, total = analytics.most_loved(self.user.id)
+        self.assertEqual((name, avg), ('Alpha', 4.5))
+
+        self.assertEqual(sorted(analytics.genre_breakdown(self.user.id), key=str),
+                         sorted([('Tech', 1800), ('News', 3000), (None, 600)], key=str))
+        self.assertEqual(analytics.listening_series(self.user.id, 'week'),
+                         [('2025-W19', 4800), ('2025-W20', 600)])
+
+    def test_forget_log_and_rebuild_agree(self):
+        self.seed()
+        gone = PodcastLog.query.filter_by(user_id=self.user.id, duration=1200).one()
+        analytics.forget_log(gone)
+        db.session.delete(gone)
+        db.session.commit()
+
+        def snapshot():
+            return sorted(
+                (r.user_id, r.day, r.podcast_id, r.genre, r.duration_sum,
+                 r.rating_sum, r.rating_count, r.log_count)
+                for r in ListeningRollup.query.all()
+            )
+
+        incremental = snapshot()
+        analytics.rebuild_rollups()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_days_follow_the_users_timezone(self):
+        # 20:00 UTC is already the next morning in Perth, but not in London
+        self.log(self.pod_a, datetime(2025, 5, 5, 20), 600)
+        self.assertEqual(ListeningRollup.query.one().day.isoformat(), '2025-05-06')
+
+        self.user.timezone = 'Europe/London'
+        db.session.commit()
+        analytics.rebuild_rollups(self.user.id)
+        self.assertEqual(ListeningRollup.query.one().day.isoformat(), '2025-05-05')
+
+    def test_listening_series_range_and_granularity(self):
+        self.seed()
+        self.assertEqual(analytics.listening_series(self.user.id, 'day', date(2025, 5, 6), date(2025, 5, 13)),
+                         [('2025-05-06', 3000), ('2025-05-13', 600)])
+        self.assertEqual(analytics.listening_series(self.user.id, 'month'), [('2025-05', 5400)])
+        self.assertEqual(analytics.genre_breakdown(self.user.id, end=date(2025, 5, 5)), [('Tech', 1800)])
+        with self.assertRaises(ValueError):
+            analytics.listening_series(self.user.id, 'hour')
+
+    def test_visualise_data_etag(self):
+        self.seed()
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+
+        url = '/api/visualise-data?granularity=day&from=2025-05-05&to=2025-05-06'
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([b['bucket'] for b in first.get_json()['listening']],
+                         ['2025-05-05', '2025-05-06'])
+        etag = first.headers['ETag']
+        self.assertEqual(first.headers['Cache-Control'], 'private, no-cache')
+        self.assertNotIn('Pragma', first.headers)
+
+        again = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b'')
+        self.assertEqual(again.headers['Cache-Control'], 'private, no-cache')
+        self.assertIn('no-store', client.get('/visualise').headers['Cache-Control'])
+
+        self.log(self.pod_a, datetime(2025, 5, 6, 2), 60)
+        changed = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+        self.assertEqual(client.get('/api/visualise-data?granularity=hour').status_code, 400)
+        self.assertEqual(client.get('/api/visualise-data?from=yesterday').status_code, 400)
+
+    def test_share_then_delete_matches_rebuild(self):
+        self.seed()
+        log = self.log(self.pod_a, datetime(2025, 5, 6, 9), 900, 2)
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+
+        def rows():
+            db.session.expire_all()
+            return sorted((r.user_id, r.day, r.podcast_id, r.genre, r.duration_sum,
+                           r.rating_sum, r.rating_count, r.log_count)
+                          for r in ListeningRollup.query.all())
+
+        self.assertTrue(client.post(f'/share_podcast/{log.id}').get_json()['success'])
+        self.assertTrue(client.delete(f'/podcast_log/{log.id}').get_json()['success'])
+        incremental = rows()
+        analytics.rebuild_rollups()
+        db.session.commit()
+        self.assertEqual(incremental, rows())
+
+    def test_forget_last_log_removes_row(self):
+        log = self.log(self.pod_a, datetime(2025, 5, 5, 9), 600, 4)
+        analytics.forget_log(log)
+        db.session.commit()
+        self.assertEqual(ListeningRollup.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# tests/test_cache.py
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from app.cache import TTLCache, SingleFlight, SqliteCacheStore, SharedCache
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def test_entries_expire(self):
+        clock = Clock()
+        cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 61
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats()['hits'], 3)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow():
+            calls.append(1)
+            release.wait(2)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        while flight.coalesced < 7:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 8)
+
+    def test_errors_reach_every_waiter_and_are_not_remembered(self):
+        flight = SingleFlight()
+
+        def boom():
+            raise ValueError('nope')
+
+        with self.assertRaises(ValueError):
+            flight.do('k', boom)
+        self.assertEqual(flight.do('k', lambda: 'ok'), 'ok')
+
+
+class SharedCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_read_through(self):
+        cache = SharedCache(ttl=60)
+        loads = []
+        loader = lambda: loads.append(1) or ['x']
+        self.assertEqual(cache.get_or_load('q', loader), ['x'])
+        self.assertEqual(cache.get_or_load('q', loader), ['x'])
+        self.assertEqual(len(loads), 1)
+
+    def test_workers_share_the_store(self):
+        first = SharedCache(ttl=60, store=SqliteCacheStore(self.path))
+        second = SharedCache(ttl=60, store=SqliteCacheStore(self.path))
+        first.get_or_load('q', lambda: [{'id': 'show'}])
+        self.assertEqual(second.get_or_load('q', lambda: self.fail('should not load')),
+                         [{'id': 'show'}])
+        self.assertEqual(second.stats()['store_hits'], 1)
+
+    def test_store_entries_expire(self):
+        clock = Clock(1000.0)
+        store = SqliteCacheStore(self.path, clock=clock)
+        store.set('q', [1], ttl=10)
+        self.assertEqual(store.get('q'), [1])
+        clock.now += 11
+        self.assertNotEqual(store.get('q'), [1])
+
+
+class StaleWhileRevalidateTestCase(unittest.TestCase):
+    def test_stale_value_served_while_reload_runs(self):
+        clock = Clock()
+        cache = SharedCache(ttl=60, stale_ttl=600)
+        cache.local.clock = clock
+        cache.lookup('q', lambda: 'v1')
+
+        clock.now = 61
+        reloaded = threading.Event()
+
+        def reload():
+            reloaded.set()
+            return 'v2'
+
+        self.assertEqual(cache.lookup('q', reload), ('v1', True))
+        self.assertTrue(reloaded.wait(2))
+        for _ in range(100):
+            if cache.lookup('q', reload) == ('v2', False):
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.lookup('q', reload), ('v2', False))
+
+    def test_failed_reload_keeps_stale_copy(self):
+        clock = Clock()
+        cache = SharedCache(ttl=60, stale_ttl=600)
+        cache.local.clock = clock
+        cache.lookup('q', lambda: 'v1')
+        clock.now = 61
+
+        def down():
+            raise RuntimeError('spotify down')
+
+        self.assertEqual(cache.lookup('q', down), ('v1', True))
+        time.sleep(0.05)
+        self.assertEqual(cache.lookup('q', down), ('v1', True))
+
+        clock.now = 700                 # past the stale window too
+        with self.assertRaises(RuntimeError):
+            cache.lookup('q', down)
+
+
+if __name__ == '__main__':
+    unittest.main()
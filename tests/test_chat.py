@@ -0,0 +1,282 @@
+# tests/test_chat.py
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Conversation, Message, PodcastLog
+from app import chat
+from app import broker as chat_broker
+from app.broker import InProcessBroker, Broker, Subscription
+
+
+class RecordingBroker(Broker):
+    """Stand-in backend: remembers what was published."""
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, event):
+        self.published.append((channel, event))
+
+    def subscribe(self, channel):
+        return Subscription(self, channel)
+
+    def unsubscribe(self, subscription):
+        pass
+
+
+class PublishOnlyBroker(Broker):
+    """Forgets subscribe/unsubscribe: can't be instantiated."""
+    def publish(self, channel, event):
+        pass
+
+
+class ChatTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.alice = User(username='alice', email='alice@example.com', pw_hash='dummyhash')
+        self.bob   = User(username='bob',   email='bob@example.com',   pw_hash='dummyhash')
+        self.carol = User(username='carol', email='carol@example.com', pw_hash='dummyhash')
+        db.session.add_all([self.alice, self.bob, self.carol])
+        db.session.commit()
+
+        self.ab = Conversation(user1_id=self.alice.id, user2_id=self.bob.id)
+        self.cb = Conversation(user1_id=self.bob.id, user2_id=self.carol.id)
+        db.session.add_all([self.ab, self.cb])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def send(self, convo, sender, recipient, text='hi'):
+        msg = Message(conversation_id=convo.id, sender_id=sender.id,
+                      recipient_id=recipient.id, text=text)
+        db.session.add(msg)
+        db.session.commit()
+        return msg
+
+    def unread(self, user):
+        db.session.refresh(user)
+        return user.unread_conversations
+
+    def test_counter_counts_conversations_not_messages(self):
+        self.send(self.ab, self.alice, self.bob)
+        self.send(self.ab, self.alice, self.bob)
+        self.assertEqual(self.unread(self.bob), 1)
+        self.send(self.cb, self.carol, self.bob)
+        self.assertEqual(self.unread(self.bob), 2)
+        self.assertEqual(self.unread(self.alice), 0)
+
+    def test_mark_read_decrements_once(self):
+        self.send(self.ab, self.alice, self.bob)
+        self.send(self.cb, self.carol, self.bob)
+        chat.mark_conversation_read(self.ab, self.bob)
+        db.session.commit()
+        self.assertEqual(self.unread(self.bob), 1)
+        # opening it again changes nothing
+        chat.mark_conversation_read(self.ab, self.bob)
+        db.session.commit()
+        self.assertEqual(self.unread(self.bob), 1)
+
+    def test_partial_read_keeps_conversation_unread(self):
+        first = self.send(self.ab, self.alice, self.bob, 'one')
+        self.send(self.ab, self.alice, self.bob, 'two')
+        self.assertTrue(chat.mark_conversation_read(self.ab, self.bob, up_to_id=first.id))
+        db.session.commit()
+        self.assertEqual(self.ab.last_read_id(self.bob.id), first.id)
+        self.assertEqual(self.unread(self.bob), 1)
+        items, _ = chat.inbox(self.bob.id)
+        self.assertEqual(items[0]['unread'], 1)
+
+        self.assertTrue(chat.mark_conversation_read(self.ab, self.bob))
+        db.session.commit()
+        self.assertEqual(self.unread(self.bob), 0)
+        # watermarks never move backwards
+        self.assertFalse(chat.mark_conversation_read(self.ab, self.bob, up_to_id=first.id))
+
+    def test_mark_read_is_one_row_write(self):
+        for i in range(5):
+            self.send(self.ab, self.alice, self.bob, f'm{i}')
+        writes = []
+
+        def before(conn, cursor, statement, params, context, executemany):
+            if statement.lstrip().upper().startswith('UPDATE'):
+                writes.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before)
+        try:
+            chat.mark_conversation_read(self.ab, self.bob)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before)
+        self.assertFalse(any('UPDATE message' in w for w in writes))
+        self.assertEqual(sum('UPDATE conversation' in w for w in writes), 1)
+
+    def test_recount_repairs_drift(self):
+        self.send(self.ab, self.alice, self.bob)
+        self.bob.unread_conversations = 7
+        db.session.commit()
+        chat.recount_unread()
+        self.assertEqual(self.unread(self.bob), 1)
+
+    def test_inbox_orders_by_recency_with_preview(self):
+        self.send(self.ab, self.alice, self.bob, 'first')
+        self.send(self.cb, self.carol, self.bob, 'from carol')
+        self.send(self.ab, self.alice, self.bob, 'latest from alice')
+
+        items, has_next = chat.inbox(self.bob.id)
+        self.assertFalse(has_next)
+        self.assertEqual([i['id'] for i in items], [self.ab.id, self.cb.id])
+        self.assertEqual(items[0]['partner'].id, self.alice.id)
+        self.assertEqual(items[0]['unread'], 2)
+        self.assertEqual(items[0]['snippet'], 'latest from alice')
+        self.assertEqual(items[1]['partner'].id, self.carol.id)
+
+        # alice only sees her own conversation, with nothing unread
+        items, _ = chat.inbox(self.alice.id)
+        self.assertEqual([(i['id'], i['unread']) for i in items], [(self.ab.id, 0)])
+
+    def test_inbox_paging_and_empty_conversations(self):
+        self.send(self.cb, self.carol, self.bob)
+        items, has_next = chat.inbox(self.bob.id, page=1, per_page=1)
+        self.assertEqual([i['id'] for i in items], [self.cb.id])
+        self.assertTrue(has_next)
+        items, has_next = chat.inbox(self.bob.id, page=2, per_page=1)
+        self.assertEqual([i['id'] for i in items], [self.ab.id])
+        self.assertIsNone(items[0]['last_message_at'])
+        self.assertFalse(has_next)
+
+    def test_inbox_route_clamps_page(self):
+        self.send(self.cb, self.carol, self.bob)
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.bob.id)
+        data = client.get('/api/inbox?page=-3&per_page=1').get_json()
+        self.assertEqual([c['id'] for c in data['conversations']], [self.cb.id])
+        self.assertEqual(data['next_page'], 2)
+
+    def test_api_share_lands_in_a_conversation(self):
+        log = PodcastLog(user_id=self.carol.id, duration=60)
+        db.session.add(log)
+        db.session.commit()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.carol.id)
+
+        resp = client.post('/api/send_podcast', json={'log_id': log.id, 'to_user_id': self.alice.id})
+        self.assertTrue(resp.get_json()['success'])
+        msg = Message.query.filter_by(podcast_log_id=log.id).one()
+        self.assertEqual({msg.conversation.user1_id, msg.conversation.user2_id},
+                         {self.alice.id, self.carol.id})
+        self.assertEqual(self.unread(self.alice), 1)
+
+        chat.mark_conversation_read(msg.conversation, self.alice)
+        db.session.commit()
+        self.assertEqual(self.unread(self.alice), 0)
+
+    def test_chat_list_clamps_page(self):
+        for i in range(21):
+            other = User(username=f'u{i}', email=f'u{i}@example.com', pw_hash='dummyhash')
+            db.session.add(other)
+            db.session.flush()
+            convo = Conversation(user1_id=self.bob.id, user2_id=other.id)
+            db.session.add(convo)
+            db.session.flush()
+            self.send(convo, other, self.bob)
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.bob.id)
+        html = client.get('/chats?page=0').get_data(as_text=True)
+        self.assertNotIn('Newer', html)
+        self.assertIn('/chats?page=2', html)
+
+    def test_chat_view_marks_rendered_message_ids(self):
+        sent = [self.send(self.ab, self.alice, self.bob, f'm{i}') for i in range(2)]
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.bob.id)
+        html = client.get(f'/chats/{self.ab.id}').get_data(as_text=True)
+        # the page seeds its de-duplication and after_id catch-up from these
+        for msg in sent:
+            self.assertIn(f'data-id="{msg.id}"', html)
+
+    def test_message_window_pages_backwards(self):
+        sent = [self.send(self.ab, self.alice, self.bob, f'm{i}') for i in range(7)]
+
+        latest, has_more = chat.message_window(self.ab.id, limit=3)
+        self.assertEqual([m.text for m in latest], ['m4', 'm5', 'm6'])
+        self.assertTrue(has_more)
+
+        older, has_more = chat.message_window(self.ab.id, before_id=latest[0].id, limit=3)
+        self.assertEqual([m.text for m in older], ['m1', 'm2', 'm3'])
+        self.assertTrue(has_more)
+
+        oldest, has_more = chat.message_window(self.ab.id, before_id=older[0].id, limit=3)
+        self.assertEqual([m.text for m in oldest], ['m0'])
+        self.assertFalse(has_more)
+
+        newer, has_more = chat.message_window(self.ab.id, after_id=sent[4].id, limit=3)
+        self.assertEqual([m.text for m in newer], ['m5', 'm6'])
+        self.assertFalse(has_more)
+
+    def test_message_window_ignores_other_conversations(self):
+        self.send(self.ab, self.alice, self.bob, 'ours')
+        other = self.send(self.cb, self.carol, self.bob, 'theirs')
+        window, _ = chat.message_window(self.ab.id)
+        self.assertEqual([m.text for m in window], ['ours'])
+        # an anchor from another conversation matches nothing
+        window, _ = chat.message_window(self.ab.id, before_id=other.id)
+        self.assertEqual(window, [])
+
+    def test_in_process_broker_fans_out(self):
+        broker = InProcessBroker()
+        a = broker.subscribe('conversation:1')
+        b = broker.subscribe('conversation:1')
+        other = broker.subscribe('conversation:2')
+        broker.publish('conversation:1', {'type': 'read'})
+        self.assertEqual(a.get(timeout=0), {'type': 'read'})
+        self.assertEqual(b.get(timeout=0), {'type': 'read'})
+        self.assertIsNone(other.get(timeout=0))
+
+        a.close()
+        broker.publish('conversation:1', {'type': 'read', 'n': 2})
+        self.assertIsNone(a.get(timeout=0))
+        self.assertEqual(b.get(timeout=0)['n'], 2)
+
+    def test_pluggable_broker_receives_messages(self):
+        self.app.config['CHAT_BROKER'] = 'tests.test_chat.RecordingBroker'
+        chat_broker.init_app(self.app)
+        msg = self.send(self.ab, self.alice, self.bob, 'live')
+        with self.app.test_request_context():
+            chat.publish_message(msg)
+        (channel, event), = self.app.extensions['chat_broker'].published
+        self.assertEqual(channel, chat.channel_for(self.ab.id))
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['message']['text'], 'live')
+
+    def test_incomplete_broker_fails_at_startup(self):
+        self.app.config['CHAT_BROKER'] = 'tests.test_chat.PublishOnlyBroker'
+        with self.assertRaises(TypeError):
+            chat_broker.init_app(self.app)
+
+    def test_event_stream_format(self):
+        broker = InProcessBroker()
+        sub = broker.subscribe('conversation:9')
+        stream = chat.event_stream(sub, keepalive=0)
+        self.assertEqual(next(stream), 'retry: 3000\n\n')
+        self.assertEqual(next(stream), ': keep-alive\n\n')
+        broker.publish('conversation:9', {'type': 'read', 'up_to_id': 3})
+        self.assertEqual(next(stream), 'event: read\ndata: {"type": "read", "up_to_id": 3}\n\n')
+        stream.close()
+        self.assertNotIn('conversation:9', broker._channels)
+
+
+if __name__ == '__main__':
+    unittest.main()
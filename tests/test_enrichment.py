@@ -0,0 +1,197 @@
+# tests/test_enrichment.py
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from app import create_app, db
+from app.models import User, Podcast, PodcastLog
+from app.spotify import SpotifyTokenManager, SpotifyClient
+from app.enrichment import (Enricher, get_enricher, get_or_create_placeholder, refresh_catalog,
+                            Checkpoint, CatalogRefreshError)
+from tests.test_spotify import StandInSpotify
+
+
+def show_reply(delay=0.0):
+    def reply(params):
+        time.sleep(delay)
+        return 200, {}, {'id': 'abc', 'name': 'Real Name', 'publisher': 'Pub',
+                         'description': 'About', 'images': [{'url': 'http://img/abc.png'}]}
+    return reply
+
+
+class EnrichmentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.app = create_app()
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+                               TESTING=True, WTF_CSRF_ENABLED=False)
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.app.extensions['spotify'] = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='listener', email='listener@example.com', pw_hash='dummyhash')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        get_enricher().drain(timeout=5)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.spotify.close()
+
+    def show_calls(self):
+        return sum(1 for p, _, _ in self.spotify.seen if p == '/v1/shows/abc')
+
+    def test_log_podcast_returns_before_spotify(self):
+        self.spotify.script['/v1/shows/abc'] = show_reply(delay=0.3)
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+
+        resp = client.post('/log_podcast', json={
+            'podcast_id': 'abc', 'podcast_name': 'Typed Name', 'episode': 'Ep 1',
+            'episode_id': 'e1', 'platform': 'Spotify', 'duration': 30,
+            'genre': 'Comedy', 'rating': 4,
+        })
+        self.assertTrue(resp.get_json()['success'])
+
+        podcast = Podcast.query.filter_by(spotify_id='abc').one()
+        self.assertEqual((podcast.name, podcast.genre), ('Typed Name', 'Comedy'))
+        self.assertIsNone(podcast.enriched_at)
+        self.assertEqual(PodcastLog.query.one().podcast_id, podcast.id)
+
+        get_enricher().drain(timeout=5)
+        db.session.expire_all()
+        podcast = Podcast.query.filter_by(spotify_id='abc').one()
+        self.assertEqual((podcast.name, podcast.publisher, podcast.image_url),
+                         ('Real Name', 'Pub', 'http://img/abc.png'))
+        self.assertEqual(podcast.genre, 'Comedy')
+        self.assertIsNotNone(podcast.enriched_at)
+
+    def test_in_flight_requests_are_deduplicated(self):
+        self.spotify.script['/v1/shows/abc'] = show_reply(delay=0.2)
+        get_or_create_placeholder('abc')
+        db.session.commit()
+
+        enricher = get_enricher()
+        futures = {enricher.submit('abc') for _ in range(5)}
+        self.assertEqual(len(futures), 1)
+        enricher.drain(timeout=5)
+        self.assertEqual(self.show_calls(), 1)
+
+        # already enriched: nothing more to fetch
+        enricher.submit('abc').result(timeout=5)
+        self.assertEqual(self.show_calls(), 1)
+
+    def test_job_finishing_before_submit_returns(self):
+        class Inline:
+            def submit(self, fn, *args):
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+
+        enricher = Enricher(self.app, workers=1)
+        enricher._pool = Inline()      # the job is done before add_done_callback
+        result = []
+        worker = threading.Thread(target=lambda: result.append(enricher.submit('abc')), daemon=True)
+        worker.start()
+        worker.join(timeout=5)
+        self.assertFalse(worker.is_alive(), 'submit deadlocked')
+        self.assertFalse(result[0].result())
+        self.assertEqual(enricher._pending, {})
+
+    def test_placeholder_is_reused(self):
+        first, created = get_or_create_placeholder('abc', name='A')
+        db.session.commit()
+        again, created_again = get_or_create_placeholder('abc', name='B', genre='News')
+        self.assertEqual((created, created_again), (True, False))
+        self.assertEqual(first.id, again.id)
+        self.assertEqual((again.name, again.genre), ('A', 'News'))
+
+    def test_failed_fetch_leaves_placeholder(self):
+        self.spotify.script['/v1/shows/abc'] = [(404, {}, {'error': 'not found'})]
+        get_or_create_placeholder('abc')
+        db.session.commit()
+        self.assertFalse(get_enricher().submit('abc').result(timeout=5))
+        db.session.expire_all()
+        self.assertIsNone(Podcast.query.filter_by(spotify_id='abc').one().enriched_at)
+
+
+class CatalogRefreshTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.spotify.script['/v1/shows'] = self.several_shows
+        self.broken = set()
+        self.tmp = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', TESTING=True)
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.client = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1', sleep=lambda s: None)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add_all(Podcast(name=f'Old {i}', spotify_id=f'show{i:03}', publisher='Old Pub')
+                           for i in range(120))
+        db.session.add(Podcast(name='No Spotify id'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.spotify.close()
+        shutil.rmtree(self.tmp)
+
+    def several_shows(self, params):
+        ids = params['ids'].split(',')
+        if self.broken & set(ids):
+            return 400, {}, {'error': 'bad id'}
+        shows = [None if sid == 'show007' else
+                 {'id': sid, 'name': f'New {sid}', 'publisher': 'Old Pub',
+                  'images': [{'url': f'http://img/{sid}'}]}
+                 for sid in ids]
+        return 200, {}, {'shows': shows}
+
+    def requests_made(self):
+        return [p for p, _, _ in self.spotify.seen if p == '/v1/shows']
+
+    def test_refresh_in_chunks_of_fifty(self):
+        stats = refresh_catalog(self.client, workers=2)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual((stats['shows'], stats['updated'], stats['missing']), (120, 119, 1))
+        self.assertGreater(stats['shows_per_second'], 0)
+
+        db.session.expire_all()
+        podcast = Podcast.query.filter_by(spotify_id='show042').one()
+        self.assertEqual((podcast.name, podcast.image_url), ('New show042', 'http://img/show042'))
+        self.assertIsNotNone(podcast.enriched_at)
+        self.assertEqual(Podcast.query.filter_by(spotify_id='show007').one().name, 'Old 7')
+
+        # nothing changed since: nothing written
+        self.assertEqual(refresh_catalog(self.client)['updated'], 0)
+
+    def test_resumes_from_checkpoint(self):
+        checkpoint = Checkpoint(os.path.join(self.tmp, 'refresh.json'))
+        self.broken = {'show060'}
+        with self.assertRaises(CatalogRefreshError):
+            refresh_catalog(self.client, workers=1, checkpoint=checkpoint)
+        first_chunk_end = Podcast.query.filter_by(spotify_id='show049').one().id
+        self.assertEqual(checkpoint.load(), first_chunk_end)
+
+        self.broken = set()
+        before = len(self.requests_made())
+        stats = refresh_catalog(self.client, workers=1, checkpoint=checkpoint)
+        self.assertEqual(stats['resumed_from'], first_chunk_end)
+        self.assertEqual((stats['shows'], len(self.requests_made()) - before), (70, 2))
+        self.assertFalse(os.path.exists(checkpoint.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
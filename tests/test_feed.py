@@ -0,0 +1,128 @@
+# tests/test_feed.py
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Podcast, PodcastLog, Like, Comment
+from app.feed import hydrate_posts, keyset_page, encode_cursor, decode_cursor
+from datetime import datetime
+
+
+class FeedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.request_context = self.app.test_request_context()
+        self.request_context.push()
+        db.create_all()
+
+        self.user1 = User(username='poster', email='poster@example.com', pw_hash='dummyhash')
+        self.user2 = User(username='viewer', email='viewer@example.com', pw_hash='dummyhash',
+                          display_name='Viewer')
+        self.podcast = Podcast(name='Feed Podcast', spotify_id='feed123', genre='Tech')
+        db.session.add_all([self.user1, self.user2, self.podcast])
+        db.session.commit()
+
+        self.logs = []
+        for i in range(5):
+            log = PodcastLog(user_id=self.user1.id, podcast_id=self.podcast.id,
+                             ep_name=f'Ep {i}', duration=600, shared=True)
+            db.session.add(log)
+            self.logs.append(log)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.request_context.pop()
+        self.app_context.pop()
+
+    def count_queries(self, fn):
+        statements = []
+
+        def before(conn, cursor, statement, params, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before)
+        try:
+            result = fn()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before)
+        return result, len(statements)
+
+    def test_hydrate_shape_and_counts(self):
+        db.session.add_all([
+            Like(user_id=self.user2.id, post_id=self.logs[0].id),
+            Like(user_id=self.user1.id, post_id=self.logs[0].id),
+            Comment(user_id=self.user2.id, post_id=self.logs[0].id, text='Nice'),
+        ])
+        db.session.commit()
+        for log in self.logs:
+            db.session.refresh(log)
+
+        posts = hydrate_posts(self.logs, self.user2.id)
+        first = posts[0]
+        self.assertEqual(first['likes'], 2)
+        self.assertTrue(first['liked'])
+        self.assertEqual(first['comments'], [{'commenter': 'Viewer', 'text': 'Nice'}])
+        self.assertEqual(first['podcast_name'], 'Feed Podcast')
+        self.assertEqual(first['genre'], 'Tech')
+        self.assertEqual(first['poster_username'], 'poster')
+        self.assertEqual(posts[1]['likes'], 0)
+        self.assertFalse(posts[1]['liked'])
+
+    def test_query_count_is_fixed(self):
+        db.session.expunge_all()
+        logs = PodcastLog.query.all()
+        _, small = self.count_queries(lambda: hydrate_posts(logs[:1], self.user2.id))
+        db.session.expunge_all()
+        logs = PodcastLog.query.all()
+        _, large = self.count_queries(lambda: hydrate_posts(logs, self.user2.id))
+        self.assertEqual(small, large)
+
+    def test_empty_page(self):
+        self.assertEqual(hydrate_posts([], self.user2.id), [])
+
+    def test_keyset_walks_every_post_once(self):
+        # identical timestamps must still be ordered by id
+        same = datetime(2025, 5, 1, 12, 0, 0)
+        for log in self.logs:
+            log.listened_at = same
+        db.session.commit()
+
+        feed = PodcastLog.query.filter_by(shared=True)
+        seen, cursor = [], None
+        while True:
+            items, cursor = keyset_page(feed, cursor, per_page=2)
+            seen.extend(log.id for log in items)
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted((log.id for log in self.logs), reverse=True))
+
+    def test_keyset_never_counts(self):
+        feed = PodcastLog.query.filter_by(shared=True)
+        statements = []
+
+        def before(conn, cursor, statement, params, context, executemany):
+            statements.append(statement.lower())
+
+        event.listen(db.engine, 'before_cursor_execute', before)
+        try:
+            keyset_page(feed, None, per_page=2)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('count(', statements[0])
+
+    def test_cursor_roundtrip_and_invalid(self):
+        log = self.logs[0]
+        self.assertEqual(decode_cursor(encode_cursor(log.listened_at, log.id)), (log.listened_at, log.id))
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        with self.assertRaises(ValueError):
+            keyset_page(PodcastLog.query, 'not-a-cursor')
+
+
+if __name__ == '__main__':
+    unittest.main()
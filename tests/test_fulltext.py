@@ -0,0 +1,92 @@
+# tests/test_fulltext.py
+import unittest
+from unittest import mock
+from app import create_app, db, fulltext
+from app.models import User, Podcast, PodcastLog
+
+
+class FullTextTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', TESTING=True)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='listener', email='listener@example.com', pw_hash='dummyhash')
+        self.other = User(username='other', email='other@example.com', pw_hash='dummyhash')
+        self.crime = Podcast(name='Crime Junkie', publisher='audiochuck',
+                             description='A weekly true crime show')
+        self.serial = Podcast(name='Serial', publisher='Serial Productions',
+                              description='Investigative journalism, one story per season')
+        self.history = Podcast(name='Hardcore History', publisher='Dan Carlin',
+                               description='Serialised deep dives into the past')
+        db.session.add_all([self.user, self.other, self.crime, self.serial, self.history])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def names(self, q, **kw):
+        return [p.name for p in fulltext.search_podcasts(q, **kw)]
+
+    def test_prefix_matching_ranks_name_hits_first(self):
+        self.assertEqual(self.names('seri'), ['Serial', 'Hardcore History'])
+        self.assertEqual(self.names('true crim'), ['Crime Junkie'])
+        self.assertEqual(self.names('seri', columns=['name']), ['Serial'])
+        self.assertEqual(self.names('!!'), [])
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        self.serial.name = 'S-Town'
+        db.session.commit()
+        self.assertEqual(self.names('serial', columns=['name']), [])
+        self.assertEqual(self.names('town'), ['S-Town'])
+
+        # bulk UPDATEs that skip the ORM go through the triggers too
+        db.session.bulk_update_mappings(Podcast, [{'id': self.crime.id, 'name': 'Morbid'}])
+        db.session.commit()
+        db.session.expire_all()
+        self.assertEqual(self.names('junkie'), [])
+        self.assertEqual(self.names('morbid'), ['Morbid'])
+
+        db.session.delete(self.history)
+        db.session.commit()
+        self.assertEqual(self.names('hardcore'), [])
+
+    def test_log_search_is_per_user(self):
+        db.session.add_all([
+            PodcastLog(user_id=self.user.id, podcast_id=self.serial.id, ep_name='The Alibi',
+                       review='Gripping interview with Adnan'),
+            PodcastLog(user_id=self.user.id, podcast_id=self.crime.id, ep_name='Murdered: Adnan?',
+                       review='Meh'),
+            PodcastLog(user_id=self.other.id, podcast_id=self.serial.id, ep_name='Adnan Syed'),
+        ])
+        db.session.commit()
+        logs = fulltext.search_logs('adnan', user_id=self.user.id)
+        # a hit in the episode name beats one in the review
+        self.assertEqual([log.ep_name for log in logs], ['Murdered: Adnan?', 'The Alibi'])
+        self.assertEqual(len(fulltext.search_logs('adnan')), 3)
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+        found = client.get('/api/search/logs?q=gripp').get_json()
+        self.assertEqual([(r['podcast'], r['episode']) for r in found], [('Serial', 'The Alibi')])
+
+    def test_rebuild_restores_lost_index(self):
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP TABLE podcast_fts')
+        self.assertTrue(fulltext.rebuild())
+        self.assertEqual(self.names('junk'), ['Crime Junkie'])
+
+    def test_like_fallback_on_other_engines(self):
+        with mock.patch.object(fulltext, 'enabled', return_value=False):
+            self.assertEqual(self.names('seri'), ['Serial', 'Hardcore History'])
+            self.assertEqual(self.names('crime weekly'), ['Crime Junkie'])
+            self.assertFalse(fulltext.rebuild())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -269,6 +269,28 @@ class ModelTestCase(unittest.TestCase):
         self.assertIn(self.user2, added)
         self.assertIn(self.user1, added_me)
 
+    def test_like_and_comment_counters(self):
+        like = Like(user_id=self.user2.id, post_id=self.log.id)
+        comment = Comment(user_id=self.user2.id, post_id=self.log.id, text='Counted')
+        db.session.add_all([like, comment])
+        db.session.commit()
+        db.session.refresh(self.log)
+        self.assertEqual(self.log.like_count, 1)
+        self.assertEqual(self.log.comment_count, 1)
+
+        db.session.delete(like)
+        db.session.commit()
+        db.session.refresh(self.log)
+        self.assertEqual(self.log.like_count, 0)
+        self.assertEqual(self.log.comment_count, 1)
+
+    def test_counter_rolls_back_with_like(self):
+        db.session.add(Like(user_id=self.user2.id, post_id=self.log.id))
+        db.session.flush()
+        db.session.rollback()
+        db.session.refresh(self.log)
+        self.assertEqual(self.log.like_count, 0)
+
     def test_duplicate_spotify_id(self):
         podcast1 = Podcast(name='Podcast1', spotify_id='dup123')
         podcast2 = Podcast(name='Podcast2', spotify_id='dup123')
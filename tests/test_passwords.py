@@ -0,0 +1,107 @@
+# tests/test_passwords.py
+import threading
+import time
+import unittest
+from app import create_app, db
+from app.models import User
+from app.passwords import PasswordHasher, HasherBusy, hash_cost, get_hasher
+
+
+class PasswordHasherTestCase(unittest.TestCase):
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(rounds=4, workers=1)
+        pw_hash = hasher.hash('s3cret!')
+        self.assertEqual(hash_cost(pw_hash), 4)
+        self.assertTrue(hasher.verify(pw_hash, 's3cret!'))
+        self.assertFalse(hasher.verify(pw_hash, 'wrong'))
+        self.assertFalse(hasher.needs_rehash(pw_hash))
+        self.assertTrue(PasswordHasher(rounds=5, workers=0).needs_rehash(pw_hash))
+
+    def test_unusable_and_placeholder_hashes_never_match(self):
+        hasher = PasswordHasher(rounds=4, workers=0)
+        for pw_hash in ('!', 'dummyhash', '', None):
+            self.assertFalse(hasher.verify(pw_hash, 'anything'))
+            self.assertFalse(hasher.needs_rehash(pw_hash))
+
+    def test_full_queue_sheds_load(self):
+        hasher = PasswordHasher(rounds=4, workers=1, max_queue=1)
+        release = threading.Event()
+        blockers = [threading.Thread(target=hasher._run, args=(release.wait,)) for _ in range(2)]
+        for t in blockers:
+            t.start()
+        try:
+            while hasher._slots._value:      # both slots taken: one running, one queued
+                time.sleep(0.001)
+            with self.assertRaises(HasherBusy):
+                hasher.hash('s3cret!')
+            self.assertEqual(hasher.stats()['shed'], 1)
+        finally:
+            release.set()
+            for t in blockers:
+                t.join()
+        self.assertTrue(hasher.verify(hasher.hash('s3cret!'), 's3cret!'))
+
+
+class LoginRehashTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+                               TESTING=True, WTF_CSRF_ENABLED=False)
+        self.app.extensions['password_hasher'] = PasswordHasher(rounds=4, workers=1, max_queue=0)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(username='listener', email='listener@example.com')
+        self.user.set_password('Passw0rd!')
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self, pw='Passw0rd!'):
+        return self.client.post('/login', data={'email': 'listener@example.com', 'password': pw})
+
+    def test_hash_upgraded_when_cost_changes(self):
+        self.login()
+        self.assertEqual(hash_cost(User.query.one().pw_hash), 4)
+
+        self.app.extensions['password_hasher'] = PasswordHasher(rounds=5, workers=1)
+        self.client.get('/logout')
+        self.login('wrong')
+        db.session.expire_all()
+        self.assertEqual(hash_cost(User.query.one().pw_hash), 4)   # only on success
+        resp = self.login()
+        self.assertEqual(resp.status_code, 302)
+        db.session.expire_all()
+        user = User.query.one()
+        self.assertEqual(hash_cost(user.pw_hash), 5)
+        self.assertTrue(user.check_password('Passw0rd!'))
+
+    def test_busy_hasher_returns_503(self):
+        release = threading.Event()
+        hasher = get_hasher()
+        blocker = threading.Thread(target=hasher._run, args=(release.wait,))
+        blocker.start()
+        try:
+            while hasher._slots._value:
+                time.sleep(0.001)
+            resp = self.login()
+            self.assertEqual(resp.status_code, 503)
+            self.assertEqual(resp.headers['Retry-After'], '2')
+        finally:
+            release.set()
+            blocker.join()
+
+    def test_google_accounts_have_no_password(self):
+        user = User(username='g', email='g@example.com', auth_provider='google')
+        user.set_unusable_password()
+        self.assertFalse(user.check_password('!'))
+        self.assertFalse(user.password_needs_rehash)
+
+
+if __name__ == '__main__':
+    unittest.main()
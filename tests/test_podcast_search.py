@@ -0,0 +1,125 @@
+# tests/test_podcast_search.py
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import User, Podcast
+from app.spotify import SpotifyTokenManager, SpotifyClient
+from app.podcast_search import get_search, local_podcasts
+from app.typeahead import get_cache
+from tests.test_spotify import StandInSpotify
+
+
+def spotify_results(*shows):
+    items = [{'id': sid, 'name': name, 'publisher': 'Spotify Pub', 'images': []}
+             for sid, name in shows]
+    return [(200, {}, {'shows': {'items': items}})]
+
+
+class PodcastSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.app = create_app()
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', TESTING=True)
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.app.extensions['spotify'] = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1',
+                                                       sleep=lambda s: None)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='listener', email='listener@example.com', pw_hash='dummyhash')
+        db.session.add(self.user)
+        enriched = datetime(2025, 1, 1)
+        db.session.add_all([
+            Podcast(name='Serial', spotify_id='serial', publisher='TAL', predicted_popularity=0.2,
+                    enriched_at=enriched),
+            Podcast(name='Serial Killers', spotify_id='killers', predicted_popularity=0.9,
+                    enriched_at=enriched),
+            Podcast(name='The Serial Hour', spotify_id='hour', predicted_popularity=1.0,
+                    enriched_at=enriched),
+            Podcast(name='Serial Offline', spotify_id=None),
+            # logged against but never confirmed by Spotify
+            Podcast(name='Serial Typo', spotify_id='typo', predicted_popularity=1.0),
+        ])
+        db.session.commit()
+
+        self.search = get_search()
+        self.search.min_local = 3
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.spotify.close()
+
+    def searches(self):
+        return [p for p, _, _ in self.spotify.seen if p == '/v1/search']
+
+    def test_local_matches_rank_prefix_then_popularity(self):
+        self.assertEqual([p['id'] for p in local_podcasts('  SERIAL ')],
+                         ['killers', 'serial', 'hour'])
+        self.assertEqual(local_podcasts('serial', limit=1)[0],
+                         {'id': 'killers', 'name': 'Serial Killers', 'publisher': None, 'image': None})
+
+    def test_enough_local_hits_never_reach_spotify(self):
+        results, partial = self.search.search('serial')
+        self.assertEqual(len(results), 3)
+        self.assertFalse(partial)
+        self.assertEqual(self.searches(), [])
+        self.assertEqual(self.search.stats()['local_only'], 1)
+
+    def test_spotify_tops_up_and_is_deduped(self):
+        self.spotify.script['/v1/search'] = spotify_results(('killers', 'Serial Killers'),
+                                                            ('new', 'Serial Thriller'))
+        results, partial = self.search.search('serial k')
+        self.assertFalse(partial)
+        self.assertEqual([r['id'] for r in results], ['killers', 'new'])
+        self.assertEqual(len(self.searches()), 1)
+
+    def test_slow_spotify_returns_local_hits_now(self):
+        self.search.wait = 0.05
+        self.spotify.script['/v1/search'] = [('hang', {}, 0.3)] + spotify_results(('new', 'Serial K'))
+        results, partial = self.search.search('serial k')
+        self.assertEqual(([r['id'] for r in results], partial), (['killers'], True))
+        self.assertEqual(self.search.stats()['late'], 1)
+
+    def test_route(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+        resp = client.get('/search_podcasts?q=serial')
+        self.assertEqual(resp.headers['X-Search-Partial'], 'false')
+        self.assertEqual(len(resp.get_json()), 3)
+        self.assertEqual(client.get('/search_podcasts?q=').get_json(), [])
+
+
+    def test_route_reuses_complete_shorter_queries(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+        self.assertEqual(len(client.get('/search_podcasts?q=ser').get_json()), 3)
+        self.assertEqual(len(client.get('/search_podcasts?q=seri').get_json()), 3)
+        self.assertEqual(self.search.stats()['local_only'], 1)      # 'seri' never searched
+
+        # too few left to skip Spotify: searched for real
+        self.spotify.script['/v1/search'] = spotify_results(('new', 'Serial Killers Club'))
+        resp = client.get('/search_podcasts?q=serial k')
+        self.assertEqual([r['id'] for r in resp.get_json()], ['killers', 'new'])
+        self.assertEqual(len(self.searches()), 1)
+        self.assertEqual(get_cache().stats()['podcasts:10'],
+                         {'exact': 0, 'prefix': 1, 'miss': 2, 'hit_rate': 0.333})
+
+    def test_route_does_not_cache_partial_results(self):
+        self.search.wait = 0.05
+        self.spotify.script['/v1/search'] = [('hang', {}, 0.3)] * 2
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+        for _ in range(2):
+            resp = client.get('/search_podcasts?q=serial k')
+            self.assertEqual(resp.headers['X-Search-Partial'], 'true')
+        self.assertEqual(self.search.stats()['late'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
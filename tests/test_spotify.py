@@ -0,0 +1,497 @@
+# tests/test_spotify.py
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from app import create_app, spotify
+from app.cache import SqliteCacheStore
+from app.spotify import (SpotifyTokenManager, FileTokenStore, SpotifyAuthError,
+                         SpotifyClient, SpotifyError, SpotifyUnavailable, CircuitBreaker,
+                         EpisodeCatalog, ShowEpisodes)
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.content = b'{}'
+
+    def json(self):
+        return self.payload
+
+
+class FakeAccounts:
+    """Stands in for accounts.spotify.com: counts token requests."""
+
+    def __init__(self, expires_in=3600, delay=0):
+        self.calls = 0
+        self.expires_in = expires_in
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def post(self, url, data=None, auth=None, timeout=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        return FakeResponse({'access_token': f'token-{n}', 'expires_in': self.expires_in})
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TokenManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'token.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_token_is_reused_until_shortly_before_expiry(self):
+        accounts, clock = FakeAccounts(expires_in=3600), Clock()
+        tokens = SpotifyTokenManager('id', 'secret', margin=60, http=accounts, clock=clock)
+        self.assertEqual(tokens.get_token(), 'token-1')
+        clock.now += 3500
+        self.assertEqual(tokens.get_token(), 'token-1')
+        clock.now += 50                     # inside the 60s safety margin
+        self.assertEqual(tokens.get_token(), 'token-2')
+        self.assertEqual(accounts.calls, 2)
+
+    def test_concurrent_requests_refresh_once(self):
+        accounts = FakeAccounts(delay=0.05)
+        tokens = SpotifyTokenManager('id', 'secret', http=accounts)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(tokens.get_token()))
+                   for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(accounts.calls, 1)
+        self.assertEqual(set(results), {'token-1'})
+
+    def test_processes_share_the_stored_token(self):
+        accounts, clock = FakeAccounts(), Clock()
+        first = SpotifyTokenManager('id', 'secret', FileTokenStore(self.path), http=accounts, clock=clock)
+        second = SpotifyTokenManager('id', 'secret', FileTokenStore(self.path), http=accounts, clock=clock)
+        self.assertEqual(first.get_token(), 'token-1')
+        self.assertEqual(second.get_token(), 'token-1')
+        self.assertEqual(accounts.calls, 1)
+
+        clock.now += 3600
+        self.assertEqual(second.get_token(), 'token-2')
+        self.assertEqual(first.get_token(), 'token-2')
+        self.assertEqual(accounts.calls, 2)
+
+    def test_failed_refresh_raises_and_is_not_cached(self):
+        class Refusing:
+            def post(self, *args, **kwargs):
+                return FakeResponse({'error': 'invalid_client',
+                                     'error_description': 'Invalid client'}, 400)
+
+        tokens = SpotifyTokenManager('id', 'wrong', FileTokenStore(self.path), http=Refusing())
+        with self.assertRaises(SpotifyAuthError):
+            tokens.get_token()
+        self.assertIsNone(FileTokenStore(self.path).load())
+
+
+class StandInSpotify:
+    """
+    A local HTTP server playing Spotify: /api/token hands out tokens and
+    every other path replays the scripted (status, headers, body) replies
+    queued for it, then answers 200 {}.  A callable script gets the query
+    parameters and builds the reply itself.
+    """
+
+    def __init__(self):
+        self.script = {}
+        self.seen = []
+        self.tokens_issued = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, headers=None):
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stand_in.tokens_issued += 1
+                self.reply(200, {'access_token': f'token-{stand_in.tokens_issued}',
+                                 'expires_in': 3600})
+
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                stand_in.seen.append((path, self.headers.get('Authorization'),
+                                      self.client_address[1]))
+                queued = stand_in.script.get(path)
+                if callable(queued):
+                    status, headers, body = queued(dict(parse_qsl(query)))
+                else:
+                    status, headers, body = queued.pop(0) if queued else (200, {}, {})
+                if status == 'hang':
+                    time.sleep(body)
+                    status, headers, body = 200, {}, {}
+                self.reply(status, body, headers)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SpotifyClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.sleeps = []
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.client = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1',
+                                    timeout=(1, 0.5), sleep=self.sleeps.append)
+
+    def tearDown(self):
+        self.client.session.close()
+        self.spotify.close()
+
+    def test_keep_alive_connection_is_reused(self):
+        self.spotify.script['/v1/shows/a'] = [(200, {}, {'id': 'a'})]
+        self.assertEqual(self.client.get('shows/a'), {'id': 'a'})
+        self.client.get('shows/b')
+        self.client.get('shows/c')
+        ports = {port for _, _, port in self.spotify.seen}
+        self.assertEqual(len(ports), 1)
+        self.assertEqual(self.spotify.seen[0][1], 'Bearer token-1')
+
+    def test_retries_429_honouring_retry_after(self):
+        self.spotify.script['/v1/search'] = [
+            (429, {'Retry-After': '2'}, {}),
+            (503, {}, {}),
+            (200, {}, {'shows': {'items': []}}),
+        ]
+        self.assertEqual(self.client.get('search', params={'q': 'x'}), {'shows': {'items': []}})
+        self.assertGreaterEqual(self.sleeps[0], 2)
+        self.assertLessEqual(self.sleeps[1], self.client.backoff * 2)
+        stats = self.client.metrics.snapshot()
+        self.assertEqual((stats['requests'], stats['attempts'], stats['retries']), (1, 3, 2))
+        self.assertEqual(stats['statuses'], {'200': 1, '429': 1, '503': 1})
+
+    def test_gives_up_after_bounded_retries(self):
+        self.spotify.script['/v1/shows/x'] = [(500, {}, {})] * 10
+        with self.assertRaises(SpotifyError) as ctx:
+            self.client.get('shows/x')
+        self.assertEqual(ctx.exception.status, 500)
+        self.assertEqual(len(self.sleeps), self.client.max_retries)
+        self.assertEqual(self.client.metrics.snapshot()['failures'], 1)
+
+    def test_long_retry_after_fails_fast(self):
+        self.spotify.script['/v1/shows/x'] = [(429, {'Retry-After': '3600'}, {})]
+        with self.assertRaises(SpotifyError):
+            self.client.get('shows/x')
+        self.assertEqual(self.sleeps, [])
+
+    def test_client_errors_are_not_retried(self):
+        self.spotify.script['/v1/shows/missing'] = [(404, {}, {'error': 'not found'})]
+        with self.assertRaises(SpotifyError) as ctx:
+            self.client.get('shows/missing')
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertEqual(self.sleeps, [])
+
+    def test_read_timeout_is_retried(self):
+        self.spotify.script['/v1/shows/slow'] = [('hang', {}, 1.0), (200, {}, {'id': 'slow'})]
+        self.assertEqual(self.client.get('shows/slow'), {'id': 'slow'})
+        self.assertEqual(self.client.metrics.snapshot()['errors'], 1)
+
+    def test_401_refreshes_the_token_once(self):
+        self.spotify.script['/v1/shows/a'] = [(401, {}, {}), (200, {}, {'id': 'a'})]
+        self.assertEqual(self.client.get('shows/a'), {'id': 'a'})
+        self.assertEqual([auth for _, auth, _ in self.spotify.seen],
+                         ['Bearer token-1', 'Bearer token-2'])
+
+    def test_401_is_not_answered_from_the_token_store(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        store = FileTokenStore(os.path.join(tmp, 'token.json'))
+        self.client.tokens = SpotifyTokenManager('id', 'secret', store,
+                                                 token_url=f'{self.spotify.url}/api/token')
+        self.spotify.script['/v1/shows/a'] = [(401, {}, {}), (200, {}, {'id': 'a'})]
+        self.assertEqual(self.client.get('shows/a'), {'id': 'a'})
+        self.assertEqual([auth for _, auth, _ in self.spotify.seen],
+                         ['Bearer token-1', 'Bearer token-2'])
+        self.assertEqual(store.load()[0], 'token-2')
+
+
+class SearchCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.app.extensions['spotify'] = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+        self.spotify.close()
+
+    def searches(self):
+        return [p for p, _, _ in self.spotify.seen if p == '/v1/search']
+
+    def test_normalised_queries_share_one_call(self):
+        show = {'id': 's1', 'name': 'Serial', 'publisher': 'This American Life', 'images': []}
+        self.spotify.script['/v1/search'] = [(200, {}, {'shows': {'items': [show]}})]
+        first, stale = spotify.search_shows('Serial')
+        self.assertFalse(stale)
+        self.assertEqual(first, [{'id': 's1', 'name': 'Serial',
+                                  'publisher': 'This American Life', 'image': None}])
+        self.assertEqual(spotify.search_shows('  serial '), (first, False))
+        self.assertEqual(len(self.searches()), 1)
+
+    def test_concurrent_identical_searches_are_coalesced(self):
+        self.spotify.script['/v1/search'] = [('hang', {}, 0.2)]
+
+        def search():
+            with self.app.app_context():
+                spotify.search_shows('popular show')
+
+        threads = [threading.Thread(target=search) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.searches()), 1)
+        self.assertEqual(spotify.get_search_cache().stats()['loads'], 1)
+
+
+def episode_pages(names):
+    """Script for /shows/<id>/episodes paging through `names` like Spotify does."""
+    def reply(params):
+        offset, limit = int(params.get('offset', 0)), int(params.get('limit', 20))
+        items = [{'id': f'ep{i}', 'name': name}
+                 for i, name in enumerate(names[offset:offset + limit], start=offset)]
+        more = offset + limit < len(names)
+        return 200, {}, {'items': items, 'total': len(names), 'offset': offset,
+                         'next': f'/v1/shows/s/episodes?offset={offset + limit}' if more else None}
+    return reply
+
+
+class EpisodeCatalogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.tmp = tempfile.mkdtemp()
+        self.clock = Clock(1000.0)
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.client = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1')
+        self.names = [f'Episode {n}: Topic {n % 7}' for n in range(120, 0, -1)]
+        self.spotify.script['/v1/shows/s/episodes'] = episode_pages(self.names)
+
+    def tearDown(self):
+        self.client.session.close()
+        self.spotify.close()
+        shutil.rmtree(self.tmp)
+
+    def catalog(self, **kwargs):
+        return EpisodeCatalog(self.client, clock=self.clock, **kwargs)
+
+    def page_calls(self):
+        return sum(1 for p, _, _ in self.spotify.seen if p == '/v1/shows/s/episodes')
+
+    def test_first_page_now_rest_in_background(self):
+        catalog = self.catalog()
+        first = catalog.get('s')
+        self.assertEqual(len(first.episodes), 50)
+        self.assertTrue(catalog.wait('s'))
+
+        full = catalog.get('s')
+        self.assertTrue(full.complete)
+        self.assertEqual([ep['name'] for ep in full.episodes], self.names)
+        self.assertEqual(self.page_calls(), 3)
+
+    def test_failed_background_fetch_backs_off(self):
+        pages = episode_pages(self.names)
+        broken = [True]
+
+        def reply(params):
+            if broken[0] and int(params.get('offset', 0)) > 0:
+                return 404, {}, {'error': 'gone'}
+            return pages(params)
+        self.spotify.script['/v1/shows/s/episodes'] = reply
+        catalog = self.catalog(retry_after=60)
+
+        with self.assertLogs('app.spotify', 'WARNING'):
+            catalog.get('s')
+            self.assertTrue(catalog.wait('s'))
+        calls = self.page_calls()
+        self.assertFalse(catalog.get('s').complete)       # page one, no new fan-out
+        self.assertEqual(self.page_calls(), calls)
+
+        broken[0] = False
+        self.clock.now += 61
+        catalog.get('s')
+        self.assertTrue(catalog.wait('s'))
+        self.assertTrue(catalog.get('s').complete)
+
+    def test_prefix_search(self):
+        show = ShowEpisodes([{'id': '1', 'name': 'The Big One'},
+                             {'id': '2', 'name': 'Bigger Things'},
+                             {'id': '3', 'name': 'Small talk'}], 3, 0, True)
+        self.assertEqual([ep['id'] for ep in show.search('big')], ['1', '2'])
+        self.assertEqual([ep['id'] for ep in show.search('the b')], ['1'])
+        self.assertEqual([ep['id'] for ep in show.search('TALK')], ['3'])
+        self.assertEqual(show.search('bigg', limit=1), [{'id': '2', 'name': 'Bigger Things'}])
+        self.assertEqual(show.search('zzz'), [])
+
+    def test_conditional_refresh(self):
+        catalog = self.catalog(ttl=60)
+        catalog.get('s')
+        catalog.wait('s')
+        calls = self.page_calls()
+
+        catalog.get('s')                       # fresh: served from memory
+        self.assertEqual(self.page_calls(), calls)
+
+        self.clock.now += 61                   # stale but unchanged: one check
+        self.assertTrue(catalog.get('s').complete)
+        self.assertEqual(self.page_calls(), calls + 1)
+
+        self.names.insert(0, 'Episode 121: Brand new')
+        self.clock.now += 61                   # stale and changed: fetched again
+        catalog.get('s')
+        catalog.wait('s')
+        self.assertEqual(catalog.get('s').search('brand'), [{'id': 'ep0', 'name': 'Episode 121: Brand new'}])
+
+    def test_catalog_is_shared_through_the_store(self):
+        store = SqliteCacheStore(os.path.join(self.tmp, 'cache.sqlite'))
+        first = self.catalog(store=store)
+        first.get('s')
+        first.wait('s')
+        calls = self.page_calls()
+
+        second = self.catalog(store=store)
+        self.assertEqual(len(second.get('s').episodes), 120)
+        self.assertEqual(self.page_calls(), calls)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(0.0)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30,
+                                      slow_call=2.0, clock=self.clock)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.on_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(2)
+        self.breaker.before_call()
+        self.breaker.on_success(0.1)            # a success resets the run
+        self.fail(3)
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(SpotifyUnavailable):
+            self.breaker.before_call()
+        self.assertEqual(self.breaker.snapshot()['rejected'], 1)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.on_success(2.5)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_half_open_probe(self):
+        self.fail(3)
+        self.clock.now += 31
+        self.breaker.before_call()              # the probe
+        with self.assertRaises(SpotifyUnavailable):
+            self.breaker.before_call()          # only one at a time
+        self.breaker.on_failure()               # probe failed: open again
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(SpotifyUnavailable):
+            self.breaker.before_call()
+
+        self.clock.now += 31
+        self.breaker.before_call()
+        self.breaker.on_success(0.1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.before_call()
+
+
+class DegradedSpotifyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.clock = Clock(1000.0)
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=self.clock)
+        self.client = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1', max_retries=0,
+                                    sleep=lambda s: None, breaker=self.breaker)
+
+    def tearDown(self):
+        self.client.session.close()
+        self.spotify.close()
+
+    def calls(self, path):
+        return sum(1 for p, _, _ in self.spotify.seen if p == path)
+
+    def test_open_circuit_fails_fast(self):
+        self.spotify.script['/v1/shows/a'] = [(503, {}, {})] * 10
+        for _ in range(2):
+            with self.assertRaises(SpotifyError):
+                self.client.get('shows/a')
+        with self.assertRaises(SpotifyUnavailable):
+            self.client.get('shows/a')
+        self.assertEqual(self.calls('/v1/shows/a'), 2)
+
+    def test_not_found_does_not_trip_the_breaker(self):
+        self.spotify.script['/v1/shows/a'] = [(404, {}, {})] * 5
+        for _ in range(5):
+            with self.assertRaises(SpotifyError):
+                self.client.get('shows/a')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_episodes_served_stale_while_open(self):
+        self.spotify.script['/v1/shows/s/episodes'] = episode_pages(['Only episode'])
+        catalog = EpisodeCatalog(self.client, ttl=60, clock=self.clock)
+        self.assertEqual(catalog.lookup('s')[1], False)
+
+        self.spotify.script['/v1/shows/s/episodes'] = [(500, {}, {})] * 10
+        self.clock.now += 61
+        show, stale = catalog.lookup('s')
+        self.assertTrue(stale)
+        self.assertEqual(show.search('only'), [{'id': 'ep0', 'name': 'Only episode'}])
+        catalog.lookup('s')                          # second failure opens the circuit
+        calls = self.calls('/v1/shows/s/episodes')
+        self.assertEqual(catalog.lookup('s')[1], True)
+        self.assertEqual(self.calls('/v1/shows/s/episodes'), calls)
+
+        with self.assertRaises(SpotifyUnavailable):  # nothing cached to fall back on
+            catalog.lookup('other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# tests/test_timebuckets.py
+import unittest
+from datetime import date, datetime
+from app import timebuckets
+
+
+class TimeBucketsTestCase(unittest.TestCase):
+    def test_local_date_crosses_midnight(self):
+        when = datetime(2025, 5, 5, 20)
+        self.assertEqual(timebuckets.local_date(when, 'Australia/Perth'), date(2025, 5, 6))
+        self.assertEqual(timebuckets.local_date(when, 'UTC'), date(2025, 5, 5))
+        self.assertEqual(timebuckets.local_date(when, 'America/New_York'), date(2025, 5, 5))
+
+    def test_offset_follows_daylight_saving(self):
+        # Sydney leaves DST at 03:00 local on 6 April 2025 (16:00 UTC the day before)
+        before = timebuckets.utc_offset(datetime(2025, 4, 5, 15, 59), 'Australia/Sydney')
+        after  = timebuckets.utc_offset(datetime(2025, 4, 5, 16, 0), 'Australia/Sydney')
+        self.assertEqual(before.total_seconds(), 11 * 3600)
+        self.assertEqual(after.total_seconds(), 10 * 3600)
+
+    def test_unknown_timezone_falls_back(self):
+        self.assertFalse(timebuckets.is_valid_timezone('Mars/Olympus'))
+        self.assertIs(timebuckets.get_timezone('Mars/Olympus'),
+                      timebuckets.get_timezone(timebuckets.DEFAULT_TIMEZONE))
+
+    def test_bucket_totals(self):
+        days = [(date(2025, 1, 31), 10), (date(2025, 2, 1), 5), ('2025-02-03', 1)]
+        self.assertEqual(timebuckets.bucket_totals(days, 'month'),
+                         [('2025-01', 10), ('2025-02', 6)])
+        self.assertEqual(timebuckets.bucket_totals(days, 'week'),
+                         [('2025-W05', 15), ('2025-W06', 1)])
+        new_year = [(date(2024, 12, 30), 1), (date(2025, 1, 5), 2), (date(2025, 1, 6), 4)]
+        self.assertEqual(timebuckets.bucket_totals(new_year, 'week'),
+                         [('2025-W01', 3), ('2025-W02', 4)])
+        self.assertEqual(timebuckets.bucket_totals(days, 'year'), [('2025', 16)])
+        with self.assertRaises(ValueError):
+            timebuckets.bucket_key(date(2025, 1, 1), 'fortnight')
+
+
+if __name__ == '__main__':
+    unittest.main()
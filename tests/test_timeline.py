@@ -0,0 +1,100 @@
+# tests/test_timeline.py
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Friendship, Podcast, PodcastLog, TimelineEntry
+from app import timeline
+
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.alice = User(username='alice', email='alice@example.com', pw_hash='dummyhash')
+        self.bob   = User(username='bob',   email='bob@example.com',   pw_hash='dummyhash')
+        self.carol = User(username='carol', email='carol@example.com', pw_hash='dummyhash')
+        podcast = Podcast(name='Timeline Podcast', spotify_id='tl123')
+        db.session.add_all([self.alice, self.bob, self.carol, podcast])
+        db.session.commit()
+        self.podcast = podcast
+
+        self.befriend(self.alice, self.bob)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def befriend(self, a, b):
+        db.session.add_all([
+            Friendship(user_id=a.id, friend_id=b.id),
+            Friendship(user_id=b.id, friend_id=a.id),
+        ])
+        db.session.commit()
+
+    def share(self, user, when=None):
+        log = PodcastLog(user_id=user.id, podcast_id=self.podcast.id, duration=600,
+                         shared=True, listened_at=when or datetime.utcnow())
+        db.session.add(log)
+        db.session.flush()
+        timeline.fan_out_share(log)
+        db.session.commit()
+        return log
+
+    def feed_ids(self, user):
+        logs, _ = timeline.friends_feed(user.id, per_page=50)
+        return [log.id for log in logs]
+
+    def test_share_fans_out_to_friends_only(self):
+        log = self.share(self.alice)
+        self.assertEqual(self.feed_ids(self.alice), [log.id])
+        self.assertEqual(self.feed_ids(self.bob), [log.id])
+        self.assertEqual(self.feed_ids(self.carol), [])
+
+    def test_reshare_moves_entry_instead_of_duplicating(self):
+        log = self.share(self.alice, datetime(2025, 1, 1))
+        log.listened_at = datetime(2025, 2, 1)
+        timeline.fan_out_share(log)
+        db.session.commit()
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=self.bob.id).count(), 1)
+
+    def test_backfill_and_prune(self):
+        old = self.share(self.carol, datetime.utcnow() - timedelta(days=1))
+        self.befriend(self.alice, self.carol)
+        timeline.backfill_friendship(self.alice.id, self.carol.id)
+        db.session.commit()
+        self.assertIn(old.id, self.feed_ids(self.alice))
+
+        timeline.prune_friendship(self.alice.id, self.carol.id)
+        db.session.commit()
+        self.assertNotIn(old.id, self.feed_ids(self.alice))
+        self.assertIn(old.id, self.feed_ids(self.carol))
+
+    def test_feed_is_paged_newest_first(self):
+        base = datetime(2025, 5, 1)
+        ids = [self.share(self.bob, base + timedelta(hours=i)).id for i in range(5)]
+        seen, cursor = [], None
+        while True:
+            logs, cursor = timeline.friends_feed(self.alice.id, cursor, per_page=2)
+            seen.extend(log.id for log in logs)
+            if not cursor:
+                break
+        self.assertEqual(seen, list(reversed(ids)))
+
+    def test_rebuild_matches_fan_out(self):
+        self.share(self.alice)
+        self.share(self.bob)
+        before = sorted((e.user_id, e.log_id) for e in TimelineEntry.query.all())
+        timeline.rebuild_timelines()
+        after = sorted((e.user_id, e.log_id) for e in TimelineEntry.query.all())
+        self.assertEqual(before, after)
+        self.assertEqual(len(after), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+# tests/test_trending.py
+import json
+import random
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, trending
+from app.enrichment import get_enricher
+from app.models import User, Podcast, PodcastLog, TrendingSnapshot
+from app.spotify import SpotifyTokenManager, SpotifyClient
+from app.trending import CountMinSketch, DecayedTopK, TrendingEngine
+from tests.test_spotify import StandInSpotify
+
+HOUR = 3600.0
+
+
+class SketchTestCase(unittest.TestCase):
+    def test_count_min_never_undercounts(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        rng = random.Random(1)
+        truth = {}
+        for _ in range(2000):
+            key = rng.randrange(500)
+            truth[key] = truth.get(key, 0) + 1
+            sketch.add(key)
+        for key, count in truth.items():
+            self.assertGreaterEqual(sketch.estimate(key), count)
+
+    def test_top_k_finds_heavy_hitters(self):
+        tracker = DecayedTopK(tau=24 * HOUR, k=5)
+        rng = random.Random(2)
+        events = [(pid, 0.0) for pid in (1, 2, 3) for _ in range(200)]
+        events += [(rng.randrange(100, 1000), 0.0) for _ in range(600)]
+        rng.shuffle(events)
+        for pid, ts in events:
+            tracker.add(pid, ts)
+        self.assertEqual({pid for pid, _ in tracker.top(3, 0.0)}, {1, 2, 3})
+
+    def test_recent_listens_outrank_older_ones(self):
+        tracker = DecayedTopK(tau=24 * HOUR, k=10)
+        for _ in range(10):
+            tracker.add(1, 0.0)                 # popular three days ago
+        for _ in range(5):
+            tracker.add(2, 72 * HOUR)           # popular now
+        (first, score), (second, _) = tracker.top(2, 72 * HOUR)
+        self.assertEqual((first, second), (2, 1))
+        self.assertAlmostEqual(score, 5.0, places=6)
+
+    def test_rescale_keeps_scores(self):
+        tracker = DecayedTopK(tau=HOUR, k=10)
+        tracker.add(1, 0.0)
+        tracker.add(1, 100 * HOUR)      # forces a landmark shift
+        self.assertEqual(tracker.landmark, 100 * HOUR)
+        (key, score), = tracker.top(1, 100 * HOUR)
+        self.assertAlmostEqual(score, 1.0, places=6)
+
+    def test_state_round_trip(self):
+        tracker = DecayedTopK(tau=HOUR, k=3)
+        for pid in (1, 1, 2, 3, 3, 3):
+            tracker.add(pid, 10.0)
+        copy = DecayedTopK.from_state(json.loads(json.dumps(tracker.to_state())))
+        self.assertEqual(copy.top(3, 20.0), tracker.top(3, 20.0))
+        copy.add(2, 20.0)
+        tracker.add(2, 20.0)
+        self.assertEqual(copy.top(3, 30.0), tracker.top(3, 30.0))
+
+
+class TrendingEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spotify = StandInSpotify()
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        tokens = SpotifyTokenManager('id', 'secret', token_url=f'{self.spotify.url}/api/token')
+        self.app.extensions['spotify'] = SpotifyClient(tokens, base_url=f'{self.spotify.url}/v1')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='listener', email='listener@example.com', pw_hash='dummyhash')
+        # already enriched, so logging one never queues a Spotify fetch
+        self.pods = [Podcast(name=f'Pod {i}', spotify_id=f'pod{i}', predicted_popularity=0.5,
+                             enriched_at=datetime(2025, 1, 1))
+                     for i in range(3)]
+        db.session.add_all([self.user] + self.pods)
+        db.session.commit()
+        self.now = datetime(2025, 5, 10, 12)
+
+    def tearDown(self):
+        get_enricher().drain(timeout=5)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.spotify.close()
+
+    def listen(self, podcast, hours_ago, times=1):
+        for _ in range(times):
+            db.session.add(PodcastLog(user_id=self.user.id, podcast_id=podcast.id,
+                                      listened_at=self.now - timedelta(hours=hours_ago)))
+        db.session.commit()
+
+    def test_rebuild_ranks_and_fills_popularity(self):
+        a, b, c = self.pods
+        self.listen(a, 1, times=4)
+        self.listen(b, 100, times=6)    # four days ago: big this week, not today
+        engine = TrendingEngine()
+        engine.rebuild(now=self.now)
+        db.session.expire_all()
+
+        self.assertEqual([pid for pid, _ in engine.top('24h', 2, now=self.now)], [a.id, b.id])
+        self.assertEqual(engine.top('7d', 1, now=self.now)[0][0], a.id)
+        self.assertEqual(db.session.get(Podcast, a.id).predicted_popularity, 1.0)
+        self.assertTrue(0 < db.session.get(Podcast, b.id).predicted_popularity < 1)
+        self.assertEqual(db.session.get(Podcast, c.id).predicted_popularity, 0.0)
+        self.assertEqual(TrendingSnapshot.query.count(), 2)
+
+    def test_cold_start_counts_without_writing(self):
+        a, b, _ = self.pods
+        self.listen(a, 1, times=3)
+        engine = TrendingEngine()
+        engine.record(b.id, self.now)
+        self.assertEqual(engine.top('24h', 5, now=self.now)[0][0], b.id)   # log not replayed
+        self.assertEqual(TrendingSnapshot.query.count(), 0)
+
+        # the first snapshot replaces the empty start, keeping later listens
+        TrendingEngine().rebuild(now=self.now - timedelta(minutes=1))
+        engine._checked -= engine.reload_interval
+        (first, _), (second, score) = engine.top('24h', 2, now=self.now)
+        self.assertEqual((first, second), (a.id, b.id))
+        self.assertAlmostEqual(score, 1.0, places=6)
+
+    def test_workers_reload_newer_snapshots(self):
+        a, b, c = self.pods
+        self.listen(a, 1)
+        TrendingEngine().rebuild(now=self.now)
+
+        # a new process picks up the snapshot instead of replaying the log
+        engine = TrendingEngine(reload_interval=0)
+        engine.record(b.id, self.now)
+        engine.record(b.id, self.now)
+        self.assertEqual(engine.top('24h', 1, now=self.now)[0][0], b.id)
+        self.assertEqual(TrendingSnapshot.query.first().saved_at, self.now)   # not written back
+
+        # another worker's listens arrive with the next rebuild; this one
+        # keeps only the listens it counted after that snapshot was taken
+        self.listen(c, 0, times=3)
+        TrendingEngine().rebuild(now=self.now + timedelta(minutes=1))
+        later = self.now + timedelta(minutes=2)
+        engine.record(b.id, later)
+        engine.record(b.id, later)
+        (first, _), (second, score) = engine.top('24h', 2, now=later)
+        self.assertEqual((first, second), (c.id, b.id))
+        self.assertAlmostEqual(score, 2.0, places=6)
+
+    def test_log_podcast_feeds_engine(self):
+        engine = self.app.extensions['trending']
+        engine.rebuild(now=self.now)
+        log = PodcastLog(user_id=self.user.id, podcast_id=self.pods[2].id, listened_at=self.now)
+        db.session.add(log)
+        db.session.commit()
+        with self.app.test_request_context():
+            trending.record_log(log)
+        self.assertEqual(engine.top('24h', 1, now=self.now)[0][0], self.pods[2].id)
+
+    def test_route_hides_unconfirmed_placeholders(self):
+        typo = Podcast(name='Typed By Someone', spotify_id='typo')
+        db.session.add(typo)
+        db.session.commit()
+        self.listen(typo, 1, times=5)
+        self.listen(self.pods[1], 1)
+        self.app.extensions['trending'].rebuild(now=self.now)
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+        resp = client.get('/api/trending?limit=1').get_json()
+        self.assertEqual([p['id'] for p in resp], ['pod1'])
+
+    def test_trending_failure_does_not_fail_the_log(self):
+        def broken(*args, **kwargs):
+            raise RuntimeError('trending store unavailable')
+        self.app.extensions['trending'].record = broken
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user.id)
+
+        resp = client.post('/log_podcast', json={
+            'podcast_id': 'pod0', 'episode': 'Ep 1', 'episode_id': 'e1',
+            'platform': 'Spotify', 'duration': 30, 'genre': 'Comedy', 'rating': 4,
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.get_json()['success'])
+        self.assertEqual(PodcastLog.query.one().podcast_id, self.pods[0].id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# tests/test_typeahead.py
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import User, Podcast
+from app.typeahead import TypeaheadCache, get_cache, key_prefix, every_term, words
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+NAMES = ['podcast', 'pod save america', 'podium', 'pods', 'poetry', 'pop culture']
+
+
+class TypeaheadCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = TypeaheadCache(ttl=30, clock=self.clock)
+        self.loads = []
+
+    def search(self, q, names=NAMES, limit=10, user=1):
+        def load():
+            self.loads.append(q)
+            return [(n, words(n)) for n in names if every_term(words(n), q)][:limit]
+        return self.cache.lookup(user, 'names', q, load, every_term, limit)
+
+    def test_longer_queries_filter_a_complete_prefix(self):
+        self.assertEqual(self.search('po'), (NAMES, 'miss'))
+        self.assertEqual(self.search('pod'),
+                         (['podcast', 'pod save america', 'podium', 'pods'], 'prefix'))
+        self.assertEqual(self.search('pod s'), (['pod save america'], 'prefix'))
+        self.assertEqual(self.search('POD'), (['podcast', 'pod save america', 'podium', 'pods'], 'exact'))
+        self.assertEqual(self.loads, ['po'])
+        self.assertEqual(self.cache.stats()['names'],
+                         {'exact': 1, 'prefix': 2, 'miss': 1, 'hit_rate': 0.75})
+
+    def test_truncated_results_are_not_reused(self):
+        self.search('po', limit=3)
+        self.search('pod', limit=3)
+        self.assertEqual(self.loads, ['po', 'pod'])
+
+    def test_per_user_and_short_lived(self):
+        self.search('po')
+        self.search('pod', user=2)
+        self.clock.now = 31
+        self.search('pod')
+        self.assertEqual(self.loads, ['po', 'pod', 'pod'])
+
+    def test_reused_entries_keep_their_expiry(self):
+        self.search('po')
+        self.clock.now = 20
+        self.search('pod')                      # derived from 'po' at t=20
+        self.clock.now = 31
+        self.search('pod s')
+        self.assertEqual(self.loads, ['po', 'pod s'])
+
+    def test_no_matcher_means_exact_hits_only(self):
+        def load():
+            self.loads.append('x')
+            return [('ipod', words('ipod'))]
+        self.cache.lookup(1, 'like', 'po', load, None)
+        self.assertEqual(self.cache.lookup(1, 'like', 'pod', load, None), (['ipod'], 'miss'))
+        self.assertEqual(self.cache.lookup(1, 'like', 'pod', load, None), (['ipod'], 'exact'))
+        self.assertEqual(self.loads, ['x', 'x'])
+
+    def test_words_split_and_fold_like_the_fts_tokenizer(self):
+        self.assertEqual(words('Café_Society', 'Ölüm'), {'cafe', 'society', 'olum'})
+        self.assertTrue(every_term(words('Café Society'), 'cafe so'))
+        self.assertTrue(every_term(words('Cafe Society'), 'café'))
+        self.assertTrue(every_term(words('pod_save'), 'sav'))
+
+    def test_key_prefix_matches_whole_keys(self):
+        keys = {'jsmith', 'john smith', 'john', 'smith'}
+        self.assertTrue(key_prefix(keys, 'john s'))
+        self.assertFalse(key_prefix(keys, 'smith j'))
+
+
+class TypeaheadRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', TESTING=True)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.me = User(username='me', email='me@example.com', pw_hash='dummyhash')
+        db.session.add_all([
+            self.me,
+            User(username='podlover', email='p@example.com', pw_hash='dummyhash'),
+            Podcast(name='Serial', spotify_id='serial', enriched_at=datetime(2025, 1, 1)),
+            Podcast(name='Serial Killers', spotify_id='killers', enriched_at=datetime(2025, 1, 1)),
+            Podcast(name='Crime Junkie', spotify_id='crime', description='a serial habit',
+                    enriched_at=datetime(2025, 1, 1)),
+            Podcast(name='Serial Typo', spotify_id='typo'),      # unconfirmed placeholder
+        ])
+        db.session.commit()
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.me.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def names(self, q):
+        return [p['name'] for p in self.client.get(f'/search_podcast_names?q={q}').get_json()]
+
+    def test_podcast_names_reuse_the_shorter_query(self):
+        self.assertEqual(self.names('se'), ['Serial', 'Serial Killers', 'Crime Junkie'])
+        Podcast.query.filter_by(spotify_id='serial').delete()    # the DB isn't asked again
+        db.session.commit()
+        self.assertEqual(self.names('seri'), ['Serial', 'Serial Killers', 'Crime Junkie'])
+        self.assertEqual(self.names('serial k'), ['Serial Killers'])
+        self.assertEqual(self.names('junk'), ['Crime Junkie'])     # not an extension: searched
+
+        stats = self.client.get('/api/typeahead/metrics').get_json()
+        self.assertEqual(stats['podcast_names']['prefix'], 2)
+        self.assertEqual(stats['podcast_names']['miss'], 2)
+
+    def test_users(self):
+        self.assertEqual(self.client.get('/search_users?q=p').get_json(), ['podlover'])
+        self.assertEqual(self.client.get('/search_users?q=pod').get_json(), ['podlover'])
+        self.assertEqual(self.client.get('/search_users?q=podx').get_json(), [])
+        self.assertEqual(get_cache().stats()['users']['prefix'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_user_index.py
+import unittest
+from app import create_app, db
+from app.models import User
+from app.user_index import get_index
+
+
+class UserIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+                               TESTING=True, WTF_CSRF_ENABLED=False)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.me = User(username='me', email='me@example.com', pw_hash='dummyhash', display_name='Myself')
+        db.session.add_all([
+            self.me,
+            User(username='jsmith', email='j@example.com', pw_hash='dummyhash', display_name='John Smith'),
+            User(username='johnny', email='jo@example.com', pw_hash='dummyhash', display_name='Johnny B'),
+            User(username='alice', email='a@example.com', pw_hash='dummyhash', display_name='Alice Johnson'),
+            User(username='bob', email='b@example.com', pw_hash='dummyhash'),
+        ])
+        db.session.commit()
+        self.index = get_index()
+
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.me.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_prefix_of_username_or_any_name_word(self):
+        self.assertEqual(self.index.search('joh'), ['jsmith', 'johnny', 'alice'])
+        self.assertEqual(self.index.search('  JOHN  sm'), ['jsmith'])
+        self.assertEqual(self.index.search('smi'), ['jsmith'])
+        self.assertEqual(self.index.search('zed'), [])
+        self.assertEqual(self.index.search('j', limit=2), ['jsmith', 'johnny'])
+
+    def test_loaded_once_then_patched(self):
+        self.index.search('a')
+        db.session.add(User(username='carol', email='c@example.com', pw_hash='dummyhash'))
+        db.session.commit()
+        self.assertEqual(self.index.search('car'), [])       # not reloaded yet
+
+        self.index.put(99, 'carol', 'Carol Danvers')
+        self.assertEqual(self.index.search('danv'), ['carol'])
+        self.index.put(99, 'carol', 'Captain Marvel')
+        self.assertEqual(self.index.search('danv'), [])
+        self.assertEqual(self.index.search('marv'), ['carol'])
+        self.index.remove(99)
+        self.assertEqual(self.index.search('carol'), [])
+
+    def test_put_during_reload_survives_it(self):
+        self.index.search('a')
+        self.index._loaded_at -= self.index.max_age      # due for a reload
+        name_keys, arrived = self.index.name_keys, []
+
+        def during_load(username, display_name):
+            if not arrived:
+                # a signup committed after the reload read the table
+                arrived.append(True)
+                self.index.put(99, 'carol', 'Carol Danvers')
+            return name_keys(username, display_name)
+        self.index.name_keys = during_load
+
+        self.assertEqual(self.index.search('danv'), ['carol'])
+        self.assertEqual(self.index.search('joh'), ['jsmith', 'johnny', 'alice'])
+
+    def test_route_excludes_the_searcher(self):
+        self.assertEqual(self.client.get('/search_users?q=m').get_json(), [])
+        self.assertEqual(self.client.get('/search_users?q=bo').get_json(), ['bob'])
+
+    def test_settings_rename_is_searchable(self):
+        self.assertEqual(self.index.search('rob'), [])
+        self.client.post('/settings', data={'display_name': 'Robert Paulson'})
+        self.assertEqual(self.index.search('paul'), ['me'])
+        self.assertEqual(self.index.search('mys'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()